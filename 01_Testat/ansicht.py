@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# ansicht.py
+
+from collections.abc import Mapping
+from contextlib import nullcontext
+from types import MappingProxyType
+
+# Markierung im Überlauf: Name existierte beim Erstellen der Ansicht nicht
+_FEHLT = object()
+
+
+class Ansicht(Mapping):
+    '''
+    Unveränderliche Ansicht der Ranglistendaten zu einem festen
+    Zeitpunkt, mit Copy-on-Write:
+        Key = name, Value = {'Punkte': punkte, 'Zeit': zeit} (nur lesbar)
+
+    Die Ansicht liest die aktuellen Daten der Rangliste direkt. Bevor
+    die Rangliste einen Eintrag ändert oder löscht, übergibt sie mit
+    bewahren() den alten Wert; nur diese Einträge belegen in der Ansicht
+    zusätzlichen Speicher. Das Erstellen kostet damit konstante Zeit,
+    spätere Änderungen der Rangliste sind in der Ansicht nicht sichtbar.
+
+    Die Rangliste hält ihre Ansichten nur schwach referenziert, nicht
+    mehr benutzte Ansichten kosten bei Änderungen nichts mehr.
+    '''
+
+    def __init__(self, werte, namen, anzahl, sperre=None):
+        '''
+        Argumente:
+            werte: callable -- werte(name) liefert das aktuelle Tupel
+                (punkte, zeit) oder None.
+            namen: callable -- namen() liefert die aktuellen Namen.
+            anzahl: int -- aktuelle Anzahl Einträge.
+            sperre: Kontextmanager für gleichzeitige Zugriffe, None =
+                ohne Sperre.
+        '''
+        self._werte = werte
+        self._namen = namen
+        self._anzahl = anzahl
+        self._sperre = nullcontext() if sperre is None else sperre
+        self._alt = {}
+
+    def bewahren(self, name, werte):
+        '''
+        Wird von der Rangliste bei jeder Änderung aufgerufen und merkt
+        sich den Wert, den die Ansicht für name zeigen muss.
+
+        Argumente:
+            name: string
+            werte: Tupel (punkte, zeit) vor der Änderung,
+                None -- falls name vorher nicht existierte.
+        '''
+        if self._werte is not None and name not in self._alt:
+            self._alt[name] = _FEHLT if werte is None else werte
+
+    def abloesen(self):
+        '''
+        Kopiert alle noch nicht bewahrten Einträge in die Ansicht, z.B.
+        bevor die Rangliste ihre Daten als Ganzes ersetzt. Danach ist
+        die Ansicht unabhängig von der Rangliste.
+        '''
+        with self._sperre:
+            if self._werte is None:
+                return
+            for name in self._namen():
+                if name not in self._alt:
+                    self._alt[name] = self._werte(name)
+            self._alt = {name: werte for name, werte in self._alt.items()
+                         if werte is not _FEHLT}
+            self._werte = None
+            self._namen = None
+
+    def __getitem__(self, name):
+        with self._sperre:
+            werte = self._alt.get(name)
+            if werte is None and self._werte is not None:
+                werte = self._werte(name)
+        if werte is None or werte is _FEHLT:
+            raise KeyError(name)
+        return MappingProxyType({'Punkte': werte[0], 'Zeit': werte[1]})
+
+    def __len__(self):
+        return self._anzahl
+
+    def __iter__(self):
+        with self._sperre:
+            if self._werte is None:
+                return iter(list(self._alt))
+            alt = self._alt
+            namen = [name for name in self._namen()
+                     if alt.get(name) is not _FEHLT]
+            # gelöschte Einträge, die zum Zeitpunkt der Ansicht bestanden
+            namen.extend(name for name, werte in alt.items()
+                         if werte is not _FEHLT
+                         and self._werte(name) is None)
+        return iter(namen)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(
+            (name, dict(werte)) for name, werte in self.items()))
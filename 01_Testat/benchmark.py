@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# benchmark.py
+'''
+Benchmark für die beiden QuizRangliste-Implementationen.
+
+Erzeugt reproduzierbare Ranglistendateien (fester Seed) und misst für
+jede Implementation und Grösse Zeit und Speicher der Operationen
+laden, resultat_addieren, als_liste, als_string, als_dictionary und
+speichern. Jede Messung läuft in einem eigenen Prozess, damit sich
+die Speicherwerte nicht gegenseitig beeinflussen.
+
+Beispiele:
+    python benchmark.py --groessen 1000 100000 --ausgabe neu.json
+    python benchmark.py --groessen 1000 100000 --vergleich alt.json
+
+Mit --vergleich werden die Zeiten mit einer früheren Ausgabe
+verglichen; bei einer Verschlechterung über der Toleranz endet das
+Skript mit Exit-Code 1.
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Implementationen: Name => (Modul, Argumente für den Konstruktor)
+IMPLEMENTATIONEN = {
+    'quizrangliste': ('quizrangliste', {}),
+    'quizrangliste_spalten': ('quizrangliste', {'speicher': 'spalten'}),
+    'quizrangliste_sqlite': ('quizrangliste', {'speicher': 'sqlite'}),
+    'musterloesung': ('musterloesung', {}),
+}
+
+OPERATIONEN = ('laden', 'resultat_addieren', 'als_liste', 'als_string',
+               'als_dictionary', 'speichern')
+
+# Anzahl Aufrufe von resultat_addieren pro Messung
+ADDIEREN = 1000
+
+# Dateien, die neben der Ranglistendatei entstehen (Ausgabe von
+# speichern() und Datenbank von speicher='sqlite' mit WAL-Dateien)
+NEBENDATEIEN = ('.benchmark', '.sqlite', '.sqlite-wal', '.sqlite-shm')
+
+
+def datei_erzeugen(zeilen, verzeichnis, seed=0):
+    '''
+    Erzeugt (falls noch nicht vorhanden) eine Ranglistendatei mit der
+    angegebenen Anzahl Zeilen. Gleiche Argumente ergeben immer die
+    gleiche Datei; etwa 5% der Namen kommen doppelt vor.
+
+    Argumente:
+        zeilen: int -- Anzahl Zeilen
+        verzeichnis: string -- Zielverzeichnis
+        seed: int -- Startwert des Zufallsgenerators
+
+    Rückgabewert:
+        string -- Pfad der Datei
+    '''
+    pfad = os.path.join(verzeichnis, 'rangliste_{}_{}.txt'.format(
+        zeilen, seed))
+    if os.path.isfile(pfad):
+        return pfad
+
+    zufall = random.Random(seed)
+    namen = max(zeilen - zeilen // 20, 1)
+    temp = pfad + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as datei:
+        for start in range(0, zeilen, 100000):
+            datei.write(''.join(
+                'Teilnehmer{},{},{:.2f}\n'.format(
+                    zufall.randrange(namen), zufall.randrange(101),
+                    zufall.uniform(0, 3600))
+                for _ in range(start, min(start + 100000, zeilen))))
+    os.replace(temp, pfad)
+    return pfad
+
+
+def _aufraeumen(datei):
+    # Nebendateien entfernen, damit jedes Laden bei null beginnt
+    for endung in NEBENDATEIEN:
+        try:
+            os.remove(datei + endung)
+        except FileNotFoundError:
+            pass
+
+
+def _operation(rangliste, name, datei, zufall):
+    # Führt eine Operation aus (ausser laden)
+    if name == 'resultat_addieren':
+        for _ in range(ADDIEREN):
+            rangliste.resultat_addieren(
+                'Teilnehmer{}'.format(zufall.randrange(2 * ADDIEREN)),
+                zufall.randrange(11), zufall.uniform(0, 60))
+    elif name == 'speichern':
+        rangliste.speichern(als=datei + '.benchmark')
+    else:
+        getattr(rangliste, name)()
+
+
+def messen(implementation, datei, wiederholungen=3):
+    '''
+    Misst alle Operationen einer Implementation auf einer Datei.
+
+    Die Zeit ist das Minimum über die Wiederholungen (ohne
+    tracemalloc). Der Speicher wird in einem zweiten Durchlauf mit
+    tracemalloc gemessen: für laden der belegte Speicher danach, für
+    die übrigen Operationen der zusätzliche Spitzenwert. Vor jedem
+    Laden werden die Nebendateien entfernt, speicher='sqlite' baut die
+    Datenbank also jedes Mal neu auf, statt sie nur zu öffnen.
+
+    Argumente:
+        implementation: string -- Schlüssel aus IMPLEMENTATIONEN
+        datei: string -- Pfad der Ranglistendatei
+        wiederholungen: int -- Anzahl Zeitmessungen pro Operation
+
+    Rückgabewert:
+        Dictionary Operation => {'sekunden': ..., 'bytes': ...}
+    '''
+    modul, argumente = IMPLEMENTATIONEN[implementation]
+    klasse = __import__(modul).QuizRangliste
+    ergebnisse = {name: {} for name in OPERATIONEN}
+
+    # Zeit
+    for _ in range(wiederholungen):
+        _aufraeumen(datei)
+        beginn = time.perf_counter()
+        rangliste = klasse(datei=datei, **argumente)
+        dauer = time.perf_counter() - beginn
+        laden = ergebnisse['laden']
+        laden['sekunden'] = min(laden.get('sekunden', dauer), dauer)
+
+        zufall = random.Random(1)
+        for name in OPERATIONEN[1:]:
+            beginn = time.perf_counter()
+            _operation(rangliste, name, datei, zufall)
+            dauer = time.perf_counter() - beginn
+            messung = ergebnisse[name]
+            messung['sekunden'] = min(messung.get('sekunden', dauer), dauer)
+        del rangliste
+
+    # Speicher
+    _aufraeumen(datei)
+    tracemalloc.start()
+    rangliste = klasse(datei=datei, **argumente)
+    ergebnisse['laden']['bytes'] = tracemalloc.get_traced_memory()[0]
+    zufall = random.Random(1)
+    for name in OPERATIONEN[1:]:
+        vorher = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _operation(rangliste, name, datei, zufall)
+        ergebnisse[name]['bytes'] = tracemalloc.get_traced_memory()[1] - vorher
+    tracemalloc.stop()
+
+    del rangliste
+    _aufraeumen(datei)
+    return ergebnisse
+
+
+def ausfuehren(implementationen, groessen, verzeichnis, wiederholungen=3,
+               seed=0):
+    '''
+    Führt alle Messungen aus, jede in einem eigenen Prozess.
+
+    Rückgabewert:
+        Dictionary mit 'umgebung' und 'messungen' (Liste von
+        Dictionaries mit implementation, zeilen, operation, sekunden,
+        bytes), kann direkt als JSON geschrieben werden.
+    '''
+    messungen = []
+    for zeilen in groessen:
+        datei = datei_erzeugen(zeilen, verzeichnis, seed)
+        for implementation in implementationen:
+            ausgabe = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--intern',
+                 implementation, datei, str(wiederholungen)],
+                check=True, stdout=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            for operation, werte in json.loads(ausgabe).items():
+                messungen.append(dict(
+                    implementation=implementation, zeilen=zeilen,
+                    operation=operation, **werte))
+            print('{:>22} {:>9} Zeilen: fertig'.format(
+                implementation, zeilen), file=sys.stderr)
+    return {
+        'umgebung': {
+            'python': platform.python_version(),
+            'plattform': platform.platform(),
+            'zeitpunkt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': seed,
+            'wiederholungen': wiederholungen,
+            'addieren': ADDIEREN,
+        },
+        'messungen': messungen,
+    }
+
+
+def vergleichen(alt, neu, toleranz=0.2):
+    '''
+    Vergleicht zwei Ausgaben von ausfuehren().
+
+    Argumente:
+        alt, neu: Dictionary -- frühere und aktuelle Messungen
+        toleranz: float -- erlaubte relative Verlangsamung
+
+    Rückgabewert:
+        Liste von Tupeln (implementation, zeilen, operation, alt, neu)
+        aller Messungen, die um mehr als die Toleranz langsamer sind.
+    '''
+    vorher = {(m['implementation'], m['zeilen'], m['operation']):
+              m['sekunden'] for m in alt['messungen']}
+    schlechter = []
+    for m in neu['messungen']:
+        schluessel = (m['implementation'], m['zeilen'], m['operation'])
+        if schluessel in vorher and (
+                m['sekunden'] > vorher[schluessel] * (1 + toleranz)):
+            schlechter.append(schluessel + (vorher[schluessel],
+                                            m['sekunden']))
+    return schlechter
+
+
+# --- Start -------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--intern':
+        # eine einzelne Messung im eigenen Prozess
+        print(json.dumps(messen(sys.argv[2], sys.argv[3],
+                                int(sys.argv[4]))))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark der QuizRangliste-Implementationen.')
+    parser.add_argument('--groessen', type=int, nargs='+',
+                        default=[10 ** 3, 10 ** 4, 10 ** 5],
+                        help='Anzahl Zeilen, z.B. 1000 ... 10000000')
+    parser.add_argument('--implementationen', nargs='+',
+                        choices=sorted(IMPLEMENTATIONEN),
+                        default=sorted(IMPLEMENTATIONEN))
+    parser.add_argument('--wiederholungen', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verzeichnis', default=tempfile.gettempdir(),
+                        help='Ablage der erzeugten Ranglistendateien')
+    parser.add_argument('--ausgabe', help='JSON-Datei statt stdout')
+    parser.add_argument('--vergleich', help='frühere JSON-Ausgabe')
+    parser.add_argument('--toleranz', type=float, default=0.2)
+    argumente = parser.parse_args()
+
+    ergebnis = ausfuehren(argumente.implementationen, argumente.groessen,
+                          argumente.verzeichnis, argumente.wiederholungen,
+                          argumente.seed)
+    text = json.dumps(ergebnis, indent=2)
+    if argumente.ausgabe:
+        with open(argumente.ausgabe, 'w', encoding='utf-8') as datei:
+            datei.write(text + '\n')
+    else:
+        print(text)
+
+    if argumente.vergleich:
+        with open(argumente.vergleich, encoding='utf-8') as datei:
+            schlechter = vergleichen(json.load(datei), ergebnis,
+                                     argumente.toleranz)
+        for implementation, zeilen, operation, alt, neu in schlechter:
+            print('langsamer: {} {} Zeilen {}: {:.4f}s -> {:.4f}s'.format(
+                implementation, zeilen, operation, alt, neu),
+                file=sys.stderr)
+        sys.exit(1 if schlechter else 0)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# laden_messen.py
+'''
+Misst die Ladezeit (Konstruktor, von der Datei bis zur fertigen
+Rangliste) der QuizRangliste-Implementationen auf einer
+reproduzierbaren Ranglistendatei (benchmark.datei_erzeugen(), fester
+Seed) und vergleicht sie mit einem früheren Stand aus git.
+
+Der Vergleichsstand (--basis, standardmässig der erste Commit des
+Repositorys) wird mit 'git archive' in ein temporäres Verzeichnis
+ausgepackt. Jede Messung läuft in einem eigenen Prozess, damit sich
+die gleichnamigen Module der beiden Stände nicht in die Quere kommen.
+Die Zeit ist das Minimum über die Wiederholungen.
+
+Beispiele:
+    python laden_messen.py
+    python laden_messen.py --zeilen 300000 --basis HEAD~5
+'''
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+from benchmark import IMPLEMENTATIONEN, datei_erzeugen
+
+VERZEICHNIS = os.path.dirname(os.path.abspath(__file__))
+
+
+def basis_auspacken(revision, ziel):
+    '''
+    Packt das Verzeichnis 01_Testat des git-Stands revision nach ziel
+    aus.
+
+    Rückgabewert:
+        string -- Verzeichnis mit den Modulen des Stands
+    '''
+    archiv = subprocess.run(
+        ['git', 'archive', '--format=tar', revision, '.'],
+        check=True, stdout=subprocess.PIPE, cwd=VERZEICHNIS).stdout
+    with tarfile.open(fileobj=io.BytesIO(archiv)) as tar:
+        tar.extractall(ziel)
+    return ziel
+
+
+def _intern(verzeichnis, implementation, datei, wiederholungen):
+    # Eine Messung im eigenen Prozess, Module aus verzeichnis.
+    # Rückgabewert: Sekunden, None falls der Stand die Argumente der
+    # Implementation nicht kennt (z.B. speicher= vor dessen Einführung)
+    sys.path.insert(0, verzeichnis)
+    modul, argumente = IMPLEMENTATIONEN[implementation]
+    klasse = __import__(modul).QuizRangliste
+    sekunden = None
+    for _ in range(wiederholungen):
+        beginn = time.perf_counter()
+        try:
+            rangliste = klasse(datei=datei, **argumente)
+        except TypeError:
+            return None
+        dauer = time.perf_counter() - beginn
+        del rangliste
+        sekunden = dauer if sekunden is None else min(sekunden, dauer)
+    return sekunden
+
+
+def messen(verzeichnis, implementation, datei, wiederholungen=5):
+    '''
+    Misst die Ladezeit einer Implementation in einem eigenen Prozess.
+
+    Argumente:
+        verzeichnis: string -- Verzeichnis mit den Modulen
+        implementation: string -- Schlüssel aus IMPLEMENTATIONEN
+            (ohne speicher='sqlite')
+        datei: string -- Pfad der Ranglistendatei
+        wiederholungen: int -- Anzahl Messungen
+
+    Rückgabewert:
+        float -- Sekunden (Minimum), None falls nicht unterstützt
+    '''
+    ausgabe = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--intern',
+         verzeichnis, implementation, datei, str(wiederholungen)],
+        check=True, stdout=subprocess.PIPE, cwd=verzeichnis).stdout
+    return json.loads(ausgabe)
+
+
+def _erste_revision():
+    return subprocess.run(
+        ['git', 'rev-list', '--max-parents=0', 'HEAD'], check=True,
+        stdout=subprocess.PIPE, cwd=VERZEICHNIS,
+        universal_newlines=True).stdout.split()[0]
+
+
+def _sekunden(wert):
+    return '{:8.3f} s'.format(wert) if wert is not None else '{:>10}'.format(
+        '-')
+
+
+# --- Start -------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == '--intern':
+        print(json.dumps(_intern(sys.argv[2], sys.argv[3], sys.argv[4],
+                                 int(sys.argv[5]))))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(
+        description='Ladezeit der QuizRangliste-Implementationen.')
+    parser.add_argument('--zeilen', type=int, default=500000)
+    # Engines mit eigener Datei würden ab der zweiten Wiederholung nur
+    # die bestehende Datenbank öffnen
+    parser.add_argument('--implementationen', nargs='+',
+                        choices=sorted(
+                            name for name, (_, argumente)
+                            in IMPLEMENTATIONEN.items()
+                            if argumente.get('speicher') != 'sqlite'),
+                        default=['musterloesung', 'quizrangliste',
+                                 'quizrangliste_spalten'])
+    parser.add_argument('--basis', help='git-Stand zum Vergleich, '
+                        'Standard: erster Commit')
+    parser.add_argument('--wiederholungen', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verzeichnis', default=tempfile.gettempdir(),
+                        help='Ablage der erzeugten Ranglistendatei')
+    argumente = parser.parse_args()
+
+    datei = datei_erzeugen(argumente.zeilen, argumente.verzeichnis,
+                           argumente.seed)
+    basis = argumente.basis or _erste_revision()
+    print('Python {}, {}, {} Zeilen, Minimum aus {}, Basis {}'.format(
+        platform.python_version(), platform.platform(), argumente.zeilen,
+        argumente.wiederholungen, basis))
+    print('{:>22} {:>10} {:>10} {:>8}'.format(
+        'Implementation', 'Basis', 'Aktuell', 'Faktor'))
+    with tempfile.TemporaryDirectory() as temp:
+        basis_auspacken(basis, temp)
+        for implementation in argumente.implementationen:
+            alt = messen(temp, implementation, datei,
+                         argumente.wiederholungen)
+            neu = messen(VERZEICHNIS, implementation, datei,
+                         argumente.wiederholungen)
+            print('{:>22} {} {} {:>8}'.format(
+                implementation, _sekunden(alt), _sekunden(neu),
+                '{:.2f}'.format(neu / alt) if alt and neu else '-'))
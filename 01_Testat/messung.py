@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# messung.py
+
+import functools
+import sys
+import threading
+import time
+
+
+class Messung():
+    '''
+    Sammelt Zähler und Laufzeit-Histogramme, z.B. für
+    QuizRangliste(messung=...) oder TopoMap(messung=...).
+
+    Die Klassen kennen nur die beiden Methoden zaehlen() und zeit(),
+    jedes Objekt mit diesen Methoden kann also anstelle von Messung
+    verwendet werden (z.B. um an ein bestehendes Monitoring zu melden).
+    Ohne messung wird nichts gemessen und kaum Zeit verbraucht.
+
+    Laufzeiten werden in Eimern mit Zweierpotenzen von Nanosekunden
+    gezählt (..., 1.0-2.1 µs, 2.1-4.1 µs, ...). Der Speicherbedarf ist
+    damit unabhängig von der Anzahl Messungen, Quantile sind auf einen
+    Faktor 2 genau.
+    '''
+
+    def __init__(self):
+        self._sperre = threading.Lock()
+        self._zaehler = {}
+        self._zeiten = {}
+
+    def zaehlen(self, name, anzahl=1):
+        '''
+        Erhöht den Zähler name um anzahl.
+        '''
+        with self._sperre:
+            self._zaehler[name] = self._zaehler.get(name, 0) + anzahl
+
+    def zeit(self, name, sekunden):
+        '''
+        Nimmt eine Laufzeit (Sekunden) in das Histogramm name auf.
+        '''
+        eimer = int(sekunden * 1e9).bit_length()
+        with self._sperre:
+            werte = self._zeiten.get(name)
+            if werte is None:
+                werte = self._zeiten[name] = [0, 0.0, sekunden, sekunden, {}]
+            werte[0] += 1
+            werte[1] += sekunden
+            if sekunden < werte[2]:
+                werte[2] = sekunden
+            if sekunden > werte[3]:
+                werte[3] = sekunden
+            werte[4][eimer] = werte[4].get(eimer, 0) + 1
+
+    def stoppuhr(self, name):
+        '''
+        Kontextmanager, misst die Laufzeit des with-Blocks als zeit(name).
+        '''
+        return _Stoppuhr(self, name)
+
+    def quantil(self, name, q):
+        '''
+        Gibt eine obere Schranke für das Quantil q (0..1) der Laufzeiten
+        name zurück (Obergrenze des Eimers, höchstens das Maximum).
+
+        Rückgabewert:
+            float -- Sekunden, None falls keine Messung vorliegt.
+        '''
+        with self._sperre:
+            werte = self._zeiten.get(name)
+            if werte is None:
+                return None
+            anzahl, _, _, maximum, eimer = werte
+            eimer = sorted(eimer.items())
+        grenze = q * anzahl
+        summe = 0
+        for nummer, haeufigkeit in eimer:
+            summe += haeufigkeit
+            if summe >= grenze:
+                return min((1 << nummer) / 1e9, maximum)
+        return maximum
+
+    def als_dictionary(self):
+        '''
+        Gibt alle Messungen als Dictionary zurück (für json.dump()):
+            {'zaehler': {name: anzahl},
+             'zeiten': {name: {'anzahl', 'summe', 'min', 'max', 'p50',
+                               'p90', 'p99', 'eimer': {obergrenze: anzahl}}}}
+        Zeiten in Sekunden.
+        '''
+        with self._sperre:
+            zaehler = dict(self._zaehler)
+            namen = sorted(self._zeiten)
+        zeiten = {}
+        for name in namen:
+            with self._sperre:
+                anzahl, summe, minimum, maximum, eimer = self._zeiten[name]
+                eimer = dict(eimer)
+            zeiten[name] = {
+                'anzahl': anzahl,
+                'summe': summe,
+                'min': minimum,
+                'max': maximum,
+                'p50': self.quantil(name, 0.5),
+                'p90': self.quantil(name, 0.9),
+                'p99': self.quantil(name, 0.99),
+                'eimer': {(1 << nummer) / 1e9: haeufigkeit
+                          for nummer, haeufigkeit in sorted(eimer.items())},
+            }
+        return {'zaehler': zaehler, 'zeiten': zeiten}
+
+    def ausgeben(self, datei=None):
+        '''
+        Schreibt eine Übersicht als Text, standardmässig auf stdout.
+        '''
+        if datei is None:
+            datei = sys.stdout
+        daten = self.als_dictionary()
+        for name, anzahl in sorted(daten['zaehler'].items()):
+            print('{:<40} {:>14}'.format(name, anzahl), file=datei)
+        if daten['zeiten']:
+            print('{:<40} {:>9} {:>10} {:>10} {:>10} {:>10}'.format(
+                'Laufzeit', 'Anzahl', 'Mittel', 'p50', 'p99', 'Max'),
+                file=datei)
+        for name, werte in daten['zeiten'].items():
+            print('{:<40} {:>9} {:>10} {:>10} {:>10} {:>10}'.format(
+                name, werte['anzahl'],
+                _dauer(werte['summe'] / werte['anzahl']),
+                _dauer(werte['p50']), _dauer(werte['p99']),
+                _dauer(werte['max'])), file=datei)
+
+    def zuruecksetzen(self):
+        '''
+        Löscht alle Zähler und Histogramme.
+        '''
+        with self._sperre:
+            self._zaehler = {}
+            self._zeiten = {}
+
+
+class _Stoppuhr():
+    # Kontextmanager zu Messung.stoppuhr()
+
+    def __init__(self, messung, name):
+        self._messung = messung
+        self._name = name
+        self._beginn = None
+
+    def __enter__(self):
+        self._beginn = time.perf_counter()
+        return self
+
+    def __exit__(self, *fehler):
+        self._messung.zeit(self._name, time.perf_counter() - self._beginn)
+        return False
+
+
+def _dauer(sekunden):
+    # kurze, lesbare Darstellung einer Laufzeit
+    for einheit, faktor in (('s', 1), ('ms', 1e3), ('µs', 1e6)):
+        if sekunden * faktor >= 1:
+            return '{:.3g} {}'.format(sekunden * faktor, einheit)
+    return '{:.3g} ns'.format(sekunden * 1e9)
+
+
+def gemessen(messung, name, funktion):
+    '''
+    Gibt eine Funktion zurück, die funktion aufruft und die Laufzeit
+    jedes Aufrufs mit messung.zeit(name, ...) meldet.
+    '''
+    @functools.wraps(funktion)
+    def aufruf(*args, **kwargs):
+        beginn = time.perf_counter()
+        try:
+            return funktion(*args, **kwargs)
+        finally:
+            messung.zeit(name, time.perf_counter() - beginn)
+    return aufruf
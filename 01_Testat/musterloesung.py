@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 # Python Testat 1 - MusterlÃ¶sung
 
-import copy
-import operator
 import os
+import weakref
+
+from ansicht import Ansicht
+from rangindex import SortierteListe
+from tabelle import Spaltenbreiten
 
 
 class QuizRangliste:
@@ -21,6 +24,12 @@ class QuizRangliste:
         # Dateipfad merken
         self.__datei = datei
 
+        # Spaltenbreiten fuer als_string(), erst bei Bedarf bestimmt
+        self.__breiten = None
+
+        # ausgegebene Ansichten (Copy-on-Write), schwach referenziert
+        self.__ansichten = weakref.WeakValueDictionary()
+
         # Datei einlesen
         self.__datei_einlesen()
 
@@ -47,67 +56,160 @@ class QuizRangliste:
                     continue
 
                 try:
-                    # neuer Dictionary-Eintrag hinzufÃ¼gen
-                    self.__daten[items[0]] = {
-                        'Punkte': int(float(items[1])),
-                        'Zeit': float(items[2]),
-                    }
+                    # Punkte und Zeit umwandeln
+                    punkte = int(float(items[1]))
+                    zeit = float(items[2])
                 except ValueError:
                     # Zeile Ã¼berspringen, falls ungÃ¼ltige Zahlen
                     continue
 
+                # falls die Zeit NaN ist (nicht sortierbar)
+                if zeit != zeit:
+                    # Zeile ueberspringen
+                    continue
+
+                # neuer Dictionary-Eintrag hinzufÃ¼gen
+                self.__daten[items[0]] = {
+                    'Punkte': punkte,
+                    'Zeit': zeit,
+                }
+
+        # Rangindex aus den eingelesenen Daten aufbauen
+        self.__rang = SortierteListe(
+            self.__schluessel(name, werte['Punkte'], werte['Zeit'])
+            for name, werte in self.__daten.items()
+        )
+
+    @staticmethod
+    def __schluessel(name, punkte, zeit):
+        # Sortierschluessel (Punkte absteigend, Zeit und Name aufsteigend)
+        return (-punkte, zeit, name)
+
+    def __werte(self, name):
+        # Tupel (Punkte, Zeit) oder None
+        werte = self.__daten.get(name)
+        if werte is None:
+            return None
+        return werte['Punkte'], werte['Zeit']
+
+    def __bewahren(self, name):
+        # alten Wert an die Ansichten geben, bevor er sich aendert
+        for ansicht in self.__ansichten.values():
+            ansicht.bewahren(name, self.__werte(name))
+
     def als_dictionary(self):
         '''Liefert die internen Daten als Dictionary.
         '''
-        # tiefe Kopie des internen Dictionary zurÃ¼ckgeben
-        return copy.deepcopy(self.__daten)
+        # Kopie des internen Dictionary zurueckgeben (die Werte sind
+        # unveraenderlich, eine Ebene tiefer kopieren genuegt)
+        return {name: dict(werte) for name, werte in self.__daten.items()}
+
+    def ansicht(self):
+        '''Liefert eine unveraenderliche Ansicht der internen Daten zum
+        aktuellen Zeitpunkt, ohne sie zu kopieren (Copy-on-Write).
+        '''
+        ansicht = Ansicht(self.__werte, self.__daten.keys,
+                          len(self.__daten))
+        self.__ansichten[id(ansicht)] = ansicht
+        return ansicht
 
     def als_liste(self):
         '''Liefert die internen Daten als sortierte Liste.
         '''
-        # leere Liste
-        liste = []
+        # der Rangindex ist bereits sortiert nach Punkten (absteigend),
+        # Zeit (aufsteigend) und Name (aufsteigend)
+        # als Tupel (Name, Punkte, Zeit) zurueckgeben
+        return [(name, -punkte, zeit) for punkte, zeit, name in self.__rang]
 
-        # Daten in neue Liste abfÃ¼llen
-        for key, value in self.__daten.items():
-            # als Tupel (Name, Punkte, Zeit)
-            liste.append((key, value['Punkte'], value['Zeit']))
+    def rank_of(self, name):
+        '''Liefert den Rang (1 = bester) des Teilnehmers oder None.
 
-        # Daten nach aufsteigender PrioritÃ¤t sortieren
-        # tiefste PrioritÃ¤t: nach dem Namen (0) aufsteigend sortieren
-        # mittlere PrioritÃ¤t: nach der Zeit (2) aufsteigend sortieren
-        liste.sort(key=operator.itemgetter(2, 0))
-        # hÃ¶chste PrioritÃ¤t: nach der Punktezahl (1) absteigend sortieren
-        liste.sort(key=operator.itemgetter(1), reverse=True)
+        Argumente:
+            name -- Name des Teilnehmers
+        '''
+        # falls der Name nicht existiert
+        werte = self.__daten.get(name)
+        if werte is None:
+            return None
 
-        # sortierte Liste zurÃ¼ckgeben
-        return liste
+        # Position im Rangindex (0-basiert) bestimmen
+        return self.__rang.position(
+                self.__schluessel(name, werte['Punkte'], werte['Zeit'])) + 1
+
+    def top_k(self, k):
+        '''Liefert die ersten k Eintraege der sortierten Liste.
+
+        Argumente:
+            k -- Anzahl Eintraege
+        '''
+        return [(name, -punkte, zeit)
+                for punkte, zeit, name in self.__rang.bereich(0, k)]
+
+    def around(self, name, radius):
+        '''Liefert den Teilnehmer mit bis zu radius Nachbarn davor und
+        danach als sortierte Liste (leer, falls der Name nicht existiert).
+
+        Argumente:
+            name -- Name des Teilnehmers
+            radius -- Anzahl Nachbarn auf jeder Seite
+        '''
+        # falls der Name nicht existiert
+        rang = self.rank_of(name)
+        if rang is None:
+            return []
+
+        # Ausschnitt aus dem Rangindex
+        start = max(rang - 1 - radius, 0)
+        return [(name, -punkte, zeit)
+                for punkte, zeit, name
+                in self.__rang.bereich(start, rang + radius)]
+
+    @staticmethod
+    def __zellen(name, punkte, zeit):
+        # Listenelemente als formatierte Strings
+        return name, '{:d}'.format(punkte), '{:.1f}'.format(zeit)
 
     def als_string(self):
         '''Liefert die internen Daten als formatierten String.
         '''
-        # Daten als sortierte Liste
-        liste = self.als_liste()
-
-        # Listenelemente in formatierte Strings umwandeln
-        liste_str = [(name, '{:d}'.format(punkte), '{:.1f}'.format(zeit))
-                     for name, punkte, zeit in liste]
-
-        # maximale Spaltenbreiten bestimmen
-        maxlen = [max([len(x) for x in spalte])
-                  for spalte in zip(*liste_str)]
-
-        # String zusammenbauen, MaximallÃ¤ngen berÃ¼cksichtigen
-        s = '\n'.join(
-                ['{:<{}} | {:>{}} | {:>{}}'.format(
-                        *[x
-                          for zm in zip(zeile, maxlen)
-                          for x in zm])
-                 for zeile in liste_str]
-        )
+        # Zeilen mit Zeilenumbruechen verbinden
+        return '\n'.join(self.als_string_zeilen())
+
+    def als_string_zeilen(self, start=0, stop=None):
+        '''Liefert die Zeilen von als_string() einzeln (ohne
+        Zeilenumbruch) als Generator.
 
-        # formatierten String zurÃ¼ckgeben
-        return s
+        Argumente:
+            start -- erste Position (0-basiert)
+            stop -- Position nach der letzten Zeile, None = Ende
+        '''
+        # maximale Spaltenbreiten einmal bestimmen, danach nachfuehren
+        if self.__breiten is None:
+            self.__breiten = Spaltenbreiten(self.__zellen, self.als_liste())
+        maxlen = self.__breiten.breiten()
+
+        # Ausschnitt aus dem Rangindex formatieren
+        for punkte, zeit, name in self.__rang.bereich(
+                start, len(self.__rang) if stop is None else stop):
+            yield '{:<{}} | {:>{}} | {:>{}}'.format(
+                    *[x
+                      for zm in zip(self.__zellen(name, -punkte, zeit),
+                                    maxlen)
+                      for x in zm])
+
+    def als_string_seite(self, seite, pro_seite=50):
+        '''Liefert eine Seite von als_string() (Seite 1 = Raenge 1 bis
+        pro_seite).
+
+        Argumente:
+            seite -- Seitennummer (1-basiert)
+            pro_seite -- Anzahl Zeilen pro Seite
+        '''
+        # falls die Seitennummer ungueltig ist
+        if seite < 1:
+            return ''
+        start = (seite - 1) * pro_seite
+        return '\n'.join(self.als_string_zeilen(start, start + pro_seite))
 
     def resultat_addieren(self, name, punkte, zeit):
         '''FÃ¼gt ein neues Teilresultat zu den bestehenden Daten hinzu.
@@ -136,10 +238,28 @@ class QuizRangliste:
             return False
 
         # falls der Name schon existiert
-        if name in self.__daten:
+        alt = self.__daten.get(name)
+        if alt is not None:
             # Zeit und Punkte addieren
-            self.__daten[name]['Punkte'] += punkte
-            self.__daten[name]['Zeit'] += zeit
+            punkte += alt['Punkte']
+            zeit += alt['Zeit']
+
+        # falls die Zeit NaN ist (nicht sortierbar)
+        if zeit != zeit:
+            # Fehler zurueckgeben
+            return False
+
+        # bisherigen Wert fuer ausgegebene Ansichten bewahren
+        self.__bewahren(name)
+
+        if alt is not None:
+            # alten Eintrag aus dem Rangindex entfernen
+            self.__rang.entfernen(
+                    self.__schluessel(name, alt['Punkte'], alt['Zeit']))
+            if self.__breiten is not None:
+                self.__breiten.entfernen(name, alt['Punkte'], alt['Zeit'])
+            alt['Punkte'] = punkte
+            alt['Zeit'] = zeit
         else:
             # neuer Eintrag erstellen
             self.__daten[name] = {
@@ -147,6 +267,11 @@ class QuizRangliste:
                     'Zeit': zeit
             }
 
+        # neuen Eintrag in den Rangindex einfuegen
+        self.__rang.hinzufuegen(self.__schluessel(name, punkte, zeit))
+        if self.__breiten is not None:
+            self.__breiten.hinzufuegen(name, punkte, zeit)
+
         # alles OK
         return True
 
@@ -157,7 +282,16 @@ class QuizRangliste:
             name -- Name des Teilnehmers
         '''
         # Name aus dem Dictionary entfernen
-        self.__daten.pop(name, None)
+        self.__bewahren(name)
+        alt = self.__daten.pop(name, None)
+
+        # falls der Name existiert hat
+        if alt is not None:
+            # Eintrag aus dem Rangindex entfernen
+            self.__rang.entfernen(
+                    self.__schluessel(name, alt['Punkte'], alt['Zeit']))
+            if self.__breiten is not None:
+                self.__breiten.entfernen(name, alt['Punkte'], alt['Zeit'])
 
     def speichern(self, als=None):
         '''Speichert die internen Daten in die Datei ab.
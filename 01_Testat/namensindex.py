@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# namensindex.py
+
+from itertools import islice
+
+from rangindex import SortierteListe
+
+
+def _nachfolger(praefix):
+    # Kleinster String, der grösser ist als alle Strings mit praefix
+    # (letztes Zeichen erhöhen), None = es gibt keinen
+    while praefix:
+        zeichen = ord(praefix[-1])
+        if zeichen < 0x10ffff:
+            return praefix[:-1] + chr(zeichen + 1)
+        praefix = praefix[:-1]
+    return None
+
+
+class NamensIndex():
+    '''
+    Alphabetisch sortierter Index der Namen einer Rangliste, für die
+    Suche nach Anfang (Autovervollständigung) und nach ähnlichen Namen
+    (Tippfehler wie Noemi/Noemii oder Anna/Aana).
+
+    Die Namen liegen in einer SortierteListe. Namen mit gleichem Anfang
+    stehen darin direkt hintereinander, die Liste bildet also einen
+    impliziten Präfixbaum (Trie): Einfügen und Entfernen kosten
+    logarithmische Zeit, ohne zusätzliche Knoten pro Zeichen.
+
+    Die ähnlichen Namen werden mit der Levenshtein-Distanz über diesen
+    Präfixbaum gesucht. Aufeinanderfolgende Namen teilen sich die
+    bereits berechneten Zeilen der Distanzmatrix für ihren gemeinsamen
+    Anfang. Überschreitet ein Anfang bereits die erlaubte Distanz,
+    werden alle Namen mit diesem Anfang per Binärsuche übersprungen.
+    '''
+
+    def __init__(self, namen=()):
+        '''
+        Argumente:
+            namen: iterable -- Startnamen (ohne Duplikate)
+        '''
+        self._namen = SortierteListe(namen)
+
+    def __len__(self):
+        return len(self._namen)
+
+    def __contains__(self, name):
+        return name in self._namen
+
+    def hinzufuegen(self, name):
+        '''
+        Nimmt einen neuen Namen auf.
+        '''
+        self._namen.hinzufuegen(name)
+
+    def entfernen(self, name):
+        '''
+        Entfernt einen Namen.
+
+        Fehler:
+            ValueError -- falls der Name nicht enthalten ist.
+        '''
+        self._namen.entfernen(name)
+
+    def mit_praefix(self, praefix, anzahl=10):
+        '''
+        Gibt die ersten Namen (alphabetisch) zurück, die mit praefix
+        beginnen.
+
+        Argumente:
+            praefix: string
+            anzahl: int -- höchstens so viele Namen, None = alle
+
+        Rückgabewert:
+            Liste von Namen
+        '''
+        namen = []
+        for name in islice(self._namen.ab(praefix), anzahl):
+            if not name.startswith(praefix):
+                break
+            namen.append(name)
+        return namen
+
+    def aehnlich(self, name, abstand=1):
+        '''
+        Gibt alle Namen zurück, die sich durch höchstens abstand
+        Einfügungen, Löschungen oder Ersetzungen einzelner Zeichen in
+        name überführen lassen (Levenshtein-Distanz).
+
+        Die Kosten hängen von der Anzahl Anfänge ab, die höchstens
+        abstand von einem Anfang von name entfernt sind, nicht von der
+        Anzahl Namen im Index.
+
+        Argumente:
+            name: string -- gesuchter Name
+            abstand: int -- grösste erlaubte Distanz
+
+        Rückgabewert:
+            Liste von Tupeln (name, distanz), sortiert nach Distanz und
+            Name; name selbst ist mit Distanz 0 enthalten, falls er im
+            Index vorkommt.
+        '''
+        laenge = len(name)
+        if abstand <= 0:
+            return [(name, 0)] if name in self._namen else []
+        spalten = range(1, laenge + 1)
+        # zeilen[d]: Distanzen zwischen dem Anfang der Länge d des
+        # aktuellen Kandidaten und allen Anfängen von name
+        zeilen = [list(range(laenge + 1))]
+        anfang = ''
+        treffer = []
+
+        namen = self._namen.ab('')
+        kandidat = next(namen, None)
+        while kandidat is not None:
+            # gemeinsamer Anfang mit dem zuletzt berechneten Anfang
+            tiefe = 0
+            grenze = min(len(anfang), len(kandidat))
+            while tiefe < grenze and anfang[tiefe] == kandidat[tiefe]:
+                tiefe += 1
+            del zeilen[tiefe + 1:]
+
+            zeile = zeilen[tiefe]
+            kleinste = 0
+            while tiefe < len(kandidat):
+                zeichen = kandidat[tiefe]
+                vorher = zeile
+                zeile = [vorher[0] + 1]
+                links = zeile[0]
+                for j in spalten:
+                    links = min(vorher[j] + 1, links + 1,
+                                vorher[j - 1] + (name[j - 1] != zeichen))
+                    zeile.append(links)
+                zeilen.append(zeile)
+                tiefe += 1
+                kleinste = min(zeile)
+                if kleinste >= abstand:
+                    break
+            anfang = kandidat[:tiefe]
+
+            if kleinste < abstand:
+                # ganzer Kandidat gelesen, längere Namen folgen direkt
+                if zeile[laenge] <= abstand:
+                    treffer.append((zeile[laenge], kandidat))
+                kandidat = next(namen, None)
+                continue
+
+            if kleinste == abstand:
+                # Distanz ausgeschöpft: nur noch exakte Fortsetzungen
+                # mit dem Rest von name, direkt nachschlagen statt alle
+                # Namen mit diesem Anfang zu lesen
+                for j in range(laenge + 1):
+                    if zeile[j] == abstand:
+                        gesucht = anfang + name[j:]
+                        if gesucht in self._namen:
+                            treffer.append((abstand, gesucht))
+            # alle Namen mit diesem Anfang überspringen
+            weiter = _nachfolger(anfang)
+            if weiter is None:
+                break
+            namen = self._namen.ab(weiter)
+            kandidat = next(namen, None)
+
+        treffer.sort()
+        return [(kandidat, distanz) for distanz, kandidat in treffer]
@@ -1,67 +1,716 @@
 # -*- coding: utf-8 -*-
 # quizrangliste.py
 
-import re
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from contextlib import nullcontext
+from itertools import islice
+
+from ansicht import Ansicht
+from messung import gemessen
+from namensindex import NamensIndex
+from speicher import SPEICHER
+from sperre import Dateisperre, ersetzen
+from tabelle import Spaltenbreiten
+from verlauf import Verlauf
 
 
 class QuizRangliste():
     '''Schnittstelle zur Verwaltung der HSRvote-Software-Textdaten.'''
 
-    def __extract_file_data(self, file):
-        for zeile in file:
+    # Mindestanzahl Journal-Einträge, ab der speichern() kompaktiert
+    _JOURNAL_MIN = 10000
+
+    # Blockgrösse in Zeichen beim Einlesen der Ranglistendatei
+    _BLOCK = 1 << 20
+
+    # Kopf des binären Snapshots: Kennung, Byte-Reihenfolge, Grösse,
+    # Änderungszeit (ns) und CRC32 der Textdatei, Anzahl Einträge,
+    # Länge der Namen
+    _SNAPSHOT_KOPF = struct.Struct('<8sc7xqqqqq')
+    _SNAPSHOT_KENNUNG = b'QRSNAP01'
+
+    # Anzahl Einträge, die als_string_zeilen() pro Abfrage holt
+    _ZEILEN_BLOCK = 1000
+
+    # Anzahl Zeilen pro write() beim Speichern
+    _SCHREIB_BLOCK = 10000
+
+    # Methoden, deren Laufzeit mit messung erfasst wird
+    _GEMESSEN = ('resultat_addieren', 'resultat_addieren_batch',
+                 'name_entfernen', 'speichern', 'kompaktieren', 'als_liste',
+                 'als_dictionary', 'als_string', 'rank_of', 'top_k', 'around',
+                 'namen_suchen', 'aehnliche_namen')
+
+    def __extract_file_data(self, file, speicher):
+        # Datei in grossen Blöcken lesen und pro Block einmal in Zeilen
+        # aufteilen; die angefangene letzte Zeile wandert in den nächsten.
+        rest = ''
+        while True:
+            block = file.read(self._BLOCK)
+            if not block:
+                break
+            zeilen = (rest + block).split('\n')
+            rest = zeilen.pop()
+            self.__zeilen_uebernehmen(zeilen, speicher)
+        self.__zeilen_uebernehmen([rest], speicher)
+
+    def __zeilen_uebernehmen(self, zeilen, speicher):
+        # Gleiche Regeln wie re.match(r'\w+,.*,.*$', zeile.strip()):
+        # mindestens drei Felder, der Name besteht nur aus Wortzeichen.
+        # Spätere Zeilen überschreiben frühere mit demselben Namen.
+        namen, punkte_liste, zeiten = [], [], []
+        for zeile in zeilen:
+            elemente = zeile.strip().split(',', 3)
+            if len(elemente) < 3:
+                continue
+            name, punkte, zeit = elemente[0], elemente[1], elemente[2]
+            # Leere oder ungültige Zeilen werden ignoriert.
+            if not name.isalnum() and not name.replace('_', 'a').isalnum():
+                continue
+            try:
+                punkte = punkte and int(punkte) or 0
+                zeit = zeit and float(zeit) or 0
+            except ValueError:
+                continue
+            # NaN lässt sich nicht sortieren
+            if zeit != zeit:
+                continue
+            namen.append(name)
+            punkte_liste.append(punkte)
+            zeiten.append(zeit)
+        speicher.laden(namen, punkte_liste, zeiten)
+        if self.__messung is not None:
+            # abgelehnt: nicht leere Zeilen, die ignoriert wurden
+            self.__messung.zaehlen('rangliste.laden.zeilen', len(namen))
+            self.__messung.zaehlen(
+                'rangliste.laden.abgelehnt',
+                sum(1 for zeile in zeilen if zeile.strip()) - len(namen))
+
+    def __journal_oeffnen(self):
+        # Das Journal enthält Gesamtwerte statt Differenzen:
+        #   name,punkte,zeit  -- Eintrag setzen
+        #   -,name            -- Eintrag löschen
+        # Ein erneutes Abspielen ist damit unschädlich, auch wenn ein
+        # Absturz zwischen Kompaktieren und Leeren des Journals liegt.
+        try:
+            with open(self.__journal_name, 'rb') as file:
+                daten = file.read()
+        except FileNotFoundError:
+            daten = b''
+
+        # unvollständige letzte Zeile (Absturz beim Schreiben) verwerfen
+        ende = daten.rfind(b'\n') + 1
+        if ende < len(daten):
+            os.truncate(self.__journal_name, ende)
+
+        for zeile in daten[:ende].decode('utf-8').split('\n'):
+            elemente = zeile.split(',')
             try:
-                # Leere oder ungültige Zeilen werden ignoriert.
-                if re.match(r'\w+,.*,.*$', zeile.strip()) is None:
+                if len(elemente) == 3:
+                    self.__speicher.setzen(
+                        elemente[0], int(elemente[1]), float(elemente[2]))
+                elif len(elemente) == 2 and elemente[0] == '-':
+                    if elemente[1] in self.__speicher:
+                        self.__speicher.loeschen(elemente[1])
+                else:
                     continue
-                elemente = zeile.strip().split(',')
-                self.__file_data[elemente[0]] = {
-                    'Punkte': elemente[1] and int(elemente[1]) or 0,
-                    'Zeit': elemente[2] and float(elemente[2]) or 0
-                }
-            except Exception:
+            except (ValueError, OverflowError):
                 continue
+            self.__journal_eintraege += 1
 
-    def __write_data_to_file(self, file):
+        self.__journal = open(self.__journal_name, 'a', encoding='utf-8')
+
+    def __journal_schreiben(self, zeile):
+        self.__journal.write(zeile)
+        self.__journal_eintraege += 1
+
+    def __verlauf_oeffnen(self, eimer):
+        # Der Verlauf enthält Teilresultate (nicht Gesamtwerte):
+        #   zeitpunkt,name,punkte,zeit  -- Teilresultat
+        #   -,name                      -- Verlauf einer Person löschen
+        self.__verlauf = Verlauf(eimer)
         try:
-            with open(file, 'w+', encoding='utf-8') as file:
-                for line in self.als_liste():
-                    file.write(
-                        line[0] + ',' +
-                        str(line[1]) + ',' +
-                        str(round(line[2], 1)) + '\n'
-                    )
-        except Exception:
-            print("Fehlende Berechtigung auf dem Dateisystem!")
+            with open(self.__verlauf_name, 'rb') as file:
+                daten = file.read()
+        except FileNotFoundError:
+            daten = b''
+
+        # unvollständige letzte Zeile (Absturz beim Schreiben) verwerfen
+        ende = daten.rfind(b'\n') + 1
+        if ende < len(daten):
+            os.truncate(self.__verlauf_name, ende)
+
+        for zeile in daten[:ende].decode('utf-8').split('\n'):
+            elemente = zeile.split(',')
+            try:
+                if len(elemente) == 4:
+                    self.__verlauf.hinzufuegen(
+                        float(elemente[0]), elemente[1],
+                        int(elemente[2]), float(elemente[3]))
+                elif len(elemente) == 2 and elemente[0] == '-':
+                    self.__verlauf.entfernen(elemente[1])
+                else:
+                    continue
+            except (ValueError, OverflowError):
+                continue
+            self.__verlauf_zeilen += 1
+
+        self.__verlauf_datei = open(self.__verlauf_name, 'a',
+                                    encoding='utf-8')
+
+    def __verlauf_sichern(self):
+        # Verlaufsdatei auf die Platte bringen, bei zu vielen Zeilen
+        # gegenüber den verdichteten Einträgen neu schreiben
+        with self.__sperre:
+            if self.__verlauf_zeilen >= max(self._JOURNAL_MIN,
+                                            2 * len(self.__verlauf)):
+                self.__verlauf_verdichten()
+            else:
+                self.__verlauf_datei.flush()
+                os.fsync(self.__verlauf_datei.fileno())
 
-    def __init__(self, datei='default.txt'):
+    def __zeitpunkt(self, zeitpunkt):
+        # Zeitpunkt eines Teilresultats, nur im Verlaufs-Modus
+        if self.__verlauf is None:
+            return None
+        if zeitpunkt is None:
+            return time.time()
+        zeitpunkt = float(zeitpunkt)
+        if zeitpunkt != zeitpunkt or zeitpunkt in (float('inf'),
+                                                   float('-inf')):
+            raise ValueError('Ungültiger Zeitpunkt')
+        return zeitpunkt
+
+    def __verlauf_schreiben(self, zeitpunkt, name, punkte, zeit):
+        self.__verlauf.hinzufuegen(zeitpunkt, name, punkte, zeit)
+        self.__verlauf_datei.write('{!r},{},{},{!r}\n'.format(
+            zeitpunkt, name, punkte, zeit))
+        self.__verlauf_zeilen += 1
+
+    def __verlauf_verdichten(self):
+        # Verlaufsdatei durch die verdichteten Einträge (ein Eintrag pro
+        # Eimer und Person) ersetzen
+        self.__verlauf_datei.close()
+        try:
+            ersetzen(self.__verlauf_name, lambda file: file.writelines(
+                '{!r},{},{},{!r}\n'.format(*eintrag)
+                for eintrag in self.__verlauf.eintraege()))
+            self.__verlauf_zeilen = len(self.__verlauf)
+        finally:
+            self.__verlauf_datei = open(self.__verlauf_name, 'a',
+                                        encoding='utf-8')
+
+    def __snapshot_lesen(self, speicher, pfad=None):
+        # Lädt pfad (Standard datei + '.snapshot'), falls er zur
+        # aktuellen Textdatei passt (Grösse und Änderungszeit). Liefert
+        # False, falls die Textdatei eingelesen werden muss.
+        kopf = self._SNAPSHOT_KOPF
+        try:
+            stat = os.stat(self.__file_name)
+            with open(pfad or self.__snapshot_name, 'rb') as file, \
+                    mmap.mmap(file.fileno(), 0,
+                              access=mmap.ACCESS_READ) as karte:
+                (kennung, reihenfolge, groesse, mtime, pruefsumme,
+                 anzahl, laenge) = kopf.unpack_from(karte)
+                if (kennung != self._SNAPSHOT_KENNUNG
+                        or groesse != stat.st_size
+                        or mtime != stat.st_mtime_ns
+                        or len(karte) != kopf.size + laenge + 16 * anzahl
+                        or pruefsumme != self.__pruefsumme(
+                            self.__file_name)):
+                    return False
+
+                daten = memoryview(karte)
+                start = kopf.size + laenge
+                namen = str(daten[kopf.size:start], 'utf-8').split('\n')
+                punkte = array('q')
+                punkte.frombytes(daten[start:start + 8 * anzahl])
+                zeiten = array('d')
+                zeiten.frombytes(daten[start + 8 * anzahl:])
+                daten.release()
+        except (OSError, ValueError, struct.error):
+            return False
+
+        if not anzahl:
+            namen = []
+        if len(namen) != anzahl:
+            return False
+        if reihenfolge != sys.byteorder[0].encode():
+            punkte.byteswap()
+            zeiten.byteswap()
+        speicher.laden_sortiert(namen, punkte, zeiten)
+        return True
+
+    def __snapshot_schreiben(self, ziel, speicher=None, genau=False,
+                             pfad=None):
+        # Schreibt pfad (Standard ziel + '.snapshot') mit genau den
+        # Daten, die ein erneutes Einlesen der eben geschriebenen
+        # Textdatei ergibt (gerundete Zeit ausser mit genau, nur gültige
+        # Namen), sortiert wie als_liste().
+        if pfad is None:
+            pfad = ziel + '.snapshot'
+        if speicher is None:
+            speicher = self.__speicher
+        zeilen = sorted(
+            (-punkte, zeit if genau else round(zeit, 1), name)
+            for name, punkte, zeit in speicher.sortiert()
+            if name.isalnum() or name.replace('_', 'a').isalnum()
+        )
+        namen = '\n'.join([name for _, _, name in zeilen]).encode('utf-8')
+        try:
+            punkte = array('q', [-punkte for punkte, _, _ in zeilen])
+        except OverflowError:
+            # Punkte passen nicht in 64 Bit: kein Snapshot
+            self.__snapshot_entfernen(pfad)
+            return
+        zeiten = array('d', [zeit for _, zeit, _ in zeilen])
+
+        stat = os.stat(ziel)
+        temp = pfad + '.tmp'
+        with open(temp, 'wb') as file:
+            file.write(self._SNAPSHOT_KOPF.pack(
+                self._SNAPSHOT_KENNUNG, sys.byteorder[0].encode(),
+                stat.st_size, stat.st_mtime_ns, self.__pruefsumme(ziel),
+                len(zeilen), len(namen)))
+            file.write(namen)
+            punkte.tofile(file)
+            zeiten.tofile(file)
+        os.replace(temp, pfad)
+
+    @staticmethod
+    def __pruefsumme(datei):
+        # CRC32 der Textdatei; Änderungszeiten sind auf manchen
+        # Dateisystemen zu grob, um schnelle Folgeänderungen zu erkennen.
+        with open(datei, 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:
+                return zlib.crc32(b'')
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as k:
+                return zlib.crc32(k)
+
+    @staticmethod
+    def __snapshot_entfernen(pfad):
+        try:
+            os.remove(pfad)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def __zellen(name, punkte, zeit):
+        # Zellen einer Zeile in als_string()
+        return name, str(punkte), str(round(zeit, 1))
+
+    def __spaltenbreiten(self):
+        # Spaltenbreiten werden erst beim ersten formatierten Abruf
+        # bestimmt und danach bei jeder Änderung nachgeführt.
+        if self.__breiten is None:
+            self.__breiten = Spaltenbreiten(self.__zellen,
+                                            self.__speicher.sortiert())
+        return self.__breiten.breiten()
+
+    def __geaendert(self, name, alt=None, neu=None):
+        # Nach jeder Änderung eines Eintrags: Ansichten, Namensindex und
+        # Spaltenbreiten nachführen.
+        # alt, neu: Tupel (punkte, zeit) vor und nach der Änderung
+        self.__aenderungen += 1
+        for ansicht in self.__ansichten.values():
+            ansicht.bewahren(name, alt)
+        if self.__namensindex is not None:
+            if alt is None:
+                self.__namensindex.hinzufuegen(name)
+            elif neu is None:
+                self.__namensindex.entfernen(name)
+        if self.__breiten is None:
+            return
+        if alt is not None:
+            self.__breiten.entfernen(name, *alt)
+        if neu is not None:
+            self.__breiten.hinzufuegen(name, *neu)
+
+    @classmethod
+    def __csv_schreiben(cls, file, zeilen):
+        # Zeilen blockweise zusammensetzen, ein write() pro Block
+        zeilen = iter(zeilen)
+        while True:
+            block = ''.join([
+                line[0] + ',' +
+                str(line[1]) + ',' +
+                str(round(line[2], 1)) + '\n'
+                for line in islice(zeilen, cls._SCHREIB_BLOCK)
+            ])
+            if not block:
+                return
+            file.write(block)
+
+    def __write_data_to_file(self, file, speicher=None):
+        # Atomar über eine temporäre Datei; Fehler (OSError) werden
+        # weitergegeben, die Zieldatei bleibt dann unverändert.
+        if speicher is None:
+            speicher = self.__speicher
+        ersetzen(file, lambda datei: self.__csv_schreiben(
+            datei, speicher.sortiert()))
+        if self.__messung is not None:
+            self.__messung.zaehlen('rangliste.speichern.bytes',
+                                   os.path.getsize(file))
+
+    def __rang_aufbauen(self, speicher):
+        # Sortierung nach dem Einlesen, mit messung als
+        # 'rangliste.sortieren' erfasst
+        if self.__messung is None:
+            speicher.rang_aufbauen()
+            return
+        beginn = time.perf_counter()
+        speicher.rang_aufbauen()
+        self.__messung.zeit('rangliste.sortieren',
+                            time.perf_counter() - beginn)
+
+    def __stand_merken(self):
+        # Nach Laden oder Speichern: Anzahl Änderungen und Grösse und
+        # Änderungszeit der Textdatei, siehe ist_geaendert()
+        try:
+            stat = os.stat(self.__file_name)
+        except OSError:
+            self.__stand = None
+            return
+        self.__stand = (self.__aenderungen, stat.st_size, stat.st_mtime_ns)
+
+    def __binaer_lesen(self, speicher):
+        # Binäre Fassung statt der Textdatei laden: im gleichzeitigen
+        # Modus zuerst datei + '.genau' (ungerundete Zeiten), sonst den
+        # Snapshot. False: die Textdatei muss eingelesen werden.
+        if (self.__dateisperre is not None
+                and self.__snapshot_lesen(speicher, self.__genau_name)):
+            return True
+        return self.__snapshot and self.__snapshot_lesen(speicher)
+
+    def __einlesen(self):
+        if self.__speicher_typ.ENDUNG is not None:
+            self.__abgleichen()
+            return
+        if not self.__binaer_lesen(self.__speicher):
+            # "with" closes files implicitly
+            try:
+                # file exists - open for reading
+                with open(self.__file_name, 'r', encoding='utf-8') as file:
+                    self.__extract_file_data(file, self.__speicher)
+            except FileNotFoundError:
+                # file not exists - create it (ohne eine inzwischen
+                # angelegte Datei zu leeren)
+                open(self.__file_name, 'a', encoding='utf-8').close()
+
+            self.__rang_aufbauen(self.__speicher)
+        self.__stand_merken()
+
+    def __abgleichen(self):
+        # Engine mit eigener Datei: nur einlesen, falls die Textdatei
+        # seit dem letzten Abgleich verändert wurde (oder neu ist)
+        try:
+            stat = os.stat(self.__file_name)
+        except FileNotFoundError:
+            open(self.__file_name, 'a', encoding='utf-8').close()
+            stat = os.stat(self.__file_name)
+        stand = self.__speicher.stand()
+        if stand is None or stand[:2] != (stat.st_size, stat.st_mtime_ns):
+            if stand is not None and not stand[2]:
+                # Neu einlesen würde gesicherte, aber noch nicht
+                # kompaktierte Änderungen verwerfen
+                raise ValueError(
+                    'Datenbank {!r} enthält Änderungen, die in der '
+                    'inzwischen veränderten Textdatei {!r} fehlen'.format(
+                        self.__file_name + self.__speicher_typ.ENDUNG,
+                        self.__file_name))
+            self.__speicher.laden_sortiert([], [], [])
+            with open(self.__file_name, 'r', encoding='utf-8') as file:
+                self.__extract_file_data(file, self.__speicher)
+            self.__rang_aufbauen(self.__speicher)
+            self.__speicher.stand_setzen(stat.st_size, stat.st_mtime_ns)
+            stand = (stat.st_size, stat.st_mtime_ns, True)
+        if stand[2]:
+            # sonst enthält die Datenbank Änderungen, die in der
+            # Textdatei noch fehlen: ist_geaendert() bleibt True
+            self.__stand_merken()
+
+    def __aenderung_merken(self, name, punkte, zeit):
+        # Im gleichzeitigen Modus: Teilresultate seit dem letzten
+        # Speichern, werden beim Speichern zur Datei addiert.
+        if self.__dateisperre is None:
+            return
+        summe = self.__deltas.get(name)
+        if summe is None:
+            self.__deltas[name] = [punkte, zeit]
+        else:
+            summe[0] += punkte
+            summe[1] += zeit
+
+    @staticmethod
+    def __aenderungen_anwenden(speicher, entfernt, deltas):
+        # Löschungen und Teilresultate auf einen Speicher übertragen.
+        # Ungültige Summen (NaN, Überlauf) werden verworfen.
+        for name in entfernt:
+            if name in speicher:
+                speicher.loeschen(name)
+        for name, (punkte, zeit) in deltas.items():
+            werte = speicher.werte(name)
+            if werte is not None:
+                punkte += werte[0]
+                zeit += werte[1]
+            if zeit != zeit:
+                continue
+            try:
+                speicher.setzen(name, punkte, zeit)
+            except OverflowError:
+                continue
+
+    def __zusammenfuehren(self):
+        # Speichern im gleichzeitigen Modus: unter der Dateisperre die
+        # aktuelle Datei lesen, die eigenen Änderungen darauf anwenden
+        # und atomar zurückschreiben. Andere Threads können während der
+        # Dateiarbeit weiter Resultate addieren.
+        with self.__dateisperre:
+            with self.__sperre:
+                deltas, self.__deltas = self.__deltas, {}
+                entfernt, self.__entfernt = self.__entfernt, set()
+
+            try:
+                neu = self.__speicher_typ()
+                if not self.__binaer_lesen(neu):
+                    try:
+                        with open(self.__file_name, 'r',
+                                  encoding='utf-8') as file:
+                            self.__extract_file_data(file, neu)
+                    except FileNotFoundError:
+                        pass
+                    self.__rang_aufbauen(neu)
+                # ohne eigene Änderungen nur den Stand der Datei lesen
+                if deltas or entfernt:
+                    self.__aenderungen_anwenden(neu, entfernt, deltas)
+                    self.__write_data_to_file(self.__file_name, neu)
+            except BaseException:
+                # Änderungen für den nächsten Versuch zurücklegen
+                with self.__sperre:
+                    for name, (punkte, zeit) in deltas.items():
+                        if name not in self.__entfernt:
+                            self.__aenderung_merken(name, punkte, zeit)
+                    self.__entfernt |= entfernt
+                raise
+
+            # Die Änderungen stehen in der Textdatei. Sie rundet die
+            # Zeit, daher ungerundet daneben, damit sich kleine
+            # Teilresultate über mehrere Speichervorgänge aufsummieren.
+            # Eine hier nicht ersetzte, veraltete Datei passt nicht mehr
+            # zur Textdatei und wird beim Laden übergangen.
+            if deltas or entfernt:
+                self.__snapshot_schreiben(self.__file_name, neu, genau=True,
+                                          pfad=self.__genau_name)
+                if self.__snapshot:
+                    self.__snapshot_schreiben(self.__file_name, neu)
+
+            # Stand der Datei übernehmen, neuere Änderungen bleiben
+            # für das nächste Speichern vorgemerkt
+            with self.__sperre:
+                self.__aenderungen_anwenden(neu, self.__entfernt,
+                                            self.__deltas)
+                for ansicht in self.__ansichten.values():
+                    ansicht.abloesen()
+                self.__speicher = neu
+                self.__breiten = None
+                self.__namensindex = None
+
+    def __init__(self, datei='default.txt', journal=False, speicher='dict',
+                 snapshot=False, gleichzeitig=False, verlauf=False,
+                 eimer=3600, messung=None):
         '''
         Initialisierung der Rangliste.
         List die Daten aus der angegebenen CSV-Textdatei (encoding='utf-8')
         aus und bereitet diese zur Abfrage vor.
 
-        Leere oder ungültige Zeilen werden ignoriert.
+        Leere oder ungültige Zeilen werden ignoriert. Als ungültig gilt
+        auch eine Zeile mit der Zeit NaN (z.B. 'Anna,5,nan'): NaN lässt
+        sich nicht sortieren und würde die Rangliste durcheinander
+        bringen. Die ursprüngliche Version hatte solche Zeilen
+        übernommen.
 
         Erstellt eine neue, leere Datei, falls
         die angegebene Datei noch nicht existiert.
 
+        Im Journal-Modus wird jede Änderung als kurze Zeile an die Datei
+        datei + '.journal' angehängt. Beim Start wird das Journal über
+        die Ranglistendaten gelegt, kompaktieren() schreibt es in die
+        Textdatei zurück.
+
+        Die Speicher-Engine legt fest, wie die Daten im Arbeitsspeicher
+        liegen:
+            'dict' -- ein Dictionary pro Teilnehmer (Standard),
+            'spalten' -- kompakte Spalten, deutlich weniger Speicher
+                pro Teilnehmer bei sehr grossen Ranglisten,
+            'sqlite' -- SQLite-Datenbank datei + '.sqlite', die Daten
+                liegen nicht im Arbeitsspeicher. Passt die Datenbank
+                zur Textdatei (Grösse und Änderungszeit beim letzten
+                Abgleich), wird die Textdatei nicht gelesen; sonst wird
+                sie einmal in die Datenbank übernommen. Änderungen
+                schreibt speichern() wie im Journal-Modus nur in die
+                Datenbank, kompaktieren() auch in die Textdatei.
+                Enthält die Datenbank noch nicht kompaktierte
+                Änderungen und wurde die Textdatei inzwischen von
+                aussen verändert, wird keine der beiden Seiten
+                verworfen, sondern ValueError ausgelöst.
+
+        Mit snapshot=True wird ein binärer Snapshot datei + '.snapshot'
+        (Namen, Punkte- und Zeit-Spalten in Ranglisten-Reihenfolge)
+        anstelle der Textdatei geladen, falls er zur aktuellen Grösse
+        und Änderungszeit der Textdatei passt. speichern() schreibt ihn
+        dann jeweils neben die Textdatei. Am schnellsten startet diese
+        Variante mit speicher='spalten', weil die Spalten direkt
+        übernommen werden.
+
+        Mit gleichzeitig=True dürfen mehrere Threads und mehrere
+        Prozesse dieselbe Datei verwenden: Zugriffe innerhalb des
+        Prozesses sind über eine Sperre geschützt, und speichern()
+        liest unter einer Dateisperre (datei + '.lock') den aktuellen
+        Stand der Datei, addiert die eigenen Teilresultate und
+        Löschungen seit dem letzten Speichern und ersetzt die Datei
+        atomar. So gehen keine Resultate anderer Prozesse verloren.
+        Danach enthält die Rangliste auch deren Änderungen. Die
+        Textdatei hat das gewohnte Format (Zeit auf eine Stelle
+        gerundet); die ungerundeten Zeiten stehen zusätzlich im Format
+        des Snapshots in datei + '.genau' und werden beim Laden und
+        Zusammenführen verwendet, solange sie zur Textdatei passen. So
+        summieren sich auch Teilresultate unter 0.05 s auf.
+
+        Mit verlauf=True wird jedes Teilresultat mit Zeitpunkt in der
+        Datei datei + '.verlauf' festgehalten und im Arbeitsspeicher in
+        Zeit-Eimer der Länge eimer (Sekunden) verdichtet. als_liste()
+        liefert damit auch Ranglisten über ein Zeitfenster, z.B. die
+        letzten 24 Stunden.
+
+        Mit messung (z.B. messung.Messung()) werden Laufzeiten und
+        Zähler unter Namen 'rangliste.*' gemeldet: Laden, Sortieren,
+        gelesene und abgelehnte Zeilen, geschriebene Bytes und jeder
+        Aufruf der Methoden in _GEMESSEN. Ohne messung entsteht kein
+        Zusatzaufwand, die Methoden werden nur mit messung ersetzt.
+
         Argumente:
             datei: string -- Pfad zur Textdatei mit den Ranglistendaten.
+            journal: bool -- Änderungen in ein Journal schreiben.
+            speicher: string -- Speicher-Engine, 'dict', 'spalten' oder
+                'sqlite' (nicht zusammen mit journal, snapshot und
+                gleichzeitig).
+            snapshot: bool -- binären Snapshot lesen und schreiben.
+            gleichzeitig: bool -- Threads und Prozesse teilen die Datei,
+                nicht zusammen mit journal oder verlauf.
+            verlauf: bool -- Teilresultate mit Zeitpunkt festhalten.
+            eimer: float -- Länge der Zeit-Eimer des Verlaufs (Sekunden).
+            messung: Objekt mit den Methoden zaehlen(name, anzahl) und
+                zeit(name, sekunden), None = nichts messen.
+
+        Fehler:
+            OSError -- falls die Datei nicht gelesen oder angelegt
+                werden kann.
+            UnicodeDecodeError -- falls die Datei kein gültiges UTF-8
+                enthält; sie bleibt unverändert.
+            ValueError -- bei ungültigen Argumenten, oder mit
+                speicher='sqlite', falls Datenbank und Textdatei
+                beide unabhängig verändert wurden.
         '''
-        self.__file_data = {}
+        if speicher not in SPEICHER:
+            raise ValueError('Unbekannte Speicher-Engine: {!r}'.format(
+                speicher))
+        if gleichzeitig and journal:
+            raise ValueError('journal und gleichzeitig schliessen sich aus')
+        if gleichzeitig and verlauf:
+            raise ValueError('verlauf und gleichzeitig schliessen sich aus')
+        if SPEICHER[speicher].ENDUNG is not None and (
+                journal or snapshot or gleichzeitig):
+            raise ValueError('Speicher-Engine {!r} nicht mit journal, '
+                             'snapshot oder gleichzeitig'.format(speicher))
+        self.__felder_setzen(datei, speicher, snapshot, gleichzeitig)
+        self.__messung = messung
+        beginn = time.perf_counter()
+
+        if gleichzeitig:
+            with self.__dateisperre:
+                self.__einlesen()
+        else:
+            self.__einlesen()
+        if journal:
+            self.__journal_oeffnen()
+        if verlauf:
+            self.__verlauf_oeffnen(eimer)
+
+        if messung is not None:
+            messung.zeit('rangliste.laden', time.perf_counter() - beginn)
+            for name in self._GEMESSEN:
+                setattr(self, name, gemessen(
+                    messung, 'rangliste.' + name, getattr(self, name)))
+
+    def __felder_setzen(self, datei, speicher, snapshot, gleichzeitig):
+        self.__speicher_name = speicher
+        self.__speicher_typ = SPEICHER[speicher]
+        if self.__speicher_typ.ENDUNG is None:
+            self.__speicher = self.__speicher_typ()
+        else:
+            # Engine mit eigener Datei neben der Textdatei
+            self.__speicher = self.__speicher_typ(
+                datei + self.__speicher_typ.ENDUNG)
         self.__file_name = datei
+        self.__journal = None
+        self.__journal_name = datei + '.journal'
+        self.__journal_eintraege = 0
+        self.__snapshot = snapshot
+        self.__snapshot_name = datei + '.snapshot'
+        self.__genau_name = datei + '.genau'
+        self.__breiten = None
+        self.__namensindex = None
+        self.__aenderungen = 0
+        self.__stand = None
+        self.__deltas = {}
+        self.__entfernt = set()
+        self.__ansichten = weakref.WeakValueDictionary()
+        self.__verlauf = None
+        self.__verlauf_datei = None
+        self.__verlauf_name = datei + '.verlauf'
+        self.__verlauf_zeilen = 0
+        self.__messung = None
+        if gleichzeitig:
+            self.__sperre = threading.RLock()
+            self.__dateisperre = Dateisperre(datei + '.lock')
+        else:
+            self.__sperre = nullcontext()
+            self.__dateisperre = None
 
-        # "with" closes files implicitly
-        try:
-            # file exists - open for reading
-            with open(datei, 'r', encoding='utf-8') as file:
-                self.__extract_file_data(file)
-        except Exception:
-            # file not exists - create it
-            try:
-                with open(datei, 'w+', encoding='utf-8') as file:
-                    self.__extract_file_data(file)
-            except Exception:
-                print("Fehlende Berechtigung auf dem Dateisystem!")
+    def __getstate__(self):
+        # Für pickle (z.B. Laden in einem Worker-Prozess): nur die
+        # Einstellungen und die Spalten in Ranglisten-Reihenfolge, wie
+        # im Snapshot. Offene Journale und Sperren lassen sich nicht
+        # übertragen.
+        if (self.__journal is not None or self.__dateisperre is not None
+                or self.__verlauf is not None
+                or self.__speicher_typ.ENDUNG is not None):
+            raise TypeError('QuizRangliste mit journal, gleichzeitig, '
+                            'verlauf oder eigener Speicher-Datei lässt sich '
+                            'nicht übertragen')
+        zeilen = self.als_liste()
+        return {
+            'datei': self.__file_name,
+            'speicher': self.__speicher_name,
+            'snapshot': self.__snapshot,
+            'namen': [name for name, _, _ in zeilen],
+            'punkte': [punkte for _, punkte, _ in zeilen],
+            'zeiten': [zeit for _, _, zeit in zeilen],
+        }
+
+    def __setstate__(self, zustand):
+        self.__felder_setzen(zustand['datei'], zustand['speicher'],
+                             zustand['snapshot'], False)
+        self.__speicher.laden_sortiert(
+            zustand['namen'], zustand['punkte'], zustand['zeiten'])
 
     def als_dictionary(self):
         '''
@@ -72,10 +721,39 @@ class QuizRangliste():
             name: string,
             punkte: int,
             zeit: float
+
+        Das Dictionary ist eine Kopie, Änderungen daran wirken nicht
+        auf die Rangliste zurück. Für häufige Abfragen ist ansicht()
+        günstiger.
         '''
-        return self.__file_data
+        with self.__sperre:
+            return self.__speicher.als_dictionary()
 
-    def als_liste(self):
+    def ansicht(self):
+        '''
+        Gibt eine unveränderliche Ansicht der Daten zurück, mit den
+        gleichen Schlüsseln und Werten wie als_dictionary().
+
+        Die Ansicht zeigt den Stand zum Zeitpunkt des Aufrufs, auch wenn
+        die Rangliste danach geändert wird (Copy-on-Write). Der Aufruf
+        kopiert nichts; zusätzlicher Speicher wird nur für Einträge
+        belegt, die sich danach ändern, solange die Ansicht benutzt
+        wird.
+
+        Rückgabewert:
+            ansicht.Ansicht -- nur lesbares Mapping
+                name => {'Punkte': punkte, 'Zeit': zeit}
+        '''
+        with self.__sperre:
+            ansicht = Ansicht(
+                lambda name: self.__speicher.werte(name),
+                lambda: self.__speicher.namen(),
+                len(self.__speicher),
+                None if self.__dateisperre is None else self.__sperre)
+            self.__ansichten[id(ansicht)] = ansicht
+            return ansicht
+
+    def als_liste(self, von=None, bis=None):
         '''
         Gibt eine Liste von Tupeln (name, punkte, zeit) zurück.
             Key = name, Value = {’Punkte’: punkte, ’Zeit’: zeit}
@@ -89,11 +767,153 @@ class QuizRangliste():
             1. Punkte, absteigend
             2. Zeit, aufsteigend
             3. Name, alphabetisch aufsteigend: A=>Z
+
+        Die Sortierung wird laufend im Rangindex nachgeführt,
+        der Aufruf kostet daher nur einen Durchlauf über die Daten.
+
+        Mit von und/oder bis (nur im Verlaufs-Modus) enthält die Liste
+        die Summen der Teilresultate im Zeitfenster [von, bis), auf
+        ganze Zeit-Eimer erweitert, und nur Personen mit Resultaten im
+        Fenster. Die Summen stammen aus den vorverdichteten Eimern, der
+        Verlauf wird dafür nicht erneut durchlaufen.
+
+        Argumente:
+            von: float -- Beginn des Fensters, z.B. time.time() - 86400
+            bis: float -- Ende des Fensters (exklusive)
+
+        Fehler:
+            ValueError -- Zeitfenster ohne verlauf=True.
         '''
-        arr = []
-        for key, value in self.__file_data.items():
-            arr.append((key, value['Punkte'], value['Zeit']))
-        return sorted(arr, key=lambda x: (-x[1], x[2], x[0]))
+        with self.__sperre:
+            if von is None and bis is None:
+                return self.__speicher.bereich(0, len(self.__speicher))
+            if self.__verlauf is None:
+                raise ValueError('Zeitfenster nur mit verlauf=True')
+            return self.__verlauf.fenster(von, bis)
+
+    def werte(self, name):
+        '''
+        Gibt Punkte und Zeit einer Person zurück.
+
+        Argumente:
+            name: string
+
+        Rückgabewert:
+            Tupel (punkte, zeit),
+            None -- falls name nicht in der Liste ist.
+        '''
+        with self.__sperre:
+            return self.__speicher.werte(name)
+
+    def bereich(self, start, stop):
+        '''
+        Gibt die Einträge von als_liste()[start:stop] zurück, ohne die
+        ganze Liste aufzubauen (start und stop 0-basiert, nicht negativ).
+
+        Rückgabewert:
+            Liste von Tupeln (name, punkte, zeit)
+        '''
+        with self.__sperre:
+            return self.__speicher.bereich(start, stop)
+
+    def rank_of(self, name):
+        '''
+        Gibt den Rang (1 = bester) einer Person zurück.
+
+        Der Rang entspricht der Position in als_liste(), inklusive
+        der Sortierung nach Zeit und Name bei gleicher Punktzahl.
+
+        Argumente:
+            name: string
+
+        Rückgabewert:
+            int -- Rang der Person,
+            None -- falls name nicht in der Liste ist.
+        '''
+        with self.__sperre:
+            position = self.__speicher.position(name)
+            if position is None:
+                return None
+            return position + 1
+
+    def top_k(self, k):
+        '''
+        Gibt die ersten k Einträge von als_liste() zurück.
+
+        Argumente:
+            k: int -- Anzahl Einträge
+
+        Rückgabewert:
+            Liste von Tupeln (name, punkte, zeit)
+        '''
+        with self.__sperre:
+            return self.__speicher.bereich(0, k)
+
+    def around(self, name, radius):
+        '''
+        Gibt die Umgebung einer Person in der Rangliste zurück:
+        bis zu radius Einträge davor, die Person selbst und bis zu
+        radius Einträge danach.
+
+        Der Rang des ersten Eintrags lässt sich mit rank_of() abfragen.
+
+        Argumente:
+            name: string
+            radius: int -- Anzahl Nachbarn auf jeder Seite
+
+        Rückgabewert:
+            Liste von Tupeln (name, punkte, zeit),
+            leer falls name nicht in der Liste ist.
+        '''
+        with self.__sperre:
+            rang = self.rank_of(name)
+            if rang is None:
+                return []
+            start = max(rang - 1 - radius, 0)
+            return self.__speicher.bereich(start, rang + radius)
+
+    def __index(self):
+        # Der Namensindex wird erst bei der ersten Suche aufgebaut und
+        # danach bei jeder Änderung nachgeführt.
+        if self.__namensindex is None:
+            self.__namensindex = NamensIndex(self.__speicher.namen())
+        return self.__namensindex
+
+    def namen_suchen(self, praefix, anzahl=10):
+        '''
+        Gibt die Namen zurück, die mit praefix beginnen, alphabetisch
+        sortiert (z.B. für eine Autovervollständigung).
+
+        Argumente:
+            praefix: string
+            anzahl: int -- höchstens so viele Namen, None = alle
+
+        Rückgabewert:
+            Liste von Namen
+        '''
+        with self.__sperre:
+            return self.__index().mit_praefix(praefix, anzahl)
+
+    def aehnliche_namen(self, name, abstand=1):
+        '''
+        Gibt die Namen zurück, die sich höchstens um abstand Tippfehler
+        (eingefügte, fehlende oder falsche Zeichen) von name
+        unterscheiden, z.B. Noemii, Noem oder Naemi für Noemi.
+
+        Die Suche liest nur Namen mit passendem Anfang, nicht die ganze
+        Rangliste.
+
+        Argumente:
+            name: string
+            abstand: int -- grösste erlaubte Anzahl Tippfehler
+
+        Rückgabewert:
+            Liste von Tupeln (name, abstand), sortiert nach Abstand und
+            Name; name selbst ist mit Abstand 0 enthalten, falls er in
+            der Liste ist.
+        '''
+        with self.__sperre:
+            return self.__index().aehnlich(name, abstand)
 
     def als_string(self):
         '''
@@ -117,27 +937,86 @@ class QuizRangliste():
             2. Zeit, aufsteigend
             3. Name, alphabetisch aufsteigend: A=>Z
         '''
-        string = ''
-        arr = self.als_liste()
+        return ''.join(self.als_string_zeilen())
+
+    def als_string_zeilen(self, start=0, stop=None):
+        '''
+        Liefert die Zeilen von als_string() einzeln, inklusive
+        Zeilenumbruch, ohne den ganzen String aufzubauen.
+
+        Die Spaltenbreiten gelten wie bei als_string() für die ganze
+        Rangliste. Sie werden beim ersten Aufruf einmal bestimmt und
+        danach bei jeder Änderung nachgeführt, eine Zeile kostet damit
+        nur konstante Zeit. Die Einträge werden in Blöcken aus dem
+        Rangindex geholt; Änderungen während des Durchlaufs können
+        Einträge verschieben.
+
+        Argumente:
+            start: int -- erste Position (0-basiert)
+            stop: int -- Position nach der letzten Zeile, None = Ende
+
+        Rückgabewert:
+            Generator von Strings "name | punkte | zeit\\n"
+        '''
+        with self.__sperre:
+            breiten = self.__spaltenbreiten()
+            if stop is None:
+                stop = len(self.__speicher)
+        if not breiten:
+            return
+        name_len, punkte_len, zeit_len = breiten
+        start = max(start, 0)
+        while start < stop:
+            ende = min(start + self._ZEILEN_BLOCK, stop)
+            with self.__sperre:
+                zeilen = self.__speicher.bereich(start, ende)
+            if not zeilen:
+                return
+            for zeile in zeilen:
+                name, punkte, zeit = self.__zellen(*zeile)
+                yield (name.ljust(name_len, ' ') + ' | ' +
+                       punkte.rjust(punkte_len, ' ') + ' | ' +
+                       zeit.rjust(zeit_len, ' ') + '\n')
+            start = ende
 
-        if(len(arr) > 0):
-            name_len = max([len(x) for x in self.__file_data])
-            punkte_len = max(
-                [len(str(self.__file_data[x]['Punkte']))
-                    for x in self.__file_data]
-            )
-            zeit_len = max(
-                [len(str(round(self.__file_data[x]['Zeit'], 1)))
-                    for x in self.__file_data]
-            )
+    def als_string_seite(self, seite, pro_seite=50):
+        '''
+        Gibt eine Seite von als_string() zurück, z.B. für eine
+        Web-Ansicht. Seite 1 enthält die Ränge 1 bis pro_seite.
+
+        Die Kosten hängen nur von der Seitengrösse ab, nicht von der
+        Grösse der Rangliste.
+
+        Argumente:
+            seite: int -- Seitennummer (1-basiert)
+            pro_seite: int -- Anzahl Zeilen pro Seite
+
+        Rückgabewert:
+            string -- leer, falls die Seite keine Einträge hat.
+        '''
+        if seite < 1:
+            return ''
+        start = (seite - 1) * pro_seite
+        return ''.join(self.als_string_zeilen(start, start + pro_seite))
 
-            for line in arr:
-                string += line[0].ljust(name_len, ' ') + ' | '
-                string += str(line[1]).rjust(punkte_len, ' ') + ' | '
-                string += str(round(line[2], 1)).rjust(zeit_len, ' ') + '\n'
-        return string
+    def anzahl_seiten(self, pro_seite=50):
+        '''
+        Gibt die Anzahl Seiten für als_string_seite() zurück.
 
-    def resultat_addieren(self, name, punkte, zeit):
+        Argumente:
+            pro_seite: int -- Anzahl Zeilen pro Seite
+        '''
+        with self.__sperre:
+            return -(-len(self.__speicher) // pro_seite)
+
+    def __abgelehnt(self, anzahl=1):
+        # Ungültiges Resultat, mit messung gezählt
+        if self.__messung is not None:
+            self.__messung.zaehlen('rangliste.resultat_addieren.abgelehnt',
+                                   anzahl)
+        return False
+
+    def resultat_addieren(self, name, punkte, zeit, zeitpunkt=None):
         '''
         Fügt einer Person (name) weitere Punkte und Zeit hinzu.
 
@@ -146,44 +1025,187 @@ class QuizRangliste():
         Falls name nicht existiert: neuen Namen anlegen.
 
         Argumente:
-            name: string, (darf keine Kommazeichen enthalten)
+            name: string, (darf keine Komma- oder Zeilenumbruchzeichen
+                enthalten)
             punkte: int oder string,
-            zeit: float oder string
+            zeit: float oder string,
+            zeitpunkt: float -- nur im Verlaufs-Modus, Zeitpunkt des
+                Resultats in Sekunden, None = jetzt (time.time())
 
         Rückgabewert:
             False: Boolean - bei ungültigen Argumenten,
             True: Boolean -  falls fehlerfrei.
         '''
-        if ',' in name:
-            return False
+        if ',' in name or '\n' in name or '\r' in name:
+            return self.__abgelehnt()
         try:
             name = str(name)
             punkte = int(punkte)
             zeit = float(zeit)
+            zeitpunkt = self.__zeitpunkt(zeitpunkt)
         except Exception:
-            return False
+            return self.__abgelehnt()
+        aenderung = (punkte, zeit)
 
-        if name in self.__file_data:
-            self.__file_data[name]['Punkte'] += punkte
-            self.__file_data[name]['Zeit'] += zeit
-        else:
-            self.__file_data[name] = {'Punkte': punkte, 'Zeit': zeit}
+        with self.__sperre:
+            werte = self.__speicher.werte(name)
+            if werte is not None:
+                punkte += werte[0]
+                zeit += werte[1]
+            # NaN lässt sich nicht sortieren
+            if zeit != zeit:
+                return self.__abgelehnt()
+
+            try:
+                self.__speicher.setzen(name, punkte, zeit)
+            except OverflowError:
+                return self.__abgelehnt()
+            self.__geaendert(name, werte, (punkte, zeit))
+            self.__aenderung_merken(name, *aenderung)
+            if self.__journal is not None:
+                self.__journal_schreiben(
+                    '{},{},{!r}\n'.format(name, punkte, zeit))
+            if self.__verlauf is not None:
+                self.__verlauf_schreiben(zeitpunkt, name, *aenderung)
 
         return True
 
+    def resultat_addieren_batch(self, resultate=(), spalten=None,
+                                zeitpunkt=None):
+        '''
+        Fügt viele Teilresultate auf einmal hinzu.
+
+        Die Zeilen werden wie bei resultat_addieren() geprüft, danach
+        pro Name zusammengezählt und mit einer einzigen Änderung pro
+        Name übernommen (Rangindex, Journal).
+
+        Ergibt die Summe für einen Namen eine ungültige Zeit (NaN) oder
+        zu grosse Punkte, werden alle Zeilen dieses Namens abgelehnt.
+
+        Argumente:
+            resultate: iterable von Tupeln (name, punkte, zeit)
+            spalten: Tupel (namen, punkte, zeiten) mit drei gleich
+                langen Sequenzen, anstelle von resultate
+            zeitpunkt: float -- wie bei resultat_addieren(), für alle
+                Zeilen gleich
+
+        Rückgabewert:
+            Liste der Indizes (0-basiert) der abgelehnten Zeilen,
+            leer falls alle Zeilen übernommen wurden.
+        '''
+        if spalten is not None:
+            resultate = zip(*spalten)
+        zeitpunkt = self.__zeitpunkt(zeitpunkt)
+
+        summen = {}
+        namen = []
+        fehler = []
+        for index, zeile in enumerate(resultate):
+            try:
+                name, punkte, zeit = zeile
+                if ',' in name or '\n' in name or '\r' in name:
+                    raise ValueError(name)
+                name = str(name)
+                punkte = int(punkte)
+                zeit = float(zeit)
+                # NaN lässt sich nicht sortieren
+                if zeit != zeit:
+                    raise ValueError(zeit)
+            except Exception:
+                fehler.append(index)
+                namen.append(None)
+                continue
+            namen.append(name)
+            summe = summen.get(name)
+            if summe is None:
+                summen[name] = [punkte, zeit]
+            else:
+                summe[0] += punkte
+                summe[1] += zeit
+
+        abgelehnt = set()
+        with self.__sperre:
+            for name, (punkte, zeit) in summen.items():
+                werte = self.__speicher.werte(name)
+                if werte is not None:
+                    punkte += werte[0]
+                    zeit += werte[1]
+                if zeit != zeit:
+                    abgelehnt.add(name)
+                    continue
+                try:
+                    self.__speicher.setzen(name, punkte, zeit)
+                except OverflowError:
+                    abgelehnt.add(name)
+                    continue
+                self.__geaendert(name, werte, (punkte, zeit))
+                self.__aenderung_merken(name, *summen[name])
+                if self.__verlauf is not None:
+                    self.__verlauf_schreiben(zeitpunkt, name, *summen[name])
+                if self.__journal is not None:
+                    self.__journal_schreiben(
+                        '{},{},{!r}\n'.format(name, punkte, zeit))
+
+        if abgelehnt:
+            fehler.extend(index for index, name in enumerate(namen)
+                          if name in abgelehnt)
+            fehler.sort()
+        if fehler:
+            self.__abgelehnt(len(fehler))
+        return fehler
+
     def name_entfernen(self, name):
         '''
         Löscht die Person (name, punkte und zeit) von der Liste.
         Falls die angegebene Person (name) nicht in der Liste ist,
         passiert nichts.
 
+        Im gleichzeitigen Modus wird die Löschung trotzdem vorgemerkt,
+        da ein anderer Prozess die Person inzwischen angelegt haben kann.
+
         Argumente:
             name: string
         '''
-        if name in self.__file_data:
-            del self.__file_data[name]
+        with self.__sperre:
+            if self.__dateisperre is not None:
+                self.__deltas.pop(name, None)
+                self.__entfernt.add(name)
+            werte = self.__speicher.werte(name)
+            if werte is not None:
+                self.__speicher.loeschen(name)
+                self.__geaendert(name, alt=werte)
+                if self.__journal is not None:
+                    self.__journal_schreiben('-,{}\n'.format(name))
+            if (self.__verlauf is not None
+                    and self.__verlauf.summe(name) is not None):
+                self.__verlauf.entfernen(name)
+                self.__verlauf_datei.write('-,{}\n'.format(name))
+                self.__verlauf_zeilen += 1
+
+    def ist_geaendert(self):
+        '''
+        Gibt zurück, ob die Textdatei neu geschrieben werden muss, d.h.
+        ob seit dem letzten Laden oder Speichern Resultate hinzugefügt
+        oder Personen entfernt wurden (auch über das Journal) oder die
+        Datei inzwischen von aussen verändert wurde.
+
+        Rückgabewert:
+            True oder False: Boolean
+        '''
+        with self.__sperre:
+            if self.__dateisperre is not None:
+                return bool(self.__deltas or self.__entfernt)
+            if self.__journal_eintraege or self.__stand is None:
+                return True
+            if self.__stand[0] != self.__aenderungen:
+                return True
+            try:
+                stat = os.stat(self.__file_name)
+            except OSError:
+                return True
+            return self.__stand[1:] != (stat.st_size, stat.st_mtime_ns)
 
-    def speichern(self, als=None):
+    def speichern(self, als=None, snapshot=None):
         '''
         Schreibt die Daten als Kommagetrennte Werte (CSV)
         in die ursprüngliche Textdatei.
@@ -198,10 +1220,101 @@ class QuizRangliste():
             1. Punkte, absteigend
             2. Zeit, aufsteigend
             3. Name, alphabetisch aufsteigend: A=>Z
+
+        Im Journal-Modus wird ohne 'als' nur das Journal auf die Platte
+        geschrieben. Erst wenn es mindestens so viele Einträge wie die
+        Rangliste hat, wird mit kompaktieren() die Textdatei erneuert.
+
+        Mit speicher='sqlite' werden ohne 'als' nur alle Änderungen seit
+        dem letzten Aufruf in einer Transaktion in die Datenbank
+        geschrieben, die Textdatei erneuert kompaktieren().
+
+        Mit snapshot=True wird zusätzlich ein binärer Snapshot
+        als + '.snapshot' geschrieben. None übernimmt die Einstellung
+        aus dem Konstruktor.
+
+        Im gleichzeitigen Modus werden ohne 'als' die eigenen Änderungen
+        mit dem aktuellen Inhalt der Datei zusammengeführt (siehe
+        Konstruktor).
+
+        Die Datei wird über eine temporäre Datei atomar ersetzt, ein
+        Absturz hinterlässt also nie eine halb geschriebene Rangliste.
+        Ohne 'als' und ohne Änderungen seit dem letzten Laden oder
+        Speichern (siehe ist_geaendert()) wird nichts geschrieben.
+
+        Fehler:
+            OSError -- falls die Datei nicht geschrieben werden kann;
+                sie bleibt dann unverändert.
         '''
-        if als is None:
-            als = self.__file_name
-        self.__write_data_to_file(als, )
+        if snapshot is None:
+            snapshot = self.__snapshot
+        if self.__verlauf is not None:
+            self.__verlauf_sichern()
+        if als is None and self.__dateisperre is not None:
+            self.__zusammenfuehren()
+            return
+        if als is None and self.__journal is not None:
+            self.__journal.flush()
+            os.fsync(self.__journal.fileno())
+            if self.__journal_eintraege >= max(self._JOURNAL_MIN,
+                                               len(self.__speicher)):
+                self.kompaktieren()
+            return
+        if als is None and self.__speicher_typ.ENDUNG is not None:
+            with self.__sperre:
+                self.__speicher.sichern()
+            return
+        with self.__sperre:
+            if als is None:
+                if not self.ist_geaendert() and not (
+                        snapshot and not os.path.exists(self.__snapshot_name)):
+                    if self.__messung is not None:
+                        self.__messung.zaehlen(
+                            'rangliste.speichern.uebersprungen')
+                    return
+                als = self.__file_name
+            self.__write_data_to_file(als)
+            if snapshot:
+                self.__snapshot_schreiben(als)
+            if als == self.__file_name:
+                self.__stand_merken()
+
+    def kompaktieren(self):
+        '''
+        Schreibt alle Daten in die ursprüngliche Textdatei und leert
+        anschliessend das Journal. Mit speicher='sqlite' wird danach die
+        Datenbank als abgeglichen vermerkt.
+
+        Die Textdatei wird über eine temporäre Datei ersetzt, damit ein
+        Absturz keine halb geschriebene Rangliste hinterlässt.
+        Ohne Journal-Modus und ohne speicher='sqlite' entspricht der
+        Aufruf speichern().
+
+        Fehler:
+            OSError -- wie bei speichern(), das Journal bleibt dann
+                erhalten.
+        '''
+        dauerhaft = self.__speicher_typ.ENDUNG is not None
+        if self.__journal is None and not dauerhaft:
+            self.speichern()
+            return
+
+        with self.__sperre:
+            if self.ist_geaendert():
+                self.__write_data_to_file(self.__file_name)
+                if self.__snapshot:
+                    self.__snapshot_schreiben(self.__file_name)
+                self.__stand_merken()
+            if dauerhaft and self.__stand is not None:
+                self.__speicher.stand_setzen(*self.__stand[1:])
+
+        if self.__journal is not None:
+            self.__journal.seek(0)
+            self.__journal.truncate()
+            self.__journal_eintraege = 0
+        if self.__verlauf is not None:
+            with self.__sperre:
+                self.__verlauf_verdichten()
 
 
 # --- Test --------------------------------------------------------------------
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# rangindex.py
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain, islice
+
+
+class SortierteListe():
+    '''
+    Sortierte Liste aus Teillisten (Blöcken) mit begrenzter Länge.
+
+    Einfügen und Entfernen suchen den Block per Binärsuche über die
+    Block-Maxima und verschieben danach nur die Elemente innerhalb
+    eines Blocks. Die Kosten pro Änderung sind damit logarithmisch
+    plus ein kleiner, konstanter Anteil für den Block.
+
+    Für Positionsabfragen wird ein Fenwick-Baum über den Blocklängen
+    geführt. Er wird nur bei Blockteilungen oder -löschungen neu
+    aufgebaut, sonst in logarithmischer Zeit nachgeführt.
+
+    Mit einer Schlüsselfunktion wird nach schluessel(wert) sortiert,
+    mit einem Typcode werden die Blöcke als kompakte array.array statt
+    als Listen geführt (z.B. Zeilennummern mit typcode='q').
+
+    Die Elemente (bzw. ihre Schlüssel) müssen untereinander vergleichbar
+    und eindeutig sein.
+    '''
+
+    # Zielgrösse eines Blocks, ab dem doppelten Wert wird geteilt
+    _LAST = 1000
+
+    def __init__(self, werte=(), schluessel=None, typcode=None,
+                 sortiert=False):
+        '''
+        Initialisierung der sortierten Liste.
+
+        Argumente:
+            werte: iterable -- Startwerte, müssen nicht sortiert sein.
+            schluessel: callable -- Sortierschlüssel, None = Wert selbst.
+            typcode: string -- Typcode für array-Blöcke, None = Listen.
+            sortiert: bool -- werte sind bereits sortiert (Sequenz).
+        '''
+        self._schluessel = schluessel
+        self._typcode = typcode
+        self._listen = []
+        self._maxima = []
+        self._anzahl = 0
+        self._baum = None
+        if not sortiert:
+            werte = sorted(werte, key=schluessel)
+        self.__aus_sortiert(werte)
+
+    def __aus_sortiert(self, werte):
+        last = self._LAST
+        self._listen = [self.__block(werte[i:i + last])
+                        for i in range(0, len(werte), last)]
+        self._maxima = [self.__schluessel(liste[-1]) for liste in self._listen]
+        self._anzahl = len(werte)
+        self._baum = None
+
+    def __block(self, werte):
+        if self._typcode is None:
+            return werte
+        return array(self._typcode, werte)
+
+    def __schluessel(self, wert):
+        if self._schluessel is None:
+            return wert
+        return self._schluessel(wert)
+
+    def __len__(self):
+        return self._anzahl
+
+    def __iter__(self):
+        return chain.from_iterable(self._listen)
+
+    def __getitem__(self, index):
+        '''
+        Liefert den Wert an einer Position oder eine Liste für einen
+        Slice (Schrittweite 1).
+        '''
+        if isinstance(index, slice):
+            start, stop, schritt = index.indices(self._anzahl)
+            if schritt != 1:
+                return list(self)[index]
+            return self.bereich(start, stop)
+        if index < 0:
+            index += self._anzahl
+        if not 0 <= index < self._anzahl:
+            raise IndexError('Index ausserhalb der Liste')
+        i, j = self.__suchen(index)
+        return self._listen[i][j]
+
+    def __contains__(self, wert):
+        schluessel = self.__schluessel(wert)
+        i = bisect_left(self._maxima, schluessel)
+        if i == len(self._maxima):
+            return False
+        liste = self._listen[i]
+        j = bisect_left(liste, schluessel, key=self._schluessel)
+        return liste[j] == wert
+
+    def position(self, wert):
+        '''
+        Liefert die Position (0-basiert) eines enthaltenen Werts.
+
+        Argumente:
+            wert -- gesuchter Wert
+
+        Fehler:
+            ValueError -- falls der Wert nicht enthalten ist.
+        '''
+        schluessel = self.__schluessel(wert)
+        i = bisect_left(self._maxima, schluessel)
+        if i == len(self._maxima):
+            raise ValueError('Wert nicht enthalten: {!r}'.format(wert))
+        liste = self._listen[i]
+        j = bisect_left(liste, schluessel, key=self._schluessel)
+        if liste[j] != wert:
+            raise ValueError('Wert nicht enthalten: {!r}'.format(wert))
+        return self.__vor_block(i) + j
+
+    def bereich(self, start, stop):
+        '''
+        Liefert die Werte der Positionen start bis stop (exklusive).
+
+        Die Kosten sind logarithmisch für die Suche des Startblocks
+        plus linear in der Anzahl gelieferter Werte.
+
+        Argumente:
+            start: int -- erste Position (0-basiert)
+            stop: int -- Position nach dem letzten Wert
+        '''
+        start = max(start, 0)
+        stop = min(stop, self._anzahl)
+        if start >= stop:
+            return []
+        i, j = self.__suchen(start)
+        werte = []
+        fehlend = stop - start
+        while fehlend > 0:
+            teil = self._listen[i][j:j + fehlend]
+            werte.extend(teil)
+            fehlend -= len(teil)
+            i, j = i + 1, 0
+        return werte
+
+    def ab(self, schluessel):
+        '''
+        Iteriert in sortierter Reihenfolge über alle Werte ab dem
+        ersten Wert, dessen Schlüssel nicht kleiner als schluessel ist.
+
+        Der Einstieg kostet zwei Binärsuchen, jeder weitere Wert
+        konstante Zeit. Die Liste darf während der Iteration nicht
+        verändert werden.
+
+        Argumente:
+            schluessel -- Untergrenze (Schlüssel, ohne Schlüsselfunktion
+                der Wert selbst)
+        '''
+        i = bisect_left(self._maxima, schluessel)
+        if i == len(self._listen):
+            return iter(())
+        liste = self._listen[i]
+        j = bisect_left(liste, schluessel, key=self._schluessel)
+        # Blöcke erst beim Weiterlesen holen, ohne Kopie der Blockliste
+        return chain(islice(liste, j, None), chain.from_iterable(map(
+            self._listen.__getitem__, range(i + 1, len(self._listen)))))
+
+    def __baum_aufbauen(self):
+        # Fenwick-Baum über den Blocklängen in O(Anzahl Blöcke)
+        baum = [0]
+        baum.extend(len(liste) for liste in self._listen)
+        groesse = len(baum)
+        for i in range(1, groesse):
+            j = i + (i & -i)
+            if j < groesse:
+                baum[j] += baum[i]
+        self._baum = baum
+        return baum
+
+    def __baum_aendern(self, i, differenz):
+        baum = self._baum
+        if baum is None:
+            return
+        i += 1
+        while i < len(baum):
+            baum[i] += differenz
+            i += i & -i
+
+    def __vor_block(self, i):
+        # Anzahl Werte in den Blöcken vor Block i
+        baum = self._baum or self.__baum_aufbauen()
+        summe = 0
+        while i > 0:
+            summe += baum[i]
+            i -= i & -i
+        return summe
+
+    def __suchen(self, index):
+        # Block und Position im Block zu einer globalen Position
+        baum = self._baum or self.__baum_aufbauen()
+        i = 0
+        schritt = 1 << (len(baum).bit_length() - 1)
+        while schritt:
+            k = i + schritt
+            if k < len(baum) and baum[k] <= index:
+                i = k
+                index -= baum[k]
+            schritt >>= 1
+        return i, index
+
+    def hinzufuegen(self, wert):
+        '''
+        Fügt einen Wert an der sortierten Position ein.
+
+        Argumente:
+            wert -- einzufügender, noch nicht enthaltener Wert
+        '''
+        schluessel = self.__schluessel(wert)
+        if not self._listen:
+            self._listen.append(self.__block([wert]))
+            self._maxima.append(schluessel)
+            self._anzahl = 1
+            self._baum = None
+            return
+
+        i = bisect_right(self._maxima, schluessel)
+        if i == len(self._maxima):
+            # neues Maximum: an den letzten Block anhängen
+            i -= 1
+            self._listen[i].append(wert)
+            self._maxima[i] = schluessel
+        else:
+            insort(self._listen[i], wert, key=self._schluessel)
+        self._anzahl += 1
+
+        if len(self._listen[i]) > 2 * self._LAST:
+            self.__teilen(i)
+        else:
+            self.__baum_aendern(i, 1)
+
+    def entfernen(self, wert):
+        '''
+        Entfernt einen Wert aus der Liste.
+
+        Argumente:
+            wert -- zu entfernender Wert
+
+        Fehler:
+            ValueError -- falls der Wert nicht enthalten ist.
+        '''
+        schluessel = self.__schluessel(wert)
+        i = bisect_left(self._maxima, schluessel)
+        if i == len(self._maxima):
+            raise ValueError('Wert nicht enthalten: {!r}'.format(wert))
+        liste = self._listen[i]
+        j = bisect_left(liste, schluessel, key=self._schluessel)
+        if liste[j] != wert:
+            raise ValueError('Wert nicht enthalten: {!r}'.format(wert))
+
+        del liste[j]
+        self._anzahl -= 1
+        if not liste:
+            del self._listen[i]
+            del self._maxima[i]
+            self._baum = None
+            return
+        if j == len(liste):
+            self._maxima[i] = self.__schluessel(liste[-1])
+        self.__baum_aendern(i, -1)
+
+    def __teilen(self, i):
+        liste = self._listen[i]
+        haelfte = len(liste) // 2
+        self._listen[i:i + 1] = [liste[:haelfte], liste[haelfte:]]
+        self._maxima[i:i + 1] = [self.__schluessel(liste[haelfte - 1]),
+                                 self.__schluessel(liste[-1])]
+        self._baum = None
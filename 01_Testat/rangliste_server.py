@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+# rangliste_server.py
+
+import argparse
+import asyncio
+import json
+import time
+
+from quizrangliste import QuizRangliste
+from speicher import SPEICHER
+
+
+class RanglistenServer():
+    '''
+    Asyncio-Dienst vor einer residenten QuizRangliste.
+
+    Die Rangliste wird nur einmal eingelesen. Resultate werden
+    gesammelt und gebündelt übernommen (resultat_addieren_batch() und
+    speichern()), sobald max_batch Resultate warten oder spätestens
+    nach intervall Sekunden. Ein Resultat wird erst nach dem Speichern
+    bestätigt. Abfragen werden sofort aus dem Arbeitsspeicher
+    beantwortet und sehen ein Resultat erst, wenn sein Bündel
+    übernommen ist.
+
+    speichern() (fsync, Commit, Kompaktieren) läuft in einem
+    Worker-Thread, damit der Event-Loop währenddessen weiter Befehle
+    annimmt. Es läuft höchstens ein Speichern gleichzeitig; Resultate,
+    die in dieser Zeit eintreffen, werden danach im nächsten Bündel
+    übernommen. Schlägt das Speichern fehl, bleiben die übernommenen
+    Resultate unbestätigt und das Speichern wird nach intervall
+    wiederholt; erst wenn es auch beim Beenden fehlschlägt, werden
+    sie mit einem Fehler beantwortet.
+
+    Protokoll: eine Zeile pro Befehl (UTF-8), eine JSON-Zeile pro
+    Antwort, in der Reihenfolge der Befehle. Mehrere Befehle dürfen
+    gesendet werden, ohne auf die Antworten zu warten.
+
+        ADD name,punkte,zeit    -> {"ok": true}
+        RANK name               -> {"ok": true, "rang": 3}
+        TOP k                   -> {"ok": true, "liste": [[name, p, z]]}
+        AROUND name radius      -> {"ok": true, "liste": [...]}
+        PAGE seite [pro_seite]  -> {"ok": true, "text": "..."}
+        STATS                   -> {"ok": true, "statistik": {...}}
+
+    Fehler werden als {"ok": false, "fehler": "..."} beantwortet.
+    '''
+
+    def __init__(self, rangliste, max_batch=1000, intervall=0.05):
+        '''
+        Argumente:
+            rangliste: QuizRangliste -- wird vom Event-Loop benutzt,
+                nur speichern() läuft in einem Worker-Thread. Mit
+                journal=True kostet ein Speichern nur ein fsync, mit
+                speicher='sqlite' ein Commit.
+            max_batch: int -- Anzahl wartender Resultate, ab der sofort
+                gespeichert wird.
+            intervall: float -- maximale Wartezeit (Sekunden) eines
+                Resultats bis zum Speichern.
+        '''
+        self._rangliste = rangliste
+        self._max_batch = max_batch
+        self._intervall = intervall
+        self._wartend = []
+        self._zusagen = []
+        self._zeitgeber = None
+        self._speichern = None
+        # übernommene, aber noch nicht gespeicherte Resultate
+        self._ungespeichert = []
+        self._speicherfehler = None
+        self._server = None
+        self._verbindungen = {}
+        self._start = time.perf_counter()
+        self._zaehler = {
+            'verbindungen': 0,
+            'resultate': 0,
+            'abgelehnt': 0,
+            'schreibvorgaenge': 0,
+            'speicherfehler': 0,
+            'anfragen': 0,
+        }
+        # Latenzen in Sekunden: [Anzahl, Summe, Maximum]
+        self._latenz = {'resultat': [0, 0.0, 0.0], 'anfrage': [0, 0.0, 0.0]}
+
+    async def starten(self, host='127.0.0.1', port=0, pfad=None):
+        '''
+        Startet den Server auf TCP (host, port) oder, falls pfad
+        angegeben ist, auf einem Unix-Socket.
+
+        Rückgabewert:
+            asyncio.Server -- z.B. für server.sockets[0].getsockname()
+        '''
+        if pfad is not None:
+            self._server = await asyncio.start_unix_server(
+                self.__verbindung, path=pfad)
+        else:
+            self._server = await asyncio.start_server(
+                self.__verbindung, host, port)
+        return self._server
+
+    async def beenden(self):
+        '''
+        Nimmt keine Verbindungen mehr an, speichert wartende Resultate
+        und schliesst die offenen Verbindungen.
+        '''
+        if self._server is not None:
+            self._server.close()
+        speichern = self.__schreiben()
+        if speichern is not None:
+            await speichern
+        if self._zeitgeber is not None:
+            self._zeitgeber.cancel()
+            self._zeitgeber = None
+        # Speichern endgültig fehlgeschlagen: die Resultate gehen mit
+        # dem Beenden verloren und dürfen erneut gesendet werden
+        ungespeichert, self._ungespeichert = self._ungespeichert, []
+        for zusage, _ in ungespeichert:
+            if not zusage.done():
+                zusage.set_result({'ok': False,
+                                   'fehler': self._speicherfehler})
+        # Verbindungen abbrechen; die Antworten auf bereits gelesene
+        # Befehle werden noch geschrieben (siehe __verbindung)
+        for aufgabe in self._verbindungen:
+            aufgabe.cancel()
+        await asyncio.gather(*self._verbindungen, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def statistik(self):
+        '''
+        Gibt die Zähler als Dictionary zurück: Anzahl Resultate,
+        Abfragen, Schreibvorgänge, Durchsatz (Resultate pro Sekunde seit
+        dem Start) und Latenzen in Millisekunden (Mittel und Maximum).
+        '''
+        dauer = time.perf_counter() - self._start
+        statistik = dict(self._zaehler)
+        statistik['wartend'] = len(self._wartend)
+        statistik['resultate_pro_sekunde'] = (
+            self._zaehler['resultate'] / dauer if dauer > 0 else 0.0)
+        for art, (anzahl, summe, maximum) in self._latenz.items():
+            statistik['latenz_' + art + '_ms'] = {
+                'mittel': 1000 * summe / anzahl if anzahl else 0.0,
+                'maximum': 1000 * maximum,
+            }
+        return statistik
+
+    def __messen(self, art, beginn):
+        latenz = self._latenz[art]
+        dauer = time.perf_counter() - beginn
+        latenz[0] += 1
+        latenz[1] += dauer
+        if dauer > latenz[2]:
+            latenz[2] = dauer
+
+    async def __verbindung(self, reader, writer):
+        # Antworten werden in der Reihenfolge der Befehle geschrieben,
+        # auch wenn ein ADD auf das nächste Speichern wartet.
+        self._zaehler['verbindungen'] += 1
+        aufgabe = asyncio.current_task()
+        self._verbindungen[aufgabe] = writer
+        antworten = asyncio.Queue()
+        schreiber = asyncio.ensure_future(
+            self.__antworten_schreiben(writer, antworten))
+        try:
+            async for zeile in reader:
+                antworten.put_nowait(self.__bearbeiten(
+                    zeile.decode('utf-8', 'replace').strip()))
+        except (ConnectionError, ValueError):
+            # Verbindung abgebrochen oder Zeile zu lang
+            pass
+        except asyncio.CancelledError:
+            # von beenden(): keine Befehle mehr lesen, die Antworten
+            # auf die bisherigen aber noch schreiben
+            pass
+        finally:
+            antworten.put_nowait(None)
+            await schreiber
+            del self._verbindungen[aufgabe]
+
+    async def __antworten_schreiben(self, writer, antworten):
+        try:
+            while True:
+                antwort = await antworten.get()
+                if antwort is None:
+                    break
+                antwort = await antwort
+                writer.write(json.dumps(antwort).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def __bearbeiten(self, zeile):
+        # Liefert ein Future mit der Antwort auf einen Befehl
+        beginn = time.perf_counter()
+        befehl, _, argumente = zeile.partition(' ')
+        befehl = befehl.upper()
+        if befehl == 'ADD':
+            return self.__resultat(argumente, beginn)
+
+        antwort = asyncio.get_running_loop().create_future()
+        try:
+            antwort.set_result(self.__abfrage(befehl, argumente.split()))
+        except (ValueError, TypeError, IndexError) as fehler:
+            antwort.set_result({'ok': False, 'fehler': str(fehler)})
+        self._zaehler['anfragen'] += 1
+        self.__messen('anfrage', beginn)
+        return antwort
+
+    def __abfrage(self, befehl, argumente):
+        rangliste = self._rangliste
+        if befehl == 'RANK':
+            return {'ok': True, 'rang': rangliste.rank_of(argumente[0])}
+        if befehl == 'TOP':
+            return {'ok': True, 'liste': rangliste.top_k(int(argumente[0]))}
+        if befehl == 'AROUND':
+            return {'ok': True, 'liste': rangliste.around(
+                argumente[0], int(argumente[1]))}
+        if befehl == 'PAGE':
+            return {'ok': True, 'text': rangliste.als_string_seite(
+                *[int(x) for x in argumente[:2]])}
+        if befehl == 'STATS':
+            return {'ok': True, 'statistik': self.statistik()}
+        raise ValueError('Unbekannter Befehl: {!r}'.format(befehl))
+
+    def __resultat(self, argumente, beginn):
+        # Resultat vormerken, das Future wird beim Speichern erfüllt
+        zusage = asyncio.get_running_loop().create_future()
+        self._wartend.append(tuple(argumente.split(',', 2)))
+        self._zusagen.append((zusage, beginn))
+
+        if len(self._wartend) >= self._max_batch:
+            self.__schreiben()
+        elif self._zeitgeber is None:
+            self._zeitgeber = asyncio.get_running_loop().call_later(
+                self._intervall, self.__schreiben)
+        return zusage
+
+    def __schreiben(self):
+        # Speichern der wartenden Resultate anstossen. Läuft bereits
+        # ein Speichern, übernimmt es danach auch die neuen Resultate.
+        # Rückgabewert: die laufende Aufgabe oder None
+        if self._zeitgeber is not None:
+            self._zeitgeber.cancel()
+            self._zeitgeber = None
+        if self._speichern is None and (self._wartend or
+                                        self._ungespeichert):
+            self._speichern = asyncio.ensure_future(self.__speichern())
+        return self._speichern
+
+    async def __speichern(self):
+        # Bündel übernehmen, bis keine Resultate mehr warten. Schlägt
+        # das Speichern fehl, wird es nach intervall wiederholt.
+        try:
+            while self._wartend or self._ungespeichert:
+                if self._zeitgeber is not None:
+                    self._zeitgeber.cancel()
+                    self._zeitgeber = None
+                wartend, self._wartend = self._wartend, []
+                zusagen, self._zusagen = self._zusagen, []
+                if not await self.__buendel_speichern(wartend, zusagen):
+                    self._zeitgeber = asyncio.get_running_loop().call_later(
+                        self._intervall, self.__schreiben)
+                    break
+        finally:
+            self._speichern = None
+
+    async def __buendel_speichern(self, wartend, zusagen):
+        # Übernehmen im Event-Loop (wie die Abfragen), nur das
+        # blockierende Speichern im Worker-Thread.
+        # Rückgabewert: False, falls speichern() fehlgeschlagen ist
+        try:
+            abgelehnt = set(self._rangliste.resultat_addieren_batch(wartend))
+        except Exception as fehler:
+            for zusage, _ in zusagen:
+                if not zusage.done():
+                    zusage.set_result({'ok': False, 'fehler': str(fehler)})
+            return True
+
+        self._zaehler['abgelehnt'] += len(abgelehnt)
+        for index, (zusage, beginn) in enumerate(zusagen):
+            if zusage.done():
+                continue
+            if index in abgelehnt:
+                zusage.set_result({'ok': False,
+                                   'fehler': 'Ungültiges Resultat'})
+                self.__messen('resultat', beginn)
+            else:
+                self._ungespeichert.append((zusage, beginn))
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._rangliste.speichern)
+        except Exception as fehler:
+            # Die Resultate sind bereits in der Rangliste: nicht als
+            # Fehler melden, ein erneutes Senden würde sie doppelt
+            # zählen. Bestätigt wird nach dem nächsten Speichern.
+            self._zaehler['speicherfehler'] += 1
+            self._speicherfehler = str(fehler)
+            return False
+
+        self._zaehler['schreibvorgaenge'] += 1
+        ungespeichert, self._ungespeichert = self._ungespeichert, []
+        for zusage, beginn in ungespeichert:
+            if zusage.done():
+                continue
+            zusage.set_result({'ok': True})
+            self._zaehler['resultate'] += 1
+            self.__messen('resultat', beginn)
+        return True
+
+
+async def _main(argumente):
+    # Engines mit eigener Datei (sqlite) brauchen kein Journal
+    journal = SPEICHER[argumente.speicher].ENDUNG is None
+    rangliste = QuizRangliste(argumente.datei, journal=journal,
+                              speicher=argumente.speicher,
+                              snapshot=argumente.snapshot)
+    server = RanglistenServer(rangliste, argumente.batch,
+                              argumente.intervall)
+    await server.starten(argumente.host, argumente.port, argumente.unix)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.beenden()
+
+
+# --- Start -------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Lokaler Dienst für Resultate und Ranglisten-Abfragen.')
+    parser.add_argument('datei', nargs='?', default='rangliste.txt')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PFAD',
+                        help='Unix-Socket statt TCP verwenden')
+    parser.add_argument('--speicher', default='dict',
+                        choices=sorted(SPEICHER))
+    parser.add_argument('--snapshot', action='store_true')
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--intervall', type=float, default=0.05)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# saison.py
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from quizrangliste import QuizRangliste
+from rangindex import SortierteListe
+
+
+def _laden(datei, optionen):
+    # im Worker-Prozess: Rangliste einlesen, per pickle zurückgeben
+    return QuizRangliste(datei, **optionen)
+
+
+class SaisonRangliste():
+    '''
+    Gesamtrangliste über mehrere Quizze, mit je einer QuizRangliste
+    (Shard) pro Quiz.
+
+    Die Gesamtwerte einer Person sind die Summen von Punkten und Zeit
+    über alle Shards, sortiert wird wie in QuizRangliste: Punkte
+    absteigend, Zeit und Name aufsteigend.
+
+    top_k() verwendet den Threshold-Algorithmus: die bereits sortierten
+    Shards werden abwechselnd blockweise von oben gelesen, für jeden
+    neuen Namen werden die Gesamtwerte über die anderen Shards
+    nachgeschlagen. Gelesen wird nur, bis kein ungelesener Name mehr
+    in die ersten k kommen kann. Die Vereinigung aller Shards wird
+    dabei weder aufgebaut noch sortiert.
+    '''
+
+    # Anzahl Einträge pro Shard im ersten Leseblock von top_k()
+    _BLOCK = 64
+
+    def __init__(self, dateien=(), prozesse=0, shards=(), **optionen):
+        '''
+        Initialisierung der Gesamtrangliste.
+
+        Argumente:
+            dateien: iterable -- Pfade der Ranglistendateien, je ein
+                Shard pro Datei.
+            prozesse: int -- Anzahl Worker-Prozesse zum Einlesen,
+                0 = im eigenen Prozess.
+            shards: iterable -- bereits geladene QuizRangliste-Objekte,
+                zusätzlich zu dateien.
+            optionen -- weitere Argumente für QuizRangliste, z.B.
+                speicher='spalten' oder snapshot=True (ohne journal
+                und gleichzeitig, falls prozesse > 0).
+        '''
+        dateien = list(dateien)
+        if prozesse and len(dateien) > 1:
+            with ProcessPoolExecutor(prozesse) as pool:
+                self._shards = list(pool.map(_laden, dateien,
+                                             repeat(optionen)))
+        else:
+            self._shards = [QuizRangliste(datei, **optionen)
+                            for datei in dateien]
+        self._shards.extend(shards)
+
+    def __len__(self):
+        return len(self._shards)
+
+    def __getitem__(self, index):
+        return self._shards[index]
+
+    def summe(self, name):
+        '''
+        Gibt die Gesamtwerte einer Person über alle Shards zurück.
+
+        Argumente:
+            name: string
+
+        Rückgabewert:
+            Tupel (punkte, zeit),
+            None -- falls name in keinem Shard vorkommt.
+        '''
+        gefunden = False
+        punkte, zeit = 0, 0
+        for shard in self._shards:
+            werte = shard.werte(name)
+            if werte is not None:
+                gefunden = True
+                punkte += werte[0]
+                zeit += werte[1]
+        if not gefunden:
+            return None
+        return punkte, zeit
+
+    def top_k(self, k):
+        '''
+        Gibt die ersten k Einträge der Gesamtrangliste zurück.
+
+        Argumente:
+            k: int -- Anzahl Einträge
+
+        Rückgabewert:
+            Liste von Tupeln (name, punkte, zeit) mit den Summen über
+            alle Shards.
+        '''
+        if k <= 0 or not self._shards:
+            return []
+
+        kandidaten = SortierteListe()
+        gesehen = set()
+        positionen = [0] * len(self._shards)
+        # Punkte des zuletzt gelesenen Eintrags, None = Shard erschöpft
+        grenzen = [0] * len(self._shards)
+        block = max(self._BLOCK, k)
+
+        while any(grenze is not None for grenze in grenzen):
+            for i, shard in enumerate(self._shards):
+                if grenzen[i] is None:
+                    continue
+                zeilen = shard.bereich(positionen[i], positionen[i] + block)
+                positionen[i] += len(zeilen)
+                if len(zeilen) < block:
+                    grenzen[i] = None
+                else:
+                    grenzen[i] = zeilen[-1][1]
+                for name, _, _ in zeilen:
+                    if name in gesehen:
+                        continue
+                    gesehen.add(name)
+                    punkte, zeit = self.summe(name)
+                    kandidaten.hinzufuegen((-punkte, zeit, name))
+
+            # obere Schranke für die Punkte eines ungelesenen Namens:
+            # pro Shard höchstens die zuletzt gelesenen Punkte, oder 0,
+            # falls der Name dort fehlt
+            schranke = sum(max(grenze, 0) for grenze in grenzen
+                           if grenze is not None)
+            if len(kandidaten) >= k and -kandidaten[k - 1][0] > schranke:
+                break
+            block *= 2
+
+        return [(name, -punkte, zeit)
+                for punkte, zeit, name in kandidaten.bereich(0, k)]
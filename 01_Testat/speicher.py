@@ -0,0 +1,625 @@
+# -*- coding: utf-8 -*-
+# speicher.py
+
+import sqlite3
+from array import array
+
+from rangindex import SortierteListe
+
+
+class DictSpeicher():
+    '''
+    Speicher-Engine mit einem Dictionary pro Teilnehmer:
+        Key = name, Value = {'Punkte': punkte, 'Zeit': zeit}
+
+    Der Rangindex enthält Schlüssel (-punkte, zeit, name), die
+    Sortierung ist damit: Punkte absteigend, Zeit und Name aufsteigend.
+    '''
+
+    # Endung einer eigenen Datei neben der Textdatei, None = die Daten
+    # liegen nur im Arbeitsspeicher
+    ENDUNG = None
+
+    def __init__(self):
+        '''
+        Initialisierung eines leeren Speichers.
+        '''
+        self._daten = {}
+        self._rang = SortierteListe()
+
+    def __len__(self):
+        return len(self._daten)
+
+    def __contains__(self, name):
+        return name in self._daten
+
+    def werte(self, name):
+        '''
+        Liefert das Tupel (punkte, zeit) oder None, falls name fehlt.
+        '''
+        werte = self._daten.get(name)
+        if werte is None:
+            return None
+        return werte['Punkte'], werte['Zeit']
+
+    def laden(self, namen, punkte, zeiten):
+        '''
+        Übernimmt Spalten aus einer Datei, ohne den Rangindex
+        nachzuführen. Spätere Einträge überschreiben frühere mit
+        demselben Namen. Danach muss rang_aufbauen() folgen.
+
+        Argumente:
+            namen, punkte, zeiten: Listen gleicher Länge
+        '''
+        self._daten.update(zip(namen, [
+            {'Punkte': p, 'Zeit': z} for p, z in zip(punkte, zeiten)
+        ]))
+
+    def rang_aufbauen(self):
+        '''
+        Baut den Rangindex aus allen Daten neu auf.
+        '''
+        self._rang = SortierteListe([
+            (-werte['Punkte'], werte['Zeit'], name)
+            for name, werte in self._daten.items()
+        ])
+
+    def laden_sortiert(self, namen, punkte, zeiten):
+        '''
+        Ersetzt alle Daten durch Spalten, die bereits in Ranglisten-
+        Reihenfolge vorliegen (z.B. aus einem Snapshot). Der Rangindex
+        wird ohne erneutes Sortieren aufgebaut.
+
+        Argumente:
+            namen: Liste, punkte, zeiten: Sequenzen gleicher Länge
+        '''
+        # wie beim Einlesen der Textdatei: Zeit 0 als int
+        zeiten = [zeit or 0 for zeit in zeiten]
+        punkte = list(punkte)
+        self._daten = {
+            name: {'Punkte': p, 'Zeit': z}
+            for name, p, z in zip(namen, punkte, zeiten)
+        }
+        self._rang = SortierteListe(
+            list(zip([-p for p in punkte], zeiten, namen)), sortiert=True)
+
+    def setzen(self, name, punkte, zeit):
+        '''
+        Setzt die Gesamtwerte einer Person, legt sie falls nötig an.
+        '''
+        # wie beim Einlesen der Textdatei: Zeit 0 als int
+        zeit = zeit or 0
+        werte = self._daten.get(name)
+        if werte is not None:
+            self._rang.entfernen((-werte['Punkte'], werte['Zeit'], name))
+            werte['Punkte'] = punkte
+            werte['Zeit'] = zeit
+        else:
+            self._daten[name] = {'Punkte': punkte, 'Zeit': zeit}
+        self._rang.hinzufuegen((-punkte, zeit, name))
+
+    def loeschen(self, name):
+        '''
+        Entfernt eine vorhandene Person.
+        '''
+        werte = self._daten.pop(name)
+        self._rang.entfernen((-werte['Punkte'], werte['Zeit'], name))
+
+    def position(self, name):
+        '''
+        Liefert die Position (0-basiert) in der Rangliste oder None.
+        '''
+        werte = self._daten.get(name)
+        if werte is None:
+            return None
+        return self._rang.position((-werte['Punkte'], werte['Zeit'], name))
+
+    def bereich(self, start, stop):
+        '''
+        Liefert die Tupel (name, punkte, zeit) der Ränge start bis stop
+        (exklusive, 0-basiert).
+        '''
+        return [(name, -punkte, zeit)
+                for punkte, zeit, name in self._rang.bereich(start, stop)]
+
+    def sortiert(self):
+        '''
+        Iteriert in Ranglisten-Reihenfolge über (name, punkte, zeit).
+        '''
+        return ((name, -punkte, zeit) for punkte, zeit, name in self._rang)
+
+    def namen(self):
+        '''
+        Iteriert über alle Namen (ohne Reihenfolge).
+        '''
+        return iter(self._daten)
+
+    def als_dictionary(self):
+        '''
+        Liefert die Daten als neues Dictionary von Dictionaries.
+        '''
+        return {name: dict(werte) for name, werte in self._daten.items()}
+
+
+class SpaltenSpeicher():
+    '''
+    Kompakte Speicher-Engine mit einer Zeile pro Teilnehmer:
+    Namen in einer Liste, Punkte und Zeit in array.array-Spalten
+    ('q' = 64-Bit Ganzzahl, 'd' = double) und ein Dictionary
+    name => Zeilennummer. Nach laden_sortiert() wird das Dictionary
+    erst bei der ersten Abfrage über einen Namen aufgebaut.
+
+    Die Zeit-Spalte kennt nur float; eine Zeit 0 wird wie bei
+    DictSpeicher als int 0 zurückgegeben.
+
+    Gelöschte Zeilen werden in einer Freiliste wiederverwendet,
+    damit die Zeilennummern im Rangindex gültig bleiben. Der Rangindex
+    speichert nur Zeilennummern (8 Bytes pro Eintrag) und sortiert über
+    eine Schlüsselfunktion auf den Spalten.
+    '''
+
+    ENDUNG = None
+
+    # Wertebereich der Punkte-Spalte (typcode 'q')
+    _PUNKTE_MIN = -2 ** 63
+    _PUNKTE_MAX = 2 ** 63 - 1
+
+    def __init__(self):
+        '''
+        Initialisierung eines leeren Speichers.
+        '''
+        self._namen = []
+        self._punkte = array('q')
+        self._zeiten = array('d')
+        self._zeilen = {}
+        self._frei = []
+        self._rang = SortierteListe(schluessel=self.__schluessel, typcode='q')
+
+    def __schluessel(self, zeile):
+        return (-self._punkte[zeile], self._zeiten[zeile], self._namen[zeile])
+
+    def __index(self):
+        # Dictionary name => Zeilennummer, bei Bedarf aufbauen
+        if self._zeilen is None:
+            frei = set(self._frei)
+            self._zeilen = {name: zeile
+                            for zeile, name in enumerate(self._namen)
+                            if zeile not in frei}
+        return self._zeilen
+
+    def __len__(self):
+        return len(self._namen) - len(self._frei)
+
+    def __contains__(self, name):
+        return name in self.__index()
+
+    def __pruefen(self, punkte):
+        if not self._PUNKTE_MIN <= punkte <= self._PUNKTE_MAX:
+            raise OverflowError('Punkte ausserhalb des 64-Bit-Bereichs')
+
+    def werte(self, name):
+        '''
+        Liefert das Tupel (punkte, zeit) oder None, falls name fehlt.
+        '''
+        zeile = self.__index().get(name)
+        if zeile is None:
+            return None
+        return self._punkte[zeile], self._zeiten[zeile] or 0
+
+    def laden(self, namen, punkte, zeiten):
+        '''
+        Übernimmt Spalten aus einer Datei, ohne den Rangindex
+        nachzuführen. Spätere Einträge überschreiben frühere mit
+        demselben Namen. Danach muss rang_aufbauen() folgen.
+
+        Zeilen mit Punkten ausserhalb des 64-Bit-Bereichs werden wie
+        ungültige Zeilen übersprungen.
+
+        Argumente:
+            namen, punkte, zeiten: Listen gleicher Länge
+        '''
+        # doppelte Namen: letzter Wert gewinnt, erste Position bleibt
+        letzte = dict(zip(namen, zip(punkte, zeiten)))
+        if (min(punkte, default=0) < self._PUNKTE_MIN
+                or max(punkte, default=0) > self._PUNKTE_MAX):
+            letzte = dict(
+                (name, (p, z)) for name, p, z in zip(namen, punkte, zeiten)
+                if self._PUNKTE_MIN <= p <= self._PUNKTE_MAX)
+
+        zeilen = self.__index()
+        neue = []
+        for name, (p, z) in letzte.items():
+            zeile = zeilen.get(name)
+            if zeile is None:
+                neue.append(name)
+            else:
+                self._punkte[zeile] = p
+                self._zeiten[zeile] = z
+
+        start = len(self._namen)
+        self._namen.extend(neue)
+        zeilen.update(zip(neue, range(start, start + len(neue))))
+        self._punkte.extend([letzte[name][0] for name in neue])
+        self._zeiten.extend([letzte[name][1] for name in neue])
+
+    def rang_aufbauen(self):
+        '''
+        Baut den Rangindex aus allen Daten neu auf.
+        '''
+        self._rang = SortierteListe(self.__index().values(),
+                                    schluessel=self.__schluessel,
+                                    typcode='q')
+
+    def laden_sortiert(self, namen, punkte, zeiten):
+        '''
+        Ersetzt alle Daten durch Spalten, die bereits in Ranglisten-
+        Reihenfolge vorliegen (z.B. aus einem Snapshot). Die Spalten
+        werden direkt übernommen, Zeile i hat Rang i + 1.
+
+        Argumente:
+            namen: Liste, punkte: array('q'), zeiten: array('d')
+                (andere Sequenzen werden umgewandelt)
+
+        Fehler:
+            OverflowError -- falls Punkte nicht in 64 Bit passen.
+        '''
+        if not isinstance(punkte, array):
+            punkte = array('q', punkte)
+        if not isinstance(zeiten, array):
+            zeiten = array('d', zeiten)
+        self._namen = namen
+        self._punkte = punkte
+        self._zeiten = zeiten
+        self._zeilen = None
+        self._frei = []
+        self._rang = SortierteListe(range(len(namen)),
+                                    schluessel=self.__schluessel,
+                                    typcode='q', sortiert=True)
+
+    def setzen(self, name, punkte, zeit):
+        '''
+        Setzt die Gesamtwerte einer Person, legt sie falls nötig an.
+
+        Fehler:
+            OverflowError -- falls punkte nicht in 64 Bit passt.
+        '''
+        self.__pruefen(punkte)
+        zeile = self.__index().get(name)
+        if zeile is not None:
+            self._rang.entfernen(zeile)
+            self._punkte[zeile] = punkte
+            self._zeiten[zeile] = zeit
+        elif self._frei:
+            zeile = self._frei.pop()
+            self._namen[zeile] = name
+            self._punkte[zeile] = punkte
+            self._zeiten[zeile] = zeit
+        else:
+            zeile = len(self._namen)
+            self._namen.append(name)
+            self._punkte.append(punkte)
+            self._zeiten.append(zeit)
+        self.__index()[name] = zeile
+        self._rang.hinzufuegen(zeile)
+
+    def loeschen(self, name):
+        '''
+        Entfernt eine vorhandene Person.
+        '''
+        zeile = self.__index().pop(name)
+        self._rang.entfernen(zeile)
+        self._namen[zeile] = None
+        self._frei.append(zeile)
+
+    def position(self, name):
+        '''
+        Liefert die Position (0-basiert) in der Rangliste oder None.
+        '''
+        zeile = self.__index().get(name)
+        if zeile is None:
+            return None
+        return self._rang.position(zeile)
+
+    def bereich(self, start, stop):
+        '''
+        Liefert die Tupel (name, punkte, zeit) der Ränge start bis stop
+        (exklusive, 0-basiert).
+        '''
+        namen, punkte, zeiten = self._namen, self._punkte, self._zeiten
+        return [(namen[zeile], punkte[zeile], zeiten[zeile] or 0)
+                for zeile in self._rang.bereich(start, stop)]
+
+    def sortiert(self):
+        '''
+        Iteriert in Ranglisten-Reihenfolge über (name, punkte, zeit).
+        '''
+        namen, punkte, zeiten = self._namen, self._punkte, self._zeiten
+        return ((namen[zeile], punkte[zeile], zeiten[zeile] or 0)
+                for zeile in self._rang)
+
+    def namen(self):
+        '''
+        Iteriert über alle Namen (ohne Reihenfolge).
+        '''
+        return iter(self.__index())
+
+    def als_dictionary(self):
+        '''
+        Liefert die Daten als neues Dictionary von Dictionaries.
+        '''
+        punkte, zeiten = self._punkte, self._zeiten
+        return {name: {'Punkte': punkte[zeile], 'Zeit': zeiten[zeile] or 0}
+                for name, zeile in self.__index().items()}
+
+
+class SqliteSpeicher():
+    '''
+    Speicher-Engine in einer SQLite-Datenbank: eine Tabelle
+    (name, punkte, zeit) mit einem Index in Ranglisten-Reihenfolge
+    (Punkte absteigend, Zeit und Name aufsteigend).
+
+    Die Daten liegen nicht im Arbeitsspeicher, der Speicherbedarf hängt
+    also nicht von der Grösse der Rangliste ab. Die Datenbank bleibt
+    zwischen zwei Programmläufen erhalten; das Öffnen kostet konstante
+    Zeit.
+
+    Alle Änderungen laufen in einer offenen Transaktion und werden erst
+    mit sichern() oder stand_setzen() geschrieben, viele Resultate
+    kosten damit nur ein Commit.
+
+    Ranglistenabfragen verwenden den Index. SQLite führt aber keine
+    Zähler pro Teilbaum, position() und bereich() kosten daher linear in
+    der Position statt logarithmisch.
+
+    Eine Datenbank gehört jeweils einem einzigen Objekt: eine offene
+    Transaktion sperrt sie für andere Verbindungen.
+
+    Die Spalte zeit ist REAL; eine Zeit 0 wird wie bei DictSpeicher als
+    int 0 zurückgegeben.
+    '''
+
+    ENDUNG = '.sqlite'
+
+    # Wertebereich einer SQLite-Ganzzahl
+    _PUNKTE_MIN = -2 ** 63
+    _PUNKTE_MAX = 2 ** 63 - 1
+
+    _RANG = 'ORDER BY punkte DESC, zeit, name'
+
+    # zeit in Abfragen: 0.0 aus der REAL-Spalte als int 0
+    _ZEIT = 'CASE WHEN zeit = 0 THEN 0 ELSE zeit END'
+
+    # Seiten-Cache beim Einlesen einer Textdatei (KiB), danach zurück
+    # auf den Standard von SQLite
+    _IMPORT_CACHE = 65536
+
+    def __init__(self, pfad=':memory:'):
+        '''
+        Öffnet oder erstellt die Datenbank.
+
+        Argumente:
+            pfad: string -- Datenbankdatei, ':memory:' = nur im
+                Arbeitsspeicher
+        '''
+        # check_same_thread=False: RanglistenServer ruft speichern()
+        # in einem Worker-Thread auf, SQLite serialisiert die Zugriffe
+        self._db = sqlite3.connect(pfad, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS rangliste (
+                name TEXT PRIMARY KEY,
+                punkte INTEGER NOT NULL,
+                zeit REAL NOT NULL) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS rang
+                ON rangliste (punkte DESC, zeit, name);
+            CREATE TABLE IF NOT EXISTS stand (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                anzahl INTEGER NOT NULL,
+                groesse INTEGER,
+                mtime INTEGER,
+                sauber INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stand VALUES (0, 0, NULL, NULL, 0);
+        ''')
+        self._anzahl, self._sauber = self._db.execute(
+            'SELECT anzahl, sauber FROM stand').fetchone()
+
+    def __del__(self):
+        # Die Verbindung hängt über ihren Statement-Cache in einem
+        # Referenzzyklus und würde sonst erst von der Garbage Collection
+        # geschlossen; bis dahin bliebe die Datenbank gesperrt. Nicht
+        # gesicherte Änderungen werden verworfen.
+        self._db.close()
+
+    def __len__(self):
+        return self._anzahl
+
+    def __contains__(self, name):
+        return self.werte(name) is not None
+
+    def __geaendert(self):
+        # Erste Änderung nach stand_setzen(): die Datenbank weicht nun
+        # von der Textdatei ab (in derselben Transaktion vermerkt)
+        if self._sauber:
+            self._db.execute('UPDATE stand SET sauber = 0')
+            self._sauber = 0
+
+    def werte(self, name):
+        '''
+        Liefert das Tupel (punkte, zeit) oder None, falls name fehlt.
+        '''
+        return self._db.execute(
+            'SELECT punkte, ' + self._ZEIT +
+            ' FROM rangliste WHERE name = ?',
+            (name,)).fetchone()
+
+    def laden(self, namen, punkte, zeiten):
+        '''
+        Übernimmt Spalten aus einer Datei. Spätere Einträge
+        überschreiben frühere mit demselben Namen. Bis zum folgenden
+        rang_aufbauen() ist der Index entfernt und der Seiten-Cache
+        vergrössert, damit grosse Dateien schneller eingefügt werden.
+
+        Zeilen mit Punkten ausserhalb des 64-Bit-Bereichs werden wie
+        ungültige Zeilen übersprungen.
+
+        Argumente:
+            namen, punkte, zeiten: Listen gleicher Länge
+        '''
+        self.__geaendert()
+        self._db.execute('DROP INDEX IF EXISTS rang')
+        self._db.execute('PRAGMA cache_size = -{}'.format(self._IMPORT_CACHE))
+        minimum, maximum = self._PUNKTE_MIN, self._PUNKTE_MAX
+        self._db.executemany(
+            'INSERT INTO rangliste VALUES (?, ?, ?) ON CONFLICT (name) '
+            'DO UPDATE SET punkte = excluded.punkte, zeit = excluded.zeit',
+            ((name, p, z) for name, p, z in zip(namen, punkte, zeiten)
+             if minimum <= p <= maximum))
+
+    def rang_aufbauen(self):
+        '''
+        Erstellt den Index nach laden() neu.
+        '''
+        self._db.execute('CREATE INDEX IF NOT EXISTS rang '
+                         'ON rangliste (punkte DESC, zeit, name)')
+        self._db.execute('PRAGMA cache_size = -2000')
+        self._anzahl = self._db.execute(
+            'SELECT COUNT(*) FROM rangliste').fetchone()[0]
+
+    def laden_sortiert(self, namen, punkte, zeiten):
+        '''
+        Ersetzt alle Daten durch Spalten in Ranglisten-Reihenfolge.
+
+        Argumente:
+            namen, punkte, zeiten: Sequenzen gleicher Länge
+
+        Fehler:
+            OverflowError -- falls Punkte nicht in 64 Bit passen.
+        '''
+        self.__geaendert()
+        self._db.execute('DELETE FROM rangliste')
+        self._db.execute('DROP INDEX IF EXISTS rang')
+        self._db.executemany('INSERT INTO rangliste VALUES (?, ?, ?)',
+                             zip(namen, punkte, zeiten))
+        self.rang_aufbauen()
+
+    def setzen(self, name, punkte, zeit):
+        '''
+        Setzt die Gesamtwerte einer Person, legt sie falls nötig an.
+
+        Fehler:
+            OverflowError -- falls punkte nicht in 64 Bit passt.
+        '''
+        if not self._PUNKTE_MIN <= punkte <= self._PUNKTE_MAX:
+            raise OverflowError('Punkte ausserhalb des 64-Bit-Bereichs')
+        self.__geaendert()
+        if not self._db.execute(
+                'UPDATE rangliste SET punkte = ?, zeit = ? WHERE name = ?',
+                (punkte, zeit, name)).rowcount:
+            self._db.execute('INSERT INTO rangliste VALUES (?, ?, ?)',
+                             (name, punkte, zeit))
+            self._anzahl += 1
+
+    def loeschen(self, name):
+        '''
+        Entfernt eine vorhandene Person.
+        '''
+        self.__geaendert()
+        if self._db.execute('DELETE FROM rangliste WHERE name = ?',
+                            (name,)).rowcount:
+            self._anzahl -= 1
+
+    def position(self, name):
+        '''
+        Liefert die Position (0-basiert) in der Rangliste oder None.
+        '''
+        werte = self.werte(name)
+        if werte is None:
+            return None
+        punkte, zeit = werte
+        return self._db.execute(
+            'SELECT (SELECT COUNT(*) FROM rangliste WHERE punkte > ?1)'
+            ' + (SELECT COUNT(*) FROM rangliste'
+            '    WHERE punkte = ?1 AND zeit < ?2)'
+            ' + (SELECT COUNT(*) FROM rangliste'
+            '    WHERE punkte = ?1 AND zeit = ?2 AND name < ?3)',
+            (punkte, zeit, name)).fetchone()[0]
+
+    def bereich(self, start, stop):
+        '''
+        Liefert die Tupel (name, punkte, zeit) der Ränge start bis stop
+        (exklusive, 0-basiert).
+        '''
+        start = max(start, 0)
+        if stop <= start:
+            return []
+        return self._db.execute(
+            'SELECT name, punkte, ' + self._ZEIT + ' FROM rangliste ' +
+            self._RANG + ' LIMIT ? OFFSET ?', (stop - start, start)).fetchall()
+
+    def sortiert(self):
+        '''
+        Iteriert in Ranglisten-Reihenfolge über (name, punkte, zeit).
+        '''
+        return self._db.execute(
+            'SELECT name, punkte, ' + self._ZEIT + ' FROM rangliste ' +
+            self._RANG)
+
+    def namen(self):
+        '''
+        Iteriert über alle Namen (ohne Reihenfolge).
+        '''
+        return (name for name, in self._db.execute(
+            'SELECT name FROM rangliste'))
+
+    def als_dictionary(self):
+        '''
+        Liefert die Daten als neues Dictionary von Dictionaries.
+        '''
+        return {name: {'Punkte': punkte, 'Zeit': zeit}
+                for name, punkte, zeit in self._db.execute(
+                    'SELECT name, punkte, ' + self._ZEIT +
+                    ' FROM rangliste')}
+
+    def sichern(self):
+        '''
+        Schreibt alle Änderungen seit dem letzten Aufruf in einer
+        Transaktion in die Datenbank.
+        '''
+        self._db.execute('UPDATE stand SET anzahl = ?', (self._anzahl,))
+        self._db.commit()
+
+    def stand(self):
+        '''
+        Liefert Grösse und Änderungszeit (ns) der Textdatei beim letzten
+        Abgleich und ob die Datenbank seither unverändert ist.
+
+        Rückgabewert:
+            Tupel (groesse, mtime_ns, sauber),
+            None -- falls noch nie abgeglichen.
+        '''
+        groesse, mtime, sauber = self._db.execute(
+            'SELECT groesse, mtime, sauber FROM stand').fetchone()
+        if groesse is None:
+            return None
+        return groesse, mtime, bool(sauber)
+
+    def stand_setzen(self, groesse, mtime):
+        '''
+        Vermerkt, dass die Textdatei (Grösse, Änderungszeit in ns) nun
+        dieselben Daten enthält wie die Datenbank, und schreibt alle
+        Änderungen wie sichern().
+        '''
+        self._db.execute(
+            'UPDATE stand SET anzahl = ?, groesse = ?, mtime = ?, '
+            'sauber = 1', (self._anzahl, groesse, mtime))
+        self._db.commit()
+        self._sauber = 1
+
+
+# Verfügbare Speicher-Engines für QuizRangliste(speicher=...)
+SPEICHER = {
+    'dict': DictSpeicher,
+    'spalten': SpaltenSpeicher,
+    'sqlite': SqliteSpeicher,
+}
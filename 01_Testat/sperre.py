@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# sperre.py
+
+import os
+import stat
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: Sperre über msvcrt
+    fcntl = None
+    import msvcrt
+
+
+class Dateisperre():
+    '''
+    Exklusive Sperre über mehrere Prozesse, mit einer eigenen Sperrdatei.
+
+    Unter Unix wird flock() verwendet, unter Windows msvcrt.locking()
+    auf dem ersten Byte der Sperrdatei. Die Sperre wird vom
+    Betriebssystem freigegeben, wenn der Prozess endet.
+
+    Verwendung:
+        with Dateisperre('rangliste.txt.lock'):
+            ...
+    '''
+
+    # Wartezeit zwischen zwei Versuchen unter Windows (Sekunden)
+    _WARTEN = 0.01
+
+    def __init__(self, pfad):
+        '''
+        Argumente:
+            pfad: string -- Pfad der Sperrdatei, wird bei Bedarf angelegt.
+        '''
+        self._pfad = pfad
+        self._datei = None
+
+    def sperren(self):
+        '''
+        Wartet, bis die Sperre frei ist, und übernimmt sie.
+        '''
+        datei = open(self._pfad, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(datei.fileno(), fcntl.LOCK_EX)
+            else:
+                while True:
+                    datei.seek(0)
+                    try:
+                        msvcrt.locking(datei.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(self._WARTEN)
+        except BaseException:
+            datei.close()
+            raise
+        self._datei = datei
+
+    def freigeben(self):
+        '''
+        Gibt die Sperre wieder frei.
+        '''
+        datei, self._datei = self._datei, None
+        if datei is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(datei.fileno(), fcntl.LOCK_UN)
+            else:
+                datei.seek(0)
+                msvcrt.locking(datei.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            datei.close()
+
+    def __enter__(self):
+        self.sperren()
+        return self
+
+    def __exit__(self, *fehler):
+        self.freigeben()
+
+
+def ersetzen(ziel, schreiben, endung='.tmp'):
+    '''
+    Schreibt eine Datei atomar: zuerst in eine temporäre Datei im
+    gleichen Verzeichnis, danach wird ziel per os.replace() ersetzt.
+    Leser sehen damit immer entweder die alte oder die neue Datei.
+    Die Zugriffsrechte einer bestehenden Zieldatei bleiben erhalten.
+
+    Argumente:
+        ziel: string -- Pfad der Zieldatei
+        schreiben: callable -- schreiben(datei) schreibt den Inhalt in
+            die geöffnete Textdatei (encoding='utf-8').
+        endung: string -- Endung der temporären Datei
+
+    Fehler:
+        OSError -- falls nicht geschrieben werden kann; ziel bleibt
+            dann unverändert.
+    '''
+    temp = '{}.{}{}'.format(ziel, os.getpid(), endung)
+    try:
+        with open(temp, 'w', encoding='utf-8') as datei:
+            schreiben(datei)
+            datei.flush()
+            os.fsync(datei.fileno())
+        try:
+            # die temporäre Datei hat die Rechte gemäss umask
+            os.chmod(temp, stat.S_IMODE(os.stat(ziel).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temp, ziel)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# tabelle.py
+
+from collections import Counter
+
+
+class Spaltenbreiten():
+    '''
+    Laufend nachgeführte Spaltenbreiten einer Tabelle.
+
+    Pro Spalte wird gezählt, wie viele Zellen welche Länge haben
+    (Multimenge der Längen). Damit kostet das Hinzufügen oder Entfernen
+    einer Zeile nur konstante Zeit, und die Breite einer Spalte muss
+    nur neu bestimmt werden, wenn die letzte Zelle mit der grössten
+    Länge verschwindet (über die verschiedenen Längen, nicht über alle
+    Zeilen).
+
+    Die Zeilen werden über die Funktion zellen(*werte) in eine Folge
+    von Strings umgewandelt, deren Längen gezählt werden.
+    '''
+
+    def __init__(self, zellen, zeilen=()):
+        '''
+        Initialisierung der Spaltenbreiten.
+
+        Argumente:
+            zellen: callable -- wandelt die Werte einer Zeile in ein
+                Tupel von Strings (eine Zelle pro Spalte) um.
+            zeilen: iterable -- Startzeilen als Tupel von Werten.
+        '''
+        self._zellen = zellen
+        self._laengen = None
+        self._breiten = None
+
+        # Startzeilen spaltenweise am Stück zählen
+        spalten = list(zip(*[zellen(*werte) for werte in zeilen]))
+        if spalten:
+            self._laengen = [Counter(map(len, spalte)) for spalte in spalten]
+            self._breiten = [max(laengen) for laengen in self._laengen]
+
+    def breiten(self):
+        '''
+        Rückgabewert:
+            Tupel mit der Breite jeder Spalte,
+            leer falls die Tabelle keine Zeilen hat.
+        '''
+        if self._breiten is None:
+            return ()
+        return tuple(self._breiten)
+
+    def hinzufuegen(self, *werte):
+        '''
+        Zählt eine neue Zeile mit.
+
+        Argumente:
+            werte -- Werte der Zeile wie für zellen()
+        '''
+        zellen = self._zellen(*werte)
+        if self._laengen is None:
+            self._laengen = [Counter() for _ in zellen]
+            self._breiten = [0] * len(zellen)
+        for spalte, zelle in enumerate(zellen):
+            laenge = len(zelle)
+            self._laengen[spalte][laenge] += 1
+            if laenge > self._breiten[spalte]:
+                self._breiten[spalte] = laenge
+
+    def entfernen(self, *werte):
+        '''
+        Entfernt eine mitgezählte Zeile.
+
+        Argumente:
+            werte -- Werte der Zeile wie beim Hinzufügen
+        '''
+        zellen = self._zellen(*werte)
+        for spalte, zelle in enumerate(zellen):
+            laengen = self._laengen[spalte]
+            laenge = len(zelle)
+            laengen[laenge] -= 1
+            if laengen[laenge]:
+                continue
+            del laengen[laenge]
+            if laenge == self._breiten[spalte]:
+                self._breiten[spalte] = max(laengen, default=0)
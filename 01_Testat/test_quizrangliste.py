@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+# test_quizrangliste.py
+'''
+Tests zu QuizRangliste. Aufruf im Verzeichnis 01_Testat:
+    python -m pytest -q test_quizrangliste.py
+'''
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from array import array
+
+from messung import Messung
+from quizrangliste import QuizRangliste
+
+
+def _teilresultate(datei, anzahl):
+    # Worker-Prozess: anzahl mal 1 Punkt und 0.04 s addieren und
+    # jeweils speichern
+    qr = QuizRangliste(datei=datei, gleichzeitig=True)
+    for _ in range(anzahl):
+        qr.resultat_addieren('A', 1, 0.04)
+        qr.speichern()
+
+
+class _MitVerzeichnis(unittest.TestCase):
+    # legt pro Test ein leeres Verzeichnis an
+
+    def setUp(self):
+        self.verzeichnis = tempfile.mkdtemp()
+        self.datei = os.path.join(self.verzeichnis, 'rangliste.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.verzeichnis)
+
+    def schreiben(self, text, datei=None):
+        with open(datei or self.datei, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+    def lesen(self, datei=None):
+        with open(datei or self.datei, encoding='utf-8') as file:
+            return file.read()
+
+
+class LadenTest(_MitVerzeichnis):
+
+    def test_zeit_nan_wird_ignoriert(self):
+        self.schreiben('A,1,1.0\nB,5,nan\nC,2,NaN\nD,3,-nan\nE,4,inf\n')
+        for speicher in ('dict', 'spalten', 'sqlite'):
+            qr = QuizRangliste(datei=self.datei, speicher=speicher)
+            self.assertEqual(qr.als_liste(), [
+                ('E', 4, float('inf')), ('A', 1, 1.0)], speicher)
+            self.assertIsNone(qr.rank_of('B'), speicher)
+            del qr
+
+    def test_nan_zaehlt_als_abgelehnt(self):
+        self.schreiben('A,1,1.0\nB,5,nan\n\n')
+        messung = Messung()
+        QuizRangliste(datei=self.datei, messung=messung)
+        zaehler = messung.als_dictionary()['zaehler']
+        self.assertEqual(zaehler['rangliste.laden.zeilen'], 1)
+        self.assertEqual(zaehler['rangliste.laden.abgelehnt'], 1)
+
+
+class SpeicherTest(_MitVerzeichnis):
+    # alle Speicher-Engines liefern dieselbe öffentliche Ausgabe
+
+    ENGINES = ('dict', 'spalten', 'sqlite')
+
+    def ausgaben(self, aendern=None):
+        # als_string(), als_dictionary() und als_liste() pro Engine
+        ergebnisse = {}
+        for speicher in self.ENGINES:
+            qr = QuizRangliste(datei=self.datei, speicher=speicher)
+            if aendern is not None:
+                aendern(qr)
+            ergebnisse[speicher] = (qr.als_string(), qr.als_dictionary(),
+                                    qr.als_liste())
+            del qr
+        return ergebnisse
+
+    def pruefen(self, ergebnisse):
+        erwartet = ergebnisse['dict']
+        for speicher, ergebnis in ergebnisse.items():
+            self.assertEqual(ergebnis, erwartet, speicher)
+            # gleiche Typen, z.B. Zeit 0 als int wie beim Einlesen
+            self.assertEqual([type(zeit) for _, _, zeit in ergebnis[2]],
+                             [type(zeit) for _, _, zeit in erwartet[2]],
+                             speicher)
+
+    def test_zeit_null_beim_laden(self):
+        self.schreiben('A,1,0\nB,2,0.0\nC,3,\nD,4,1.5\n')
+        ergebnisse = self.ausgaben()
+        self.pruefen(ergebnisse)
+        self.assertEqual(ergebnisse['dict'][0],
+                         'D | 4 | 1.5\nC | 3 |   0\nB | 2 |   0\n'
+                         'A | 1 |   0\n')
+        self.assertEqual(ergebnisse['dict'][1]['A'],
+                         {'Punkte': 1, 'Zeit': 0})
+
+    def test_zeit_null_nach_aenderung(self):
+        self.schreiben('A,1,0\nB,2,1.0\n')
+
+        def aendern(qr):
+            qr.resultat_addieren('A', 1, 0.0)
+            qr.resultat_addieren('E', 5, 0)
+            qr.resultat_addieren_batch([('F', 6, 0.0), ('B', 1, -1.0)])
+
+        ergebnisse = self.ausgaben(aendern)
+        self.pruefen(ergebnisse)
+        self.assertEqual(ergebnisse['dict'][2], [
+            ('F', 6, 0), ('E', 5, 0), ('B', 3, 0), ('A', 2, 0)])
+
+
+class BatchTest(_MitVerzeichnis):
+
+    def setUp(self):
+        super().setUp()
+        self.schreiben('A,1,1.0\nB,2,inf\nC,3,3.0\n')
+
+    def test_abgelehnte_zeilen(self):
+        # Punkte ausserhalb von 64 Bit kennen nur spalten und sqlite
+        for speicher in ('spalten', 'sqlite'):
+            messung = Messung()
+            qr = QuizRangliste(datei=self.datei, speicher=speicher,
+                               messung=messung)
+            fehler = qr.resultat_addieren_batch([
+                ('A', 1, 0.5),              # 0 gültig
+                ('D', 4, float('nan')),     # 1 NaN
+                ('B', 1, float('-inf')),    # 2 Summe inf - inf = NaN
+                ('E,F', 1, 1.0),            # 3 ungültiger Name
+                ('C', 2 ** 63, 1.0),        # 4 Überlauf ...
+                ('C', 1, 1.0),              # 5 ... lehnt auch C ab
+                ('G', 'x', 1.0),            # 6 keine Zahl
+                ('G', 5, 2.5),              # 7 neuer Name, gültig
+                ('A', 2, 0.5),              # 8 gültig, zusammengezählt
+                ('H', 1),                   # 9 unvollständig
+            ])
+            self.assertEqual(fehler, [1, 2, 3, 4, 5, 6, 9], speicher)
+            self.assertEqual(qr.als_liste(), [
+                ('G', 5, 2.5), ('A', 4, 2.0), ('C', 3, 3.0),
+                ('B', 2, float('inf'))], speicher)
+            self.assertIsNone(qr.rank_of('D'), speicher)
+            self.assertEqual(messung.als_dictionary()['zaehler'][
+                'rangliste.resultat_addieren.abgelehnt'], 7, speicher)
+            del qr
+
+    def test_nur_abgelehnte_zeilen(self):
+        qr = QuizRangliste(datei=self.datei)
+        self.assertEqual(qr.resultat_addieren_batch(
+            [('A', 1, float('nan')), ('B', 1, float('-inf'))]), [0, 1])
+        self.assertEqual(qr.als_liste(), [
+            ('C', 3, 3.0), ('B', 2, float('inf')), ('A', 1, 1.0)])
+        self.assertFalse(qr.ist_geaendert())
+
+
+class SpeichernTest(_MitVerzeichnis):
+
+    def setUp(self):
+        super().setUp()
+        self.schreiben('A,1,1.0\nB,2,2.0\n')
+        # alte Änderungszeit: ein erneutes Schreiben wäre erkennbar
+        os.utime(self.datei, ns=(10 ** 18, 10 ** 18))
+
+    def test_ohne_aenderung_wird_nichts_geschrieben(self):
+        messung = Messung()
+        qr = QuizRangliste(datei=self.datei, messung=messung)
+        self.assertFalse(qr.ist_geaendert())
+        qr.speichern()
+        self.assertEqual(os.stat(self.datei).st_mtime_ns, 10 ** 18)
+        self.assertEqual(messung.als_dictionary()['zaehler'][
+            'rangliste.speichern.uebersprungen'], 1)
+
+    def test_nach_aenderung_wird_geschrieben(self):
+        qr = QuizRangliste(datei=self.datei)
+        qr.resultat_addieren('C', 3, 1.5)
+        self.assertTrue(qr.ist_geaendert())
+        qr.speichern()
+        self.assertNotEqual(os.stat(self.datei).st_mtime_ns, 10 ** 18)
+        self.assertEqual(self.lesen(), 'C,3,1.5\nB,2,2.0\nA,1,1.0\n')
+        self.assertFalse(qr.ist_geaendert())
+
+    def test_aenderung_von_aussen(self):
+        qr = QuizRangliste(datei=self.datei)
+        self.schreiben('A,1,1.0\n')
+        self.assertTrue(qr.ist_geaendert())
+        qr.speichern()
+        self.assertEqual(self.lesen(), 'B,2,2.0\nA,1,1.0\n')
+
+    @unittest.skipUnless(os.name == 'posix', 'Zugriffsrechte nur unter Unix')
+    def test_zugriffsrechte_bleiben_erhalten(self):
+        os.chmod(self.datei, 0o640)
+        qr = QuizRangliste(datei=self.datei)
+        qr.resultat_addieren('C', 3, 1.5)
+        qr.speichern()
+        self.assertEqual(os.stat(self.datei).st_mode & 0o777, 0o640)
+
+
+class JournalTest(_MitVerzeichnis):
+
+    def setUp(self):
+        super().setUp()
+        self.journal = self.datei + '.journal'
+        self.schreiben('A,1,1.0\nB,2,2.0\n')
+
+    def test_abspielen_nach_absturz(self):
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        qr.resultat_addieren('A', 5, 0.5)
+        qr.name_entfernen('B')
+        qr.resultat_addieren('C', 3, 3.0)
+        qr.speichern()
+        # Absturz: nicht kompaktiert, die Textdatei ist unverändert
+        del qr
+        self.assertEqual(self.lesen(), 'A,1,1.0\nB,2,2.0\n')
+
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        self.assertEqual(qr.als_liste(), [('A', 6, 1.5), ('C', 3, 3.0)])
+        self.assertTrue(qr.ist_geaendert())
+
+    def test_kompaktieren(self):
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        qr.resultat_addieren('C', 3, 3.0)
+        qr.name_entfernen('A')
+        qr.kompaktieren()
+        self.assertEqual(self.lesen(), 'C,3,3.0\nB,2,2.0\n')
+        self.assertEqual(self.lesen(self.journal), '')
+        self.assertFalse(qr.ist_geaendert())
+        del qr
+
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        self.assertEqual(qr.als_liste(), [('C', 3, 3.0), ('B', 2, 2.0)])
+
+    def test_speichern_kompaktiert_ab_anzahl_eintraege(self):
+        # kompaktiert, sobald das Journal so lang wie die Rangliste ist
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        qr._JOURNAL_MIN = 0
+        qr.resultat_addieren('C', 3, 3.0)
+        qr.resultat_addieren('A', 1, 1.0)
+        qr.speichern()
+        self.assertEqual(self.lesen(), 'A,1,1.0\nB,2,2.0\n')
+        qr.resultat_addieren('B', 2, 2.0)
+        qr.speichern()
+        self.assertEqual(self.lesen(), 'B,4,4.0\nC,3,3.0\nA,2,2.0\n')
+        self.assertEqual(self.lesen(self.journal), '')
+
+    def test_erneut_abspielen_ist_unschaedlich(self):
+        # Absturz zwischen Kompaktieren und Leeren des Journals
+        self.schreiben('A,1,1.0\nB,2,2.0\n', self.journal)
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        self.assertEqual(qr.als_liste(), [('B', 2, 2.0), ('A', 1, 1.0)])
+
+    def test_unvollstaendige_letzte_zeile(self):
+        self.schreiben('C,3,3.0\n-,A\nD,4,4', self.journal)
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        self.assertEqual(qr.als_liste(), [('C', 3, 3.0), ('B', 2, 2.0)])
+        self.assertEqual(self.lesen(self.journal), 'C,3,3.0\n-,A\n')
+
+        # neue Einträge beginnen auf einer eigenen Zeile
+        qr.resultat_addieren('E', 5, 5.0)
+        qr.speichern()
+        del qr
+        qr = QuizRangliste(datei=self.datei, journal=True)
+        self.assertEqual(qr.als_liste(), [('E', 5, 5.0), ('C', 3, 3.0),
+                                          ('B', 2, 2.0)])
+
+
+class SnapshotTest(_MitVerzeichnis):
+
+    def setUp(self):
+        super().setUp()
+        self.snapshot = self.datei + '.snapshot'
+        self.schreiben('A,1,1.0\nB,2,2.0\n')
+        QuizRangliste(datei=self.datei, snapshot=True).speichern(
+            als=self.datei)
+
+    def laden(self):
+        # Gibt die Rangliste und die Anzahl aus der Textdatei gelesener
+        # Zeilen zurück (0: aus dem Snapshot geladen)
+        messung = Messung()
+        qr = QuizRangliste(datei=self.datei, snapshot=True,
+                           speicher='spalten', messung=messung)
+        zeilen = messung.als_dictionary()['zaehler'].get(
+            'rangliste.laden.zeilen', 0)
+        return qr.als_liste(), zeilen
+
+    def test_passender_snapshot(self):
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 0))
+
+    def test_groesse_geaendert(self):
+        self.schreiben('A,1,1.0\nB,2,2.0\nC,3,3.0\n')
+        self.assertEqual(self.laden(), (
+            [('C', 3, 3.0), ('B', 2, 2.0), ('A', 1, 1.0)], 3))
+
+    def test_aenderungszeit_geaendert(self):
+        stat = os.stat(self.datei)
+        os.utime(self.datei, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 2))
+
+    def test_pruefsumme_bei_gleicher_groesse_und_zeit(self):
+        stat = os.stat(self.datei)
+        self.schreiben('B,2,2.0\nA,9,1.0\n')
+        os.utime(self.datei, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.laden(), ([('A', 9, 1.0), ('B', 2, 2.0)], 2))
+
+    def test_fremde_byte_reihenfolge(self):
+        # Spalten umdrehen und die andere Byte-Reihenfolge vermerken
+        kopf = QuizRangliste._SNAPSHOT_KOPF
+        with open(self.snapshot, 'rb') as file:
+            daten = file.read()
+        felder = list(kopf.unpack_from(daten))
+        anzahl, laenge = felder[5], felder[6]
+        felder[1] = b'b' if sys.byteorder == 'little' else b'l'
+        start = kopf.size + laenge
+        punkte = array('q', daten[start:start + 8 * anzahl])
+        zeiten = array('d', daten[start + 8 * anzahl:])
+        punkte.byteswap()
+        zeiten.byteswap()
+        with open(self.snapshot, 'wb') as file:
+            file.write(kopf.pack(*felder) + daten[kopf.size:start] +
+                       punkte.tobytes() + zeiten.tobytes())
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 0))
+
+    def test_falsche_kennung(self):
+        with open(self.snapshot, 'r+b') as file:
+            file.write(b'QRSNAP99')
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 2))
+
+    def test_kurzer_kopf(self):
+        with open(self.snapshot, 'r+b') as file:
+            file.truncate(10)
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 2))
+
+    def test_falsche_laenge(self):
+        with open(self.snapshot, 'r+b') as file:
+            file.truncate(os.path.getsize(self.snapshot) - 8)
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 2))
+
+    def test_leerer_snapshot(self):
+        open(self.snapshot, 'wb').close()
+        self.assertEqual(self.laden(), ([('B', 2, 2.0), ('A', 1, 1.0)], 2))
+
+
+class GleichzeitigTest(_MitVerzeichnis):
+
+    def test_kleine_zeiten_summieren_sich(self):
+        for _ in range(10):
+            qr = QuizRangliste(datei=self.datei, gleichzeitig=True)
+            qr.resultat_addieren('A', 1, 0.04)
+            qr.speichern()
+        name, punkte, zeit = QuizRangliste(datei=self.datei).als_liste()[0]
+        self.assertEqual((name, punkte), ('A', 10))
+        self.assertAlmostEqual(zeit, 0.4)
+        # gleiches Format wie beim gewöhnlichen Speichern
+        self.assertEqual(self.lesen(), 'A,10,0.4\n')
+
+    def test_textdatei_gerundet(self):
+        self.schreiben('B,2,2.0\n')
+        qr = QuizRangliste(datei=self.datei, gleichzeitig=True)
+        qr.resultat_addieren('A', 1, 1 / 3)
+        qr.speichern()
+        self.assertEqual(self.lesen(), 'B,2,2.0\nA,1,0.3\n')
+        # ungerundet in der eigenen Rangliste und für andere Prozesse
+        self.assertEqual(qr.als_liste()[1], ('A', 1, 1 / 3))
+        self.assertEqual(QuizRangliste(
+            datei=self.datei, gleichzeitig=True).als_liste()[1],
+            ('A', 1, 1 / 3))
+
+    def test_textdatei_von_aussen_geaendert(self):
+        qr = QuizRangliste(datei=self.datei, gleichzeitig=True)
+        qr.resultat_addieren('A', 1, 0.04)
+        qr.speichern()
+        # die ungerundeten Zeiten passen nicht mehr zur Textdatei
+        self.schreiben('A,5,1.0\n')
+        qr.resultat_addieren('A', 1, 0.04)
+        qr.speichern()
+        self.assertEqual(qr.als_liste(), [('A', 6, 1.04)])
+        self.assertEqual(self.lesen(), 'A,6,1.0\n')
+
+    def test_mehrere_prozesse(self):
+        prozesse = [multiprocessing.Process(target=_teilresultate,
+                                            args=(self.datei, 5))
+                    for _ in range(4)]
+        for prozess in prozesse:
+            prozess.start()
+        for prozess in prozesse:
+            prozess.join()
+            self.assertEqual(prozess.exitcode, 0)
+        name, punkte, zeit = QuizRangliste(datei=self.datei).als_liste()[0]
+        self.assertEqual((name, punkte), ('A', 20))
+        self.assertAlmostEqual(zeit, 0.8)
+        self.assertEqual(self.lesen(), 'A,20,0.8\n')
+
+
+class SqliteTest(_MitVerzeichnis):
+
+    def test_konflikt_verwirft_keine_aenderungen(self):
+        self.schreiben('A,1,1.0\n')
+        qr = QuizRangliste(datei=self.datei, speicher='sqlite')
+        qr.resultat_addieren('B', 2, 2.0)
+        qr.speichern()
+        del qr
+        stat = os.stat(self.datei)
+
+        # Textdatei von aussen verändert, B nur in der Datenbank
+        self.schreiben('A,1,1.0\nC,3,3.0\n')
+        with self.assertRaises(ValueError):
+            QuizRangliste(datei=self.datei, speicher='sqlite')
+
+        # mit dem alten Stand der Textdatei ist B noch da
+        self.schreiben('A,1,1.0\n')
+        os.utime(self.datei, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        qr = QuizRangliste(datei=self.datei, speicher='sqlite')
+        self.assertEqual(qr.als_liste(), [('B', 2, 2.0), ('A', 1, 1.0)])
+
+    def test_kompaktiert_wird_neu_eingelesen(self):
+        self.schreiben('A,1,1.0\n')
+        qr = QuizRangliste(datei=self.datei, speicher='sqlite')
+        qr.resultat_addieren('B', 2, 2.0)
+        qr.kompaktieren()
+        del qr
+
+        self.schreiben('C,3,3.0\n')
+        qr = QuizRangliste(datei=self.datei, speicher='sqlite')
+        self.assertEqual(qr.als_liste(), [('C', 3, 3.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# test_rangliste_server.py
+'''
+Tests zu RanglistenServer. Aufruf im Verzeichnis 01_Testat:
+    python -m pytest -q test_rangliste_server.py
+'''
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from quizrangliste import QuizRangliste
+from rangliste_server import RanglistenServer
+
+
+class _FehlerhaftesSpeichern():
+    # Ersetzt speichern(): die ersten fehler Aufrufe scheitern
+
+    def __init__(self, rangliste, fehler):
+        self.aufrufe = 0
+        self._fehler = fehler
+        self._speichern = rangliste.speichern
+
+    def __call__(self):
+        self.aufrufe += 1
+        if self.aufrufe <= self._fehler:
+            raise OSError('Platte voll')
+        self._speichern()
+
+
+class SpeicherfehlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.verzeichnis = tempfile.mkdtemp()
+        self.datei = os.path.join(self.verzeichnis, 'rangliste.txt')
+        with open(self.datei, 'w', encoding='utf-8') as file:
+            file.write('A,1,1.0\n')
+        self.rangliste = QuizRangliste(self.datei, journal=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.verzeichnis)
+
+    async def senden(self, server, befehle, beenden=False):
+        # Befehle an den Server senden, Antworten als Liste. Mit
+        # beenden=True wird der Server beendet, bevor alle Antworten
+        # eingetroffen sind.
+        await server.starten()
+        host, port = server._server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(''.join(b + '\n' for b in befehle).encode('utf-8'))
+        await writer.drain()
+        if beenden:
+            await asyncio.sleep(0.05)
+            await server.beenden()
+        antworten = [json.loads(await reader.readline()) for _ in befehle]
+        writer.close()
+        await server.beenden()
+        return antworten
+
+    def test_wiederholen_statt_doppelt_zaehlen(self):
+        speichern = _FehlerhaftesSpeichern(self.rangliste, 2)
+        self.rangliste.speichern = speichern
+        server = RanglistenServer(self.rangliste, intervall=0.01)
+        antworten = asyncio.run(self.senden(
+            server, ['ADD A,5,2.0', 'ADD B,x,1.0', 'ADD C,3,3.0']))
+
+        self.assertEqual(antworten[0], {'ok': True})
+        self.assertFalse(antworten[1]['ok'])
+        self.assertEqual(antworten[2], {'ok': True})
+        self.assertEqual(speichern.aufrufe, 3)
+        self.assertEqual(server.statistik()['speicherfehler'], 2)
+        self.assertEqual(server.statistik()['resultate'], 2)
+        # jedes Resultat genau einmal gezählt, auch in der Datei
+        self.assertEqual(self.rangliste.als_liste(),
+                         [('A', 6, 3.0), ('C', 3, 3.0)])
+        self.rangliste.kompaktieren()
+        self.assertEqual(QuizRangliste(self.datei).als_liste(),
+                         [('A', 6, 3.0), ('C', 3, 3.0)])
+
+    def test_fehler_beim_beenden(self):
+        self.rangliste.speichern = _FehlerhaftesSpeichern(
+            self.rangliste, 10 ** 6)
+        server = RanglistenServer(self.rangliste, intervall=10)
+        antworten = asyncio.run(
+            self.senden(server, ['ADD A,5,2.0'], beenden=True))
+        self.assertEqual(antworten, [{'ok': False, 'fehler': 'Platte voll'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
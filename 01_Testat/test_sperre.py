@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# test_sperre.py
+'''
+Tests zu sperre.ersetzen(). Aufruf im Verzeichnis 01_Testat:
+    python -m pytest -q test_sperre.py
+'''
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from sperre import ersetzen
+
+
+class ErsetzenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.verzeichnis = tempfile.mkdtemp()
+        self.ziel = os.path.join(self.verzeichnis, 'rangliste.txt')
+        with open(self.ziel, 'w', encoding='utf-8') as file:
+            file.write('A,1,1.0\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.verzeichnis)
+
+    def lesen(self):
+        with open(self.ziel, encoding='utf-8') as file:
+            return file.read()
+
+    def test_ersetzt_inhalt(self):
+        ersetzen(self.ziel, lambda datei: datei.write('B,2,2.0\n'))
+        self.assertEqual(self.lesen(), 'B,2,2.0\n')
+        self.assertEqual(os.listdir(self.verzeichnis), ['rangliste.txt'])
+
+    def test_neue_datei(self):
+        os.remove(self.ziel)
+        ersetzen(self.ziel, lambda datei: datei.write('B,2,2.0\n'))
+        self.assertEqual(self.lesen(), 'B,2,2.0\n')
+
+    def test_fehler_laesst_ziel_unveraendert(self):
+        def schreiben(datei):
+            datei.write('B,2,2.0\n')
+            raise OSError('Platte voll')
+
+        with self.assertRaises(OSError):
+            ersetzen(self.ziel, schreiben)
+        self.assertEqual(self.lesen(), 'A,1,1.0\n')
+        # keine temporäre Datei zurückgelassen
+        self.assertEqual(os.listdir(self.verzeichnis), ['rangliste.txt'])
+
+    @unittest.skipUnless(os.name == 'posix', 'Zugriffsrechte nur unter Unix')
+    def test_zugriffsrechte_bleiben_erhalten(self):
+        for modus in (0o640, 0o604):
+            os.chmod(self.ziel, modus)
+            ersetzen(self.ziel, lambda datei: datei.write('B,2,2.0\n'))
+            self.assertEqual(stat.S_IMODE(os.stat(self.ziel).st_mode), modus)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# verlauf.py
+
+from bisect import bisect_left, bisect_right, insort
+
+
+class Verlauf():
+    '''
+    Verlauf der Teilresultate, vorverdichtet in Zeit-Eimer fester Länge.
+
+    Pro Teilnehmer werden die belegten Eimer (aufsteigend) und die
+    Präfixsummen von Punkten und Zeit über diese Eimer geführt. Die
+    Summe eines Zeitfensters ist damit die Differenz zweier
+    Präfixsummen, gefunden per Binärsuche, unabhängig von der Anzahl
+    Teilresultate.
+
+    Zusätzlich wird pro Eimer die Menge der aktiven Teilnehmer
+    geführt. Eine Rangliste über ein kurzes Fenster betrachtet nur
+    diese Teilnehmer statt aller.
+
+    Zeitpunkte sind Sekunden (z.B. time.time()), Fenster werden auf
+    ganze Eimer erweitert.
+    '''
+
+    def __init__(self, eimer=3600):
+        '''
+        Argumente:
+            eimer: Länge eines Eimers in Sekunden, Standard 1 Stunde.
+        '''
+        if not eimer > 0:
+            raise ValueError('Eimerlänge muss positiv sein')
+        self._laenge = eimer
+        # name => [eimer, präfix_punkte, präfix_zeit] (drei Listen)
+        self._teilnehmer = {}
+        # eimer => Menge der Namen, plus sortierte Liste der Eimer
+        self._aktiv = {}
+        self._eimer = []
+        self._anzahl = 0
+
+    def __len__(self):
+        # Anzahl verdichteter Einträge (Eimer, Name)
+        return self._anzahl
+
+    def eimer(self, zeitpunkt):
+        '''
+        Gibt die Nummer des Eimers zurück, der zeitpunkt enthält.
+        '''
+        return int(zeitpunkt // self._laenge)
+
+    def hinzufuegen(self, zeitpunkt, name, punkte, zeit):
+        '''
+        Fügt ein Teilresultat hinzu. Zeitpunkte dürfen in beliebiger
+        Reihenfolge kommen; am günstigsten (konstante Zeit) ist ein
+        Resultat im neusten Eimer des Teilnehmers.
+
+        Argumente:
+            zeitpunkt: float -- Sekunden
+            name: string
+            punkte: int, zeit: float -- Teilresultat
+        '''
+        nummer = self.eimer(zeitpunkt)
+        daten = self._teilnehmer.get(name)
+        if daten is None:
+            daten = self._teilnehmer[name] = [[], [], []]
+        eimer, summe_punkte, summe_zeit = daten
+
+        i = bisect_left(eimer, nummer)
+        if i == len(eimer) or eimer[i] != nummer:
+            eimer.insert(i, nummer)
+            summe_punkte.insert(i, summe_punkte[i - 1] if i else 0)
+            summe_zeit.insert(i, summe_zeit[i - 1] if i else 0.0)
+            self._anzahl += 1
+            namen = self._aktiv.get(nummer)
+            if namen is None:
+                namen = self._aktiv[nummer] = set()
+                insort(self._eimer, nummer)
+            namen.add(name)
+
+        # Präfixsummen ab Eimer i nachführen (meist nur der letzte)
+        for j in range(i, len(eimer)):
+            summe_punkte[j] += punkte
+            summe_zeit[j] += zeit
+
+    def entfernen(self, name):
+        '''
+        Entfernt den ganzen Verlauf eines Teilnehmers.
+        '''
+        daten = self._teilnehmer.pop(name, None)
+        if daten is None:
+            return
+        self._anzahl -= len(daten[0])
+        for nummer in daten[0]:
+            namen = self._aktiv[nummer]
+            namen.discard(name)
+            if not namen:
+                del self._aktiv[nummer]
+                del self._eimer[bisect_left(self._eimer, nummer)]
+
+    def __bereich(self, von, bis):
+        # erster und letzter Eimer des Fensters (inklusive)
+        erster = None if von is None else self.eimer(von)
+        letzter = None
+        if bis is not None:
+            letzter = self.eimer(bis)
+            if letzter * self._laenge == bis:
+                # bis ist exklusive
+                letzter -= 1
+        return erster, letzter
+
+    def summe(self, name, von=None, bis=None):
+        '''
+        Gibt die Summe der Teilresultate eines Teilnehmers im Fenster
+        [von, bis) zurück, None = offen.
+
+        Rückgabewert:
+            Tupel (punkte, zeit),
+            None -- falls der Teilnehmer im Fenster keine Resultate hat.
+        '''
+        daten = self._teilnehmer.get(name)
+        if daten is None:
+            return None
+        return self.__summe(daten, *self.__bereich(von, bis))
+
+    @staticmethod
+    def __summe(daten, erster, letzter):
+        eimer, summe_punkte, summe_zeit = daten
+        i = 0 if erster is None else bisect_left(eimer, erster)
+        j = len(eimer) if letzter is None else bisect_right(eimer, letzter)
+        if i >= j:
+            return None
+        if i == 0:
+            return summe_punkte[j - 1], summe_zeit[j - 1]
+        return (summe_punkte[j - 1] - summe_punkte[i - 1],
+                summe_zeit[j - 1] - summe_zeit[i - 1])
+
+    def fenster(self, von=None, bis=None):
+        '''
+        Gibt die Rangliste des Zeitfensters [von, bis) zurück, sortiert
+        wie QuizRangliste.als_liste(): Punkte absteigend, Zeit und Name
+        aufsteigend. Nur Teilnehmer mit Resultaten im Fenster.
+
+        Die Kosten hängen von der Anzahl Teilnehmer im Fenster ab, nicht
+        von der Anzahl Teilresultate.
+
+        Argumente:
+            von, bis: float -- Zeitpunkte in Sekunden, None = offen
+
+        Rückgabewert:
+            Liste von Tupeln (name, punkte, zeit)
+        '''
+        erster, letzter = self.__bereich(von, bis)
+        i = 0 if erster is None else bisect_left(self._eimer, erster)
+        j = (len(self._eimer) if letzter is None
+             else bisect_right(self._eimer, letzter))
+
+        # Kandidaten aus den aktiven Mengen, falls das weniger sind
+        # als alle Teilnehmer
+        if sum(len(self._aktiv[nummer]) for nummer in self._eimer[i:j]) \
+                < len(self._teilnehmer):
+            namen = set().union(*[self._aktiv[nummer]
+                                  for nummer in self._eimer[i:j]])
+        else:
+            namen = self._teilnehmer
+
+        liste = []
+        for name in namen:
+            werte = self.__summe(self._teilnehmer[name], erster, letzter)
+            if werte is not None:
+                liste.append((name, werte[0], werte[1]))
+        liste.sort(key=lambda zeile: (-zeile[1], zeile[2], zeile[0]))
+        return liste
+
+    def eintraege(self):
+        '''
+        Iteriert über die verdichteten Einträge als Tupel
+        (zeitpunkt, name, punkte, zeit), zeitpunkt = Beginn des Eimers.
+        Erneut hinzugefügt ergeben sie den gleichen Verlauf.
+        '''
+        for name, (eimer, summe_punkte, summe_zeit) in \
+                self._teilnehmer.items():
+            vorher_punkte, vorher_zeit = 0, 0.0
+            for nummer, punkte, zeit in zip(eimer, summe_punkte, summe_zeit):
+                yield (nummer * self._laenge, name,
+                       punkte - vorher_punkte, zeit - vorher_zeit)
+                vorher_punkte, vorher_zeit = punkte, zeit
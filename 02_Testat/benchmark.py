@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# benchmark.py
+'''
+Benchmark der Integrationsverfahren von TopoMap.fall_line().
+
+Wählt reproduzierbare Startpunkte auf dem Land (fester Seed) und
+verfolgt von jedem aus die Fallinie bergab und bergauf, einmal mit
+method='fixed' und einmal mit method='adaptive'. Gemessen werden die
+Anzahl Auswertungen der Interpolationsfunktionen (Höhe und Gradient),
+die Anzahl Schritte, die Zeit und der Abstand der Endpunkte zum
+Endpunkt von method='fixed'.
+
+Beispiele:
+    python benchmark.py
+    python benchmark.py --starts 200 --ausgabe fall_line.json
+    python benchmark.py --interpolation bilinear
+'''
+
+import argparse
+import json
+import platform
+import time
+
+import numpy as np
+
+from musterloesung import TopoMap
+
+METHODEN = ('fixed', 'adaptive')
+
+
+class _ZaehlendeKarte(TopoMap):
+    # TopoMap, die jeden Aufruf einer Interpolationsfunktion zählt
+
+    def __init__(self, fname, **kwargs):
+        super().__init__(fname, **kwargs)
+        self.auswertungen = 0
+
+    def _interpolator(self, name):
+        ev = super()._interpolator(name)
+
+        def zaehlen(x, y):
+            self.auswertungen += 1
+            return ev(x, y)
+        return zaehlen
+
+
+def startpunkte(karte, anzahl, seed=0):
+    '''
+    Gibt anzahl zufällige Startpunkte auf dem Land (z > 0) zurück.
+    '''
+    zufall = np.random.default_rng(seed)
+    punkte = np.empty((0, 2))
+    while len(punkte) < anzahl:
+        neu = np.c_[zufall.uniform(*karte._x_lim, anzahl),
+                    zufall.uniform(*karte._y_lim, anzahl)]
+        punkte = np.r_[punkte, neu[karte.elevation(neu) > 0]]
+    return punkte[:anzahl]
+
+
+def messen(datei='map_data.txt', anzahl=50, seed=0, wiederholungen=3,
+           interpolation='spline'):
+    '''
+    Misst beide Verfahren für bergab und bergauf.
+
+    Die Zeit ist das Minimum über die Wiederholungen, mit bereits
+    erstellten Interpolationsfunktionen (warm_up()) und ohne Zählung.
+
+    Rückgabewert:
+        Liste von Dictionaries mit methode, richtung, auswertungen,
+        schritte, sekunden, abstand_median und abstand_max (Meter)
+    '''
+    karte = _ZaehlendeKarte(datei, interpolation=interpolation)
+    schnell = TopoMap(datei, interpolation=interpolation).warm_up()
+    punkte = startpunkte(schnell, anzahl, seed)
+    ergebnisse = []
+    for descent in (True, False):
+        referenz = None
+        for methode in METHODEN:
+            karte.auswertungen = 0
+            pfade = [karte.fall_line(start, descent=descent, method=methode)
+                     for start in punkte]
+            auswertungen = karte.auswertungen
+
+            sekunden = None
+            for _ in range(wiederholungen):
+                beginn = time.perf_counter()
+                for start in punkte:
+                    schnell.fall_line(start, descent=descent, method=methode)
+                dauer = time.perf_counter() - beginn
+                sekunden = dauer if sekunden is None else min(sekunden,
+                                                              dauer)
+
+            enden = np.array([pfad[-1] for pfad in pfade])
+            if referenz is None:
+                referenz = enden
+            abstand = np.hypot(*(enden - referenz).T)
+            ergebnisse.append({
+                'methode': methode,
+                'richtung': 'bergab' if descent else 'bergauf',
+                'auswertungen': auswertungen,
+                'schritte': sum(len(pfad) - 1 for pfad in pfade),
+                'sekunden': sekunden,
+                'abstand_median': float(np.median(abstand)),
+                'abstand_max': float(np.max(abstand)),
+            })
+    return ergebnisse
+
+
+# --- Start -------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark der fall_line()-Verfahren.')
+    parser.add_argument('--datei', default='map_data.txt')
+    parser.add_argument('--starts', type=int, default=50,
+                        help='Anzahl Startpunkte')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--wiederholungen', type=int, default=3)
+    parser.add_argument('--interpolation', default='spline',
+                        choices=TopoMap.INTERPOLATIONS)
+    parser.add_argument('--ausgabe', help='JSON-Datei')
+    argumente = parser.parse_args()
+
+    ergebnisse = messen(argumente.datei, argumente.starts, argumente.seed,
+                        argumente.wiederholungen, argumente.interpolation)
+    print('{:>9} {:>8} {:>12} {:>9} {:>9} {:>14}'.format(
+        'Methode', 'Richtung', 'Auswertungen', 'Schritte', 'Sekunden',
+        'Abstand med/max'))
+    for e in ergebnisse:
+        print('{:>9} {:>8} {:>12} {:>9} {:>9.3f} {:>7.1f}/{:.1f}'.format(
+            e['methode'], e['richtung'], e['auswertungen'], e['schritte'],
+            e['sekunden'], e['abstand_median'], e['abstand_max']))
+
+    if argumente.ausgabe:
+        with open(argumente.ausgabe, 'w', encoding='utf-8') as datei:
+            json.dump({
+                'umgebung': {
+                    'python': platform.python_version(),
+                    'plattform': platform.platform(),
+                    'zeitpunkt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'starts': argumente.starts,
+                    'seed': argumente.seed,
+                    'interpolation': argumente.interpolation,
+                },
+                'messungen': ergebnisse,
+            }, datei, indent=2)
+            datei.write('\n')
@@ -1,66 +1,354 @@
 # -*- coding: utf-8 -*-
 # testat2_muloe.py
 
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.interpolate import RectBivariateSpline
 import matplotlib.colors as colors
 
 
+# Typen einzelner Koordinaten (alles andere wird als Array behandelt)
+_SCALARS = (float, int, np.floating, np.integer)
+
+
+class _GridInterpolator:
+    '''Bilinear or bicubic interpolation on the map grid.
+
+    Evaluates grid[y, x] directly from the neighbouring grid values,
+    without spline coefficients: an index and weight computation plus
+    4 (bilinear) or 16 (bicubic) lookups per point, vectorised for
+    arrays. Outside the map the values at the edge are continued.
+
+    The bicubic variant is the cubic convolution of Keys (a = -1/2):
+    continuous first derivatives, exact for quadratic surfaces on a
+    regular grid.
+    '''
+
+    def __init__(self, x, y, grid, cubic=False):
+        self._x = x
+        self._y = y
+        self._grid = grid
+        self._cubic = cubic
+        # als Python-Zahlen für einzelne Punkte
+        self._x0 = float(x[0])
+        self._y0 = float(y[0])
+        self._nx = len(x)
+        self._ny = len(y)
+        # reguläres Gitter: Index direkt berechnen statt suchen
+        self._x_step = float(x[-1] - x[0]) / (self._nx - 1)
+        self._y_step = float(y[-1] - y[0]) / (self._ny - 1)
+        self._regular = (np.allclose(np.diff(x), self._x_step)
+                         and np.allclose(np.diff(y), self._y_step))
+
+    def __call__(self, x, y):
+        '''Evaluate at the points (x, y), like RectBivariateSpline.ev.
+        '''
+        if isinstance(x, _SCALARS) and isinstance(y, _SCALARS):
+            return self._point(float(x), float(y))
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if self._regular:
+            fx = np.clip((x - self._x0) / self._x_step, 0, self._nx - 1)
+            fy = np.clip((y - self._y0) / self._y_step, 0, self._ny - 1)
+        else:
+            fx = np.interp(x, self._x, np.arange(self._nx, dtype=float))
+            fy = np.interp(y, self._y, np.arange(self._ny, dtype=float))
+        ix = np.minimum(fx.astype(np.intp), self._nx - 2)
+        iy = np.minimum(fy.astype(np.intp), self._ny - 2)
+        tx = fx - ix
+        ty = fy - iy
+        grid = self._grid
+        if not self._cubic:
+            return ((1 - ty)*((1 - tx)*grid[iy, ix] + tx*grid[iy, ix + 1])
+                    + ty*((1 - tx)*grid[iy + 1, ix] + tx*grid[iy + 1, ix + 1]))
+
+        # Nachbarn ix-1 .. ix+2, am Rand der Karte wiederholt
+        columns = (np.maximum(ix - 1, 0), ix, ix + 1,
+                   np.minimum(ix + 2, self._nx - 1))
+        rows = (np.maximum(iy - 1, 0), iy, iy + 1,
+                np.minimum(iy + 2, self._ny - 1))
+        wx = self._keys(tx)
+        wy = self._keys(ty)
+        result = 0
+        for row, w in zip(rows, wy):
+            line = 0
+            for column, v in zip(columns, wx):
+                line = line + v*grid[row, column]
+            result = result + w*line
+        return result
+
+    @staticmethod
+    def _keys(t):
+        # Gewichte der vier Nachbarn für den Abstand t (0..1) zum zweiten
+        # https://en.wikipedia.org/wiki/Bicubic_interpolation
+        t2 = t*t
+        t3 = t2*t
+        return ((-t3 + 2*t2 - t)/2,
+                (3*t3 - 5*t2 + 2)/2,
+                (-3*t3 + 4*t2 + t)/2,
+                (t3 - t2)/2)
+
+    def _point(self, x, y):
+        # Einzelner Punkt mit Python-Zahlen statt Arrays (fall_line)
+        nx, ny = self._nx, self._ny
+        if self._regular:
+            fx = (x - self._x0) / self._x_step
+            fy = (y - self._y0) / self._y_step
+        else:
+            fx = float(np.interp(x, self._x, np.arange(nx, dtype=float)))
+            fy = float(np.interp(y, self._y, np.arange(ny, dtype=float)))
+        # Vergleiche statt min()/max(), hier zählt jeder Aufruf
+        if fx < 0.0:
+            fx = 0.0
+        elif fx > nx - 1:
+            fx = nx - 1.0
+        if fy < 0.0:
+            fy = 0.0
+        elif fy > ny - 1:
+            fy = ny - 1.0
+        ix = int(fx)
+        if ix > nx - 2:
+            ix = nx - 2
+        iy = int(fy)
+        if iy > ny - 2:
+            iy = ny - 2
+        tx = fx - ix
+        ty = fy - iy
+        item = self._grid.item
+        if not self._cubic:
+            return ((1 - ty)*((1 - tx)*item(iy, ix) + tx*item(iy, ix + 1))
+                    + ty*((1 - tx)*item(iy + 1, ix)
+                          + tx*item(iy + 1, ix + 1)))
+
+        columns = (max(ix - 1, 0), ix, ix + 1, min(ix + 2, nx - 1))
+        rows = (max(iy - 1, 0), iy, iy + 1, min(iy + 2, ny - 1))
+        wx = self._keys(tx)
+        result = 0.0
+        for row, w in zip(rows, self._keys(ty)):
+            result += w*(wx[0]*item(row, columns[0])
+                         + wx[1]*item(row, columns[1])
+                         + wx[2]*item(row, columns[2])
+                         + wx[3]*item(row, columns[3]))
+        return result
+
+
 class TopoMap:
     '''Hilfsfunktionen für die Benutzung von Kartendaten.
     '''
 
-    def __init__(self, fname, **kwargs):
+    # Interpolationsverfahren, siehe __init__
+    INTERPOLATIONS = ('spline', 'bicubic', 'bilinear')
+
+    # kleinste Schrittweite von fall_line(method='adaptive'), in
+    # Vielfachen eines festen Schritts
+    _MIN_STEP = 1e-6
+
+    def __init__(self, fname, messung=None, interpolation='spline',
+                 **kwargs):
         '''Kartendaten einlesen.
 
+        Neben dem CSV-Format (erste Zeile = x-Achse, erste Spalte =
+        y-Achse) wird eine binäre .npy-Datei mit dem gleichen Aufbau
+        gelesen, siehe convert_to_npy(). Sie wird nur in den Speicher
+        abgebildet (memory map), die Höhendaten werden erst beim Zugriff
+        von der Platte gelesen.
+
+        Das Interpolationsverfahren für Höhe und Gradient (elevation(),
+        fall_line()) ist wählbar:
+            'spline' -- kubischer Spline (RectBivariateSpline), am
+                glattesten. Das Erstellen liest das ganze Gitter und
+                kostet Zeit und Speicher (2000 x 2000 Punkte: etwa 1 s
+                für Höhe und Gradient), grosse Gitter werten langsam aus.
+            'bicubic' -- kubische Faltung (Keys) direkt auf dem Gitter,
+                16 Nachbarn pro Punkt, ohne Aufbau. Für grosse
+                Punktmengen etwas (map_data.txt) bis mehrfach (grosse
+                Gitter) schneller als 'spline', einzelne Punkte sind
+                langsamer. Abweichung zu 'spline' auf map_data.txt:
+                Median 0.01 m, höchstens etwa 8 m an steilen Stellen.
+            'bilinear' -- 4 Nachbarn pro Punkt, am schnellsten (grosse
+                Punktmengen 4- bis 14-mal, einzelne Punkte etwa 2-mal
+                schneller als 'spline'). Die Fläche hat Knicke an den
+                Gitterlinien; Abweichung auf map_data.txt: Median
+                0.2 m, höchstens etwa 3 m.
+        Die Gradienten kommen bei allen Verfahren aus np.gradient(). Mit
+        'bicubic' und 'bilinear' liest elevation() aus einer .npy-Karte
+        nur die Nachbarn der gefragten Punkte.
+
         Argumente:
-            fname -- Pfad der Datei
+            fname -- Pfad der Datei (.npy = binär, sonst CSV)
+            messung -- optional, Objekt mit den Methoden
+                zaehlen(name, anzahl) und zeit(name, sekunden), z.B.
+                messung.Messung() aus 01_Testat. Meldet Laufzeiten und
+                Zähler unter Namen 'topomap.*'; None = nichts messen.
+            interpolation -- 'spline', 'bicubic' oder 'bilinear'
         '''
+        if interpolation not in self.INTERPOLATIONS:
+            raise ValueError('unknown interpolation: {!r}'.format(
+                interpolation))
         # cooperative superclass calls
         super().__init__(**kwargs)
+        self._messung = messung
+        beginn = time.perf_counter()
 
         # Kartendaten aus der Datei einlesen
-        data = np.loadtxt(fname, delimiter=',')
+        self._mapped = str(fname).endswith('.npy')
+        self._fname = fname
+        if self._mapped:
+            data = np.load(fname, mmap_mode='r')
+        else:
+            data = np.loadtxt(fname, delimiter=',')
+            # wie die .npy-Karte nur lesbar, auch für alle Ansichten
+            data.flags.writeable = False
 
-        # Hilfsvariablen
-        self._x = data[0, 1:]
-        self._y = data[1:, 0]
+        # Hilfsvariablen (Achsen als eigene, kleine Arrays)
+        self._x = np.array(data[0, 1:])
+        self._y = np.array(data[1:, 0])
         self._x_lim = (np.min(self._x), np.max(self._x))
         self._x_step = np.mean(np.abs(np.diff(self._x)))
         self._y_lim = (np.min(self._y), np.max(self._y))
         self._y_step = np.mean(np.abs(np.diff(self._y)))
+        self._x.flags.writeable = False
+        self._y.flags.writeable = False
 
         # Kartendaten in nicht-öffentliche Variablen speichern
-        self._X, self._Y = np.meshgrid(self._x, self._y)
         self._Z = data[1:, 1:]
 
-        # Interpolationsfunktion für die z-Achse
-        self._Z_interp = RectBivariateSpline(self._x, self._y, self._Z.T).ev
+        # Abgeleitete Daten (Gradient, Interpolationsfunktionen) werden
+        # erst beim ersten Gebrauch berechnet, siehe warm_up()
+        self._gradient = None
+        self._interpolation = interpolation
+        self._interpolators = {}
+
+        if messung is not None:
+            messung.zeit('topomap.init', time.perf_counter() - beginn)
+
+    def __getstate__(self):
+        # Für pickle (Worker-Prozesse von elevation_chunked()): ohne
+        # messung, eine .npy-Karte nur als Dateiname. Gitter-Interpolatoren
+        # und Gradient entstehen im Empfänger bei Bedarf neu, Splines
+        # werden mitgeschickt, weil ihr Aufbau teuer ist.
+        state = self.__dict__.copy()
+        state['_messung'] = None
+        state['_gradient'] = None
+        state['_interpolators'] = {
+                name: ev for name, ev in self._interpolators.items()
+                if not isinstance(ev, _GridInterpolator)}
+        if self._mapped:
+            del state['_Z']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._mapped:
+            self._Z = np.load(self._fname, mmap_mode='r')[1:, 1:]
+        for data in (self._x, self._y, self._Z):
+            data.flags.writeable = False
+
+    def warm_up(self, *parts):
+        '''Build the lazily computed data in advance.
+
+        Without warm_up() each part is built on first use: the
+        elevation interpolator by elevation() and the gradient
+        interpolators by fall_line(). Long-running processes can pay
+        for them up front instead.
+
+        'grid' is still accepted but does nothing: X and Y are views
+        of the axes and need no preparation.
+
+        Arguments:
+            parts -- any of 'elevation', 'gradient', 'grid'; all if
+                empty
 
+        Returns:
+            self
+        '''
+        for part in parts or ('elevation', 'gradient'):
+            if part == 'elevation':
+                self._interpolator('z')
+            elif part == 'gradient':
+                self._interpolator('dx')
+                self._interpolator('dy')
+            elif part == 'grid':
+                # X und Y sind Views, nichts vorzubereiten
+                pass
+            else:
+                raise ValueError('unknown part: {!r}'.format(part))
+        return self
+
+    def _gradient_grid(self):
         # Gradient in x- und y-Richtung berechnen
         # https://docs.scipy.org/doc/numpy/reference/generated/numpy.gradient.html
-        dZ_dy, dZ_dx = np.gradient(
-                self._Z,        # z-Werte
-                self._y_step,   # Abstand zwischen den y-Werten
-                self._x_step,   # Abstand zwischen den x-Werten
-        )
+        if self._gradient is None:
+            dZ_dy, dZ_dx = np.gradient(
+                    self._Z,        # z-Werte
+                    self._y_step,   # Abstand zwischen den y-Werten
+                    self._x_step,   # Abstand zwischen den x-Werten
+            )
+            self._gradient = (dZ_dx, dZ_dy)
+        return self._gradient
+
+    def _interpolator(self, name):
+        # Interpolationsfunktion, beim ersten Gebrauch erstellt
+        ev = self._interpolators.get(name)
+        if ev is None:
+            if name == 'z':
+                grid = self._Z
+            else:
+                dZ_dx, dZ_dy = self._gradient_grid()
+                grid = dZ_dx if name == 'dx' else dZ_dy
+            if self._interpolation == 'spline':
+                ev = self._spline(grid).ev
+            else:
+                ev = _GridInterpolator(
+                        self._x, self._y, grid,
+                        cubic=self._interpolation == 'bicubic')
+            self._interpolators[name] = ev
+        return ev
+
+    @property
+    def _Z_interp(self):
+        # Interpolationsfunktion für die z-Achse
+        return self._interpolator('z')
 
+    @property
+    def _gradient_dx(self):
         # Interpolationsfunktionen für den Gradienten
-        self._gradient_dx = RectBivariateSpline(self._x, self._y, dZ_dx.T).ev
-        self._gradient_dy = RectBivariateSpline(self._x, self._y, dZ_dy.T).ev
+        return self._interpolator('dx')
+
+    @property
+    def _gradient_dy(self):
+        return self._interpolator('dy')
+
+    def _spline(self, Z):
+        # Interpolationsfunktion über dem Kartengitter (Z[y, x])
+        if self._messung is None:
+            return RectBivariateSpline(self._x, self._y, Z.T)
+        beginn = time.perf_counter()
+        spline = RectBivariateSpline(self._x, self._y, Z.T)
+        self._messung.zeit('topomap.spline', time.perf_counter() - beginn)
+        return spline
+
+    # X, Y und Z sind nur lesbare Ansichten ohne Kopie; X und Y
+    # wiederholen die 1-D-Achsen über das ganze Gitter (wie meshgrid),
+    # ohne Speicher dafür zu belegen. Veränderbare Kopien: tmap.X.copy()
 
     @property
     def X(self):
-        return self._X.copy()
+        return np.broadcast_to(self._x, self._Z.shape)
 
     @property
     def Y(self):
-        return self._Y.copy()
+        return np.broadcast_to(self._y[:, np.newaxis], self._Z.shape)
 
     @property
     def Z(self):
-        return self._Z.copy()
+        return self._Z.view()
 
     def highest_point(self):
         '''Find the highest point in the map.
@@ -85,11 +373,102 @@ class TopoMap:
             position -- list [x, y] or 2D array [[x1, y1], ...] of positions
         '''
         position = np.atleast_2d(position)
-        return self._Z_interp(position[:, 0], position[:, 1])
+        if self._messung is None:
+            return self._Z_interp(position[:, 0], position[:, 1])
+        beginn = time.perf_counter()
+        z = self._Z_interp(position[:, 0], position[:, 1])
+        self._messung.zeit('topomap.elevation', time.perf_counter() - beginn)
+        self._messung.zaehlen('topomap.elevation.punkte', len(position))
+        return z
         # oder:
         # position = np.asarray(position)
         # return self._Z_interp(position[..., 0], position[..., 1])
 
+    def elevation_chunked(self, positions, out=None, chunk_size=1 << 16,
+                          workers=None, processes=False):
+        '''Return the elevation for very many positions, chunk by chunk.
+
+        The positions are read and evaluated in chunks of chunk_size
+        points, each chunk in a worker thread or process. At most two
+        chunks per worker are in flight, and the results are written
+        to out in order, so memory use depends on chunk_size and
+        workers, not on the number of positions.
+
+        Threads suit 'bicubic' and 'bilinear' (NumPy releases the GIL
+        for the large array operations), processes suit 'spline'. A
+        process receives the map once; a .npy map is reopened there as
+        a memory map instead of being copied.
+
+        Arguments:
+            positions -- 2D array [[x1, y1], ...], e.g. np.memmap or
+                np.load(..., mmap_mode='r'), or an iterable of such
+                arrays (chunks of any size)
+            out -- 1D array (e.g. np.memmap) of len(positions) that is
+                filled in place, a binary file object to which the
+                elevations are appended as float64, or None for a new
+                array
+            chunk_size -- number of points per chunk (arrays only)
+            workers -- number of threads or processes, default
+                os.cpu_count(); 1 evaluates without a pool
+            processes -- use processes instead of threads
+
+        Returns:
+            out -- the filled array, or for a file object the number
+                of elevations written
+        '''
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if hasattr(positions, 'shape'):
+            chunks = (positions[start:start + chunk_size]
+                      for start in range(0, len(positions), chunk_size))
+            if out is None:
+                out = np.empty(len(positions))
+        else:
+            chunks = iter(positions)
+
+        beginn = time.perf_counter()
+        if workers <= 1:
+            results = map(self.elevation, chunks)
+            written = self._write_chunks(results, out)
+        else:
+            if processes:
+                pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                           initargs=(self,))
+                function = _worker_elevation
+            else:
+                # Interpolationsfunktion vorher erstellen, sonst bauen
+                # mehrere Threads sie gleichzeitig in _interpolator()
+                self.warm_up('elevation')
+                pool = ThreadPoolExecutor(workers)
+                function = self.elevation
+            with pool:
+                written = self._write_chunks(
+                        _ordered(pool, function, chunks, 2*workers), out)
+
+        if self._messung is not None:
+            self._messung.zeit('topomap.elevation_chunked',
+                               time.perf_counter() - beginn)
+        if out is None:
+            return np.concatenate(written) if written else np.empty(0)
+        if hasattr(out, 'write'):
+            return written
+        return out
+
+    @staticmethod
+    def _write_chunks(results, out):
+        # Ergebnisse der Reihe nach in out schreiben. Rückgabe: Liste der
+        # Ergebnisse (out=None) oder Anzahl geschriebener Werte.
+        if out is None:
+            return list(results)
+        start = 0
+        for z in results:
+            if hasattr(out, 'write'):
+                out.write(np.ascontiguousarray(z, dtype=np.float64).data)
+            else:
+                out[start:start + len(z)] = z
+            start += len(z)
+        return start
+
     def elevation_profile(self, path):
         '''Returns the elevation profile along the given path.
 
@@ -145,18 +524,36 @@ class TopoMap:
         return distance, cumulative_elevation_gain
 
     def fall_line(self, start, descent=True, gamma=50,
-                  max_iter=10000, precision=0.1):
+                  max_iter=10000, precision=0.1, method='fixed', tol=None):
         '''Find the line of greatest slope.
 
+        method='fixed' takes steps of gamma times the gradient. With
+        method='adaptive' the same path (dp/dt = gamma * gradient) is
+        integrated with an embedded Runge-Kutta scheme (Bogacki-Shampine
+        3(2)) and step size control: steps grow on even slopes and
+        shrink where the path bends, at most one grid cell long. Near
+        the map edge or the shore the step is reduced to a fixed step
+        again, so both methods stop at the same place up to the length
+        of one fixed step, with far fewer interpolator evaluations
+        (see benchmark.py).
+
         Arguments:
             start -- [x, y], list or 1D array
             descent -- downhill if True, uphill if False
             gamma -- step size multiplier
-            max_iter -- maximum number of iterations
+            max_iter -- maximum number of iterations (steps)
             precision -- desired precision of result
+            method -- 'fixed' or 'adaptive'
+            tol -- adaptive only: allowed position error per step,
+                default precision, must be positive
 
         Returns:
             path -- 2D array of the path
+
+        Raises:
+            ValueError -- for an unknown method or tol <= 0
+            RuntimeError -- adaptive only: if no step down to a
+                millionth of a fixed step meets tol (e.g. NaN gradient)
         '''
         # https://en.wikipedia.org/wiki/Line_of_greatest_slope
 
@@ -169,8 +566,21 @@ class TopoMap:
         else:
             gamma = np.abs(gamma)
 
+        if method == 'adaptive':
+            if tol is None:
+                tol = precision
+            # auch NaN: sonst wird kein Schritt je angenommen
+            if not tol > 0:
+                raise ValueError('tol must be positive: {!r}'.format(tol))
+            return self._fall_line_adaptive(
+                    float(x), float(y), gamma, max_iter, precision, tol)
+        if method != 'fixed':
+            raise ValueError('unknown method: {!r}'.format(method))
+
         # Pfad in Richtung des Gradienten folgen
+        beginn = time.perf_counter()
         path = [[x, y]]
+        n = -1  # Anzahl Iterationen = n + 1
         for n in range(max_iter):
             dx = self._gradient_dx(x, y)*gamma
             dy = self._gradient_dy(x, y)*gamma
@@ -198,20 +608,174 @@ class TopoMap:
             # neue Position zur Liste hinzufügen
             path.append([x, y])
 
+        if self._messung is not None:
+            self._messung.zeit('topomap.fall_line',
+                               time.perf_counter() - beginn)
+            self._messung.zaehlen('topomap.fall_line.iterationen', n + 1)
+
         # Pfad zurückgeben (als NumPy-Array)
         return np.array(path)
 
+    def _outside(self, x, y):
+        # Kartenrand überschritten oder Ufer (z<=0) erreicht
+        return (x < self._x_lim[0] or x > self._x_lim[1]
+                or y < self._y_lim[0] or y > self._y_lim[1]
+                or self._Z_interp(x, y) <= 0)
+
+    def _fall_line_adaptive(self, x, y, gamma, max_iter, precision, tol):
+        # Bogacki-Shampine 3(2) für dp/dt = gamma * grad z, die letzte
+        # Auswertung eines Schritts ist die erste des nächsten (FSAL)
+        # https://en.wikipedia.org/wiki/Bogacki%E2%80%93Shampine_method
+        gradient_dx = self._gradient_dx
+        gradient_dy = self._gradient_dy
+        max_length = min(self._x_step, self._y_step)
+
+        beginn = time.perf_counter()
+        path = [[x, y]]
+        h = 1.0
+        kx = float(gradient_dx(x, y))*gamma
+        ky = float(gradient_dy(x, y))*gamma
+        n = -1  # Anzahl Schritte = n + 1
+        for n in range(max_iter):
+            # falls die Änderung genug klein geworden ist
+            if abs(kx) + abs(ky) < precision:
+                break
+
+            # höchstens eine Gitterzelle pro Schritt
+            h = min(h, max_length / np.hypot(kx, ky))
+            while True:
+                x2 = x + h/2*kx
+                y2 = y + h/2*ky
+                kx2 = float(gradient_dx(x2, y2))*gamma
+                ky2 = float(gradient_dy(x2, y2))*gamma
+                x3 = x + 3*h/4*kx2
+                y3 = y + 3*h/4*ky2
+                kx3 = float(gradient_dx(x3, y3))*gamma
+                ky3 = float(gradient_dy(x3, y3))*gamma
+                x_new = x + h*(2*kx + 3*kx2 + 4*kx3)/9
+                y_new = y + h*(2*ky + 3*ky2 + 4*ky3)/9
+                kx4 = float(gradient_dx(x_new, y_new))*gamma
+                ky4 = float(gradient_dy(x_new, y_new))*gamma
+
+                # Fehler = Differenz zum Verfahren 2. Ordnung
+                error = h*np.hypot(
+                        -5*kx/72 + kx2/12 + kx3/9 - kx4/8,
+                        -5*ky/72 + ky2/12 + ky3/9 - ky4/8) / tol
+                if error <= 1:
+                    break
+                # kein Schritt erfüllt tol (z.B. NaN aus dem Gradienten)
+                if h <= self._MIN_STEP:
+                    raise RuntimeError(
+                        'fall_line: step size underflow at ({}, {})'.format(
+                            x, y))
+                h = max(h*max(0.2, 0.9*error**(-1/3)), self._MIN_STEP)
+
+            if self._outside(x_new, y_new):
+                if h > 1:
+                    # mit kürzeren Schritten an den Rand herantasten
+                    h = max(h/4, 1.0)
+                    continue
+                # stehen bleiben
+                break
+
+            x, y, kx, ky = x_new, y_new, kx4, ky4
+            path.append([x, y])
+            h *= min(5.0, 0.9*max(error, 1e-10)**(-1/3))
+
+        if self._messung is not None:
+            self._messung.zeit('topomap.fall_line',
+                               time.perf_counter() - beginn)
+            self._messung.zaehlen('topomap.fall_line.iterationen', n + 1)
+
+        return np.array(path)
+
+    def fall_lines(self, starts, descent=True, gamma=50,
+                   max_iter=10000, precision=0.1):
+        '''Find the lines of greatest slope for many start points.
+
+        All paths are advanced together, with one gradient and one
+        elevation evaluation per iteration for all active paths
+        instead of one per path. Each path stops by the same rules as
+        fall_line() (map edge, shore z <= 0, precision) and equals its
+        fall_line() result.
+
+        Arguments:
+            starts -- 2D array of start positions [[x1, y1], ...]
+            descent, gamma, max_iter, precision -- as in fall_line()
+
+        Returns:
+            paths -- list of 2D arrays, one path per start point
+        '''
+        starts = np.array(starts, dtype=float).reshape(-1, 2)
+        if not len(starts):
+            return []
+        gamma = -np.abs(gamma) if descent else np.abs(gamma)
+
+        beginn = time.perf_counter()
+        x = starts[:, 0]
+        y = starts[:, 1]
+        # Indizes der noch laufenden Pfade
+        active = np.arange(len(starts))
+        # angehängte Punkte pro Iteration: (Pfad-Indizes, x, y)
+        steps = []
+        iterations = 0
+        for _ in range(max_iter):
+            if not len(active):
+                break
+            iterations += len(active)
+            dx = self._gradient_dx(x, y)*gamma
+            dy = self._gradient_dy(x, y)*gamma
+
+            # Positionen in Richtung des Gradienten bewegen (neue
+            # Arrays, die alten sind in steps gespeichert)
+            x = x + dx
+            y = y + dy
+
+            # Kartenrand, danach Ufer (nur innerhalb der Karte) und
+            # Präzision prüfen, wie in fall_line()
+            go_on = ((x >= self._x_lim[0]) & (x <= self._x_lim[1])
+                     & (y >= self._y_lim[0]) & (y <= self._y_lim[1]))
+            go_on[go_on] = self._Z_interp(x[go_on], y[go_on]) > 0
+            go_on &= (np.abs(dx) + np.abs(dy)) >= precision
+
+            # laufende Pfade behalten, neue Positionen merken
+            active = active[go_on]
+            x = x[go_on]
+            y = y[go_on]
+            steps.append((active, x, y))
+
+        if self._messung is not None:
+            self._messung.zeit('topomap.fall_lines',
+                               time.perf_counter() - beginn)
+            self._messung.zaehlen('topomap.fall_line.iterationen',
+                                  iterations)
+
+        # Punkte nach Pfad gruppieren (stabil, also in Pfad-Reihenfolge)
+        index = np.concatenate([np.arange(len(starts))]
+                               + [step[0] for step in steps])
+        points = np.concatenate([starts]
+                                + [np.c_[step[1], step[2]] for step in steps])
+        order = np.argsort(index, kind='stable')
+        counts = np.bincount(index, minlength=len(starts))
+        return np.split(points[order], np.cumsum(counts)[:-1])
+
     def aligned_map(self, p, q):
         '''Returns a copy of the map data aligned to the points p and q.
 
         Arguments:
             p -- [x, y], list or 1D array, p is the new origin
             q -- [x, y], list or 1D array, q lies north of p
+
+        Returns:
+            X_rot, Y_rot -- new 2D arrays of the rotated coordinates
+            Z -- writeable copy of the heights
+            A -- rotation matrix
         '''
 
-        # Ursprung zum Punkt p verschieben
-        X_new = self.X - p[0]
-        Y_new = self.Y - p[1]
+        # Ursprung zum Punkt p verschieben, auf den 1-D-Achsen (Zeile
+        # bzw. Spalte); das ganze Gitter entsteht erst beim Drehen
+        X_new = self._x - p[0]
+        Y_new = (self._y - p[1])[:, np.newaxis]
 
         # Drehwinkel berechnen
         phi = np.pi/2 - np.arctan2(q[1] - p[1], q[0] - p[0])
@@ -224,7 +788,72 @@ class TopoMap:
         X_rot = A[0, 0]*X_new + A[0, 1]*Y_new
         Y_rot = A[1, 0]*X_new + A[1, 1]*Y_new
 
-        return X_rot, Y_rot, self.Z, A
+        # Kopie, wie vor den schreibgeschützten Views von Z
+        return X_rot, Y_rot, self.Z.copy(), A
+
+
+# Karte der Worker-Prozesse von TopoMap.elevation_chunked()
+_worker_map = None
+
+
+def _init_worker(tmap):
+    global _worker_map
+    _worker_map = tmap
+
+
+def _worker_elevation(chunk):
+    return _worker_map.elevation(chunk)
+
+
+def _ordered(pool, function, items, window):
+    # Wie pool.map(function, items), aber höchstens window Aufträge
+    # gleichzeitig, damit items nicht auf einmal gelesen wird
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def convert_to_npy(fname, npy_name=None, rows=1024):
+    '''Convert a CSV map file into the binary format read by TopoMap.
+
+    The .npy file has the same layout as the CSV file (header row =
+    x axis, first column = y axis) and is written block by block, so
+    memory use depends on the block size, not on the map size.
+
+    Arguments:
+        fname -- path of the CSV file
+        npy_name -- path of the .npy file, default fname + '.npy'
+        rows -- number of CSV rows parsed per block
+
+    Returns:
+        npy_name -- path of the written file
+    '''
+    if npy_name is None:
+        npy_name = str(fname) + '.npy'
+
+    # Grösse des Gitters bestimmen, ohne die Werte zu lesen
+    with open(fname, 'r', encoding='utf-8') as file:
+        columns = file.readline().count(',') + 1
+        lines = 1 + sum(1 for line in file if line.strip())
+
+    out = np.lib.format.open_memmap(npy_name, mode='w+', dtype=np.float64,
+                                    shape=(lines, columns))
+    with open(fname, 'r', encoding='utf-8') as file:
+        start = 0
+        while True:
+            block = [line for line in islice(file, rows) if line.strip()]
+            if not block:
+                break
+            block = np.loadtxt(block, delimiter=',', ndmin=2)
+            out[start:start + len(block)] = block
+            start += len(block)
+    out.flush()
+    del out
+    return npy_name
 
 
 if __name__ == '__main__':
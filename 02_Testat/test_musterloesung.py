@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# test_musterloesung.py
+'''
+Tests zu TopoMap auf einer kleinen, künstlichen Karte. Aufruf im
+Verzeichnis 02_Testat:
+    python -m pytest -q test_musterloesung.py
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from musterloesung import TopoMap, _ordered
+
+
+class _MitKarte(unittest.TestCase):
+    # Hügel mit Wellen und Ufer (z <= 0) auf einem 51 x 41 Gitter, im
+    # CSV-Format von TopoMap (erste Zeile x, erste Spalte y)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.verzeichnis = tempfile.mkdtemp()
+        cls.datei = os.path.join(cls.verzeichnis, 'karte.txt')
+        x = np.arange(0, 101, 2.0)
+        y = np.arange(0, 81, 2.0)
+        X, Y = np.meshgrid(x, y)
+        data = np.zeros((len(y) + 1, len(x) + 1))
+        data[0, 1:] = x
+        data[1:, 0] = y
+        data[1:, 1:] = (60 - ((X - 40)**2 + (Y - 45)**2) / 40
+                        + 5*np.sin(X / 7)*np.cos(Y / 9))
+        np.savetxt(cls.datei, data, delimiter=',')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.verzeichnis)
+
+
+class FallLinesTest(_MitKarte):
+
+    # Hang, Ufer, Ecke, ausserhalb der Karte, Gipfel
+    STARTS = [[30, 30], [70, 20], [45, 60], [2, 2], [150, 10], [10, 75],
+              [40, 45]]
+
+    def pruefen(self, tmap, **kwargs):
+        paths = tmap.fall_lines(self.STARTS, **kwargs)
+        self.assertEqual(len(paths), len(self.STARTS))
+        for start, path in zip(self.STARTS, paths):
+            np.testing.assert_array_equal(
+                path, tmap.fall_line(start, **kwargs), err_msg=str(start))
+        return paths
+
+    def test_wie_fall_line(self):
+        for interpolation in TopoMap.INTERPOLATIONS:
+            tmap = TopoMap(self.datei, interpolation=interpolation)
+            for descent in (True, False):
+                with self.subTest(interpolation=interpolation,
+                                  descent=descent):
+                    paths = self.pruefen(tmap, descent=descent, gamma=0.5)
+                    # nicht nur Startpunkte verglichen
+                    self.assertGreater(max(map(len, paths)), 30)
+
+    def test_max_iter_und_precision(self):
+        tmap = TopoMap(self.datei, interpolation='bilinear')
+        self.pruefen(tmap, gamma=0.5, max_iter=7)
+        self.pruefen(tmap, gamma=2, precision=1)
+
+    def test_ohne_startpunkte(self):
+        tmap = TopoMap(self.datei)
+        self.assertEqual(tmap.fall_lines([]), [])
+
+
+class ElevationChunkedTest(_MitKarte):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        cls.positions = np.c_[rng.uniform(0, 100, 500),
+                              rng.uniform(0, 80, 500)]
+
+    def pruefen(self, tmap, z, **kwargs):
+        np.testing.assert_array_equal(
+            tmap.elevation_chunked(self.positions, **kwargs), z,
+            err_msg=str(kwargs))
+
+    def test_wie_elevation(self):
+        for interpolation in TopoMap.INTERPOLATIONS:
+            tmap = TopoMap(self.datei, interpolation=interpolation)
+            z = tmap.elevation(self.positions)
+            # mehr Chunks als Aufträge gleichzeitig (2 pro Worker)
+            for chunk_size in (7, 64, 500, 1000):
+                for workers in (1, 2, 3):
+                    self.pruefen(tmap, z, chunk_size=chunk_size,
+                                 workers=workers)
+            self.pruefen(tmap, z, chunk_size=64, workers=2, processes=True)
+
+    def test_prozesse_mit_npy_karte(self):
+        npy = os.path.join(self.verzeichnis, 'karte.npy')
+        np.save(npy, np.loadtxt(self.datei, delimiter=','))
+        tmap = TopoMap(npy, interpolation='bicubic')
+        z = TopoMap(self.datei, interpolation='bicubic').elevation(
+            self.positions)
+        self.pruefen(tmap, z, chunk_size=7, workers=3, processes=True)
+
+    def test_ausgabe(self):
+        tmap = TopoMap(self.datei, interpolation='bilinear')
+        z = tmap.elevation(self.positions)
+
+        out = np.full(len(self.positions), np.nan)
+        self.assertIs(tmap.elevation_chunked(self.positions, out=out,
+                                             chunk_size=64, workers=2), out)
+        np.testing.assert_array_equal(out, z)
+
+        datei = io.BytesIO()
+        self.assertEqual(tmap.elevation_chunked(
+            self.positions, out=datei, chunk_size=64, workers=2), len(z))
+        np.testing.assert_array_equal(
+            np.frombuffer(datei.getvalue(), dtype=np.float64), z)
+
+    def test_chunks_aus_iterable(self):
+        tmap = TopoMap(self.datei, interpolation='bicubic')
+        z = tmap.elevation(self.positions)
+        grenzen = [0, 1, 50, 51, 300, 500]
+        for workers in (1, 3):
+            chunks = (self.positions[a:b]
+                      for a, b in zip(grenzen, grenzen[1:]))
+            np.testing.assert_array_equal(
+                tmap.elevation_chunked(chunks, workers=workers), z)
+
+    def test_leer(self):
+        tmap = TopoMap(self.datei, interpolation='bilinear')
+        self.assertEqual(len(tmap.elevation_chunked(np.empty((0, 2)))), 0)
+        self.assertEqual(len(tmap.elevation_chunked(iter([]))), 0)
+
+
+class OrderedTest(unittest.TestCase):
+
+    def test_reihenfolge_und_fenster(self):
+        # frühe Aufträge dauern länger; höchstens window Aufträge
+        # gleichzeitig unterwegs
+        laufend = [0, 0]
+        sperre = threading.Lock()
+
+        def function(i):
+            with sperre:
+                laufend[0] += 1
+                laufend[1] = max(laufend)
+            time.sleep(0.002 * (i % 4))
+            with sperre:
+                laufend[0] -= 1
+            return i * i
+
+        gelesen = []
+
+        def items():
+            for i in range(40):
+                gelesen.append(i)
+                yield i
+
+        with ThreadPoolExecutor(8) as pool:
+            ergebnisse = []
+            for ergebnis in _ordered(pool, function, items(), 3):
+                ergebnisse.append(ergebnis)
+                # items wird nur window Aufträge voraus gelesen
+                self.assertLessEqual(len(gelesen), len(ergebnisse) + 3)
+        self.assertEqual(ergebnisse, [i * i for i in range(40)])
+        self.assertLessEqual(laufend[1], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()